@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+'''
+Cache of the RDF triples generated for single datasets
+
+`RDFSerializer.serialize_catalog` stores there the triples the profiles
+generate for each dataset (as N-Triples), and reuses them on later requests
+as long as the dataset has not been modified. Entries are kept in Redis, in
+one hash per dataset so they can be dropped at once when it changes.
+'''
+import json
+import logging
+
+import redis
+
+from ckantoolkit import config
+import ckan.plugins.toolkit as toolkit
+from ckan.lib.redis import connect_to_redis
+
+log = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_CONFIG_OPTION = 'ckanext.dcat.fragment_cache'
+FRAGMENT_CACHE_TTL_CONFIG_OPTION = 'ckanext.dcat.fragment_cache_ttl'
+DEFAULT_FRAGMENT_CACHE_TTL = 24 * 60 * 60
+
+
+def fragment_cache_enabled():
+    return toolkit.asbool(config.get(FRAGMENT_CACHE_CONFIG_OPTION, False))
+
+
+def _fragment_key(package_id):
+    return '{0}:ckanext-dcat:rdf-fragment:{1}'.format(
+        config.get('ckan.site_id'), package_id)
+
+
+def get_fragments(entries):
+    '''
+    Returns the cached fragments for a list of ``(package_id, field)``
+    tuples, `field` identifying the dataset version and the serializer
+    settings.
+
+    Fragments are dicts, the list has None for the entries not cached.
+    '''
+    if not entries:
+        return []
+    try:
+        pipe = connect_to_redis().pipeline(transaction=False)
+        for package_id, field in entries:
+            pipe.hget(_fragment_key(package_id), field)
+        values = pipe.execute()
+    except redis.RedisError as e:
+        log.warning('Could not read the RDF fragment cache: %s', e)
+        return [None] * len(entries)
+
+    return [json.loads(value) if value else None for value in values]
+
+
+def set_fragments(fragments):
+    '''
+    Caches fragments, passed as a dict with ``(package_id, field)`` keys
+    '''
+    if not fragments:
+        return
+    ttl = toolkit.asint(config.get(FRAGMENT_CACHE_TTL_CONFIG_OPTION,
+                                   DEFAULT_FRAGMENT_CACHE_TTL))
+    try:
+        pipe = connect_to_redis().pipeline(transaction=False)
+        for (package_id, field), fragment in fragments.items():
+            key = _fragment_key(package_id)
+            pipe.hset(key, field, json.dumps(fragment))
+            pipe.expire(key, ttl)
+        pipe.execute()
+    except redis.RedisError as e:
+        log.warning('Could not write the RDF fragment cache: %s', e)
+
+
+def invalidate_fragments(package_id):
+    '''
+    Drops the cached fragments of a dataset
+    '''
+    if not fragment_cache_enabled():
+        return
+    try:
+        connect_to_redis().delete(_fragment_key(package_id))
+    except redis.RedisError as e:
+        log.warning('Could not invalidate the RDF fragments of %s: %s',
+                    package_id, e)
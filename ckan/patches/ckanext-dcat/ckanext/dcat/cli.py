@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import json
+import time
 
 import click
 
@@ -141,5 +142,53 @@ def produce(input, output, format, profiles, compat_mode):
     output.write(out)
 
 
+@dcat.command(context_settings={"show_default": True})
+@click.option(
+    "--full", is_flag=True, help="Serialize all datasets, not just the modified ones"
+)
+@click.option(
+    "-j",
+    "--processes",
+    type=int,
+    help="Number of worker processes. If not provided will be read from "
+    "config (ckanext.dcat.dumps.processes)",
+)
+@click.option(
+    "-b",
+    "--background",
+    is_flag=True,
+    help="Enqueue a background job instead of generating the dumps now",
+)
+@click.option(
+    "-i",
+    "--interval",
+    type=int,
+    help="Keep running, updating the dumps every INTERVAL seconds",
+)
+def dump(full, processes, background, interval):
+    """
+    Generates the full catalog dumps, served as /catalog.<format>.gz
+
+    Only the datasets modified since the last run are serialized again:
+
+        ckan dcat dump
+
+    Run it periodically (eg from cron) or keep it running with --interval.
+    """
+    from ckanext.dcat.dumps import enqueue_dumps_job, generate_dumps
+
+    while True:
+        if background:
+            job = enqueue_dumps_job(full=full)
+            click.echo(f"Enqueued job {job.id}")
+        else:
+            for path in generate_dumps(full=full, processes=processes):
+                click.echo(f"Written {path}")
+        if not interval:
+            break
+        full = False
+        time.sleep(interval)
+
+
 def get_commands():
     return [dcat]
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+'''
+Full catalog dumps
+
+`generate_dumps` writes the whole catalog (the datasets listed by the catalog
+endpoint) to gzip-compressed files, one per format, which the catalog
+endpoint serves as ``/catalog.<format>.gz``. The triples of each dataset are
+stored in the dumps directory too, so later runs only serialize the datasets
+modified since, unless the organizations, the profiles or their vocabularies
+changed.
+'''
+import collections
+import errno
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from xml.sax.saxutils import quoteattr
+
+import rdflib
+
+from ckantoolkit import config
+import ckan.plugins.toolkit as toolkit
+
+from ckanext.dcat.processors import (
+    RDFSerializer,
+    STREAMING_BATCH_SIZE,
+    _init_worker,
+)
+
+log = logging.getLogger(__name__)
+
+DUMPS_DIRECTORY_CONFIG_OPTION = 'ckanext.dcat.dumps.directory'
+DUMPS_FORMATS_CONFIG_OPTION = 'ckanext.dcat.dumps.formats'
+DUMPS_PROCESSES_CONFIG_OPTION = 'ckanext.dcat.dumps.processes'
+
+# Endpoint formats dumps can be generated in, and their rdflib names
+DUMP_FORMATS = collections.OrderedDict([
+    ('rdf', 'xml'),
+    ('ttl', 'turtle'),
+    ('jsonld', 'json-ld'),
+    ('nt', 'nt'),
+])
+DEFAULT_DUMPS_FORMATS = 'rdf ttl jsonld'
+
+# Timeout of the background job, in seconds
+DUMPS_JOB_TIMEOUT = 6 * 60 * 60
+
+# Number of dataset ids listed per search request
+LIST_BATCH_SIZE = 1000
+# Number of dataset dicts fetched per search request, and sent at once to
+# each worker process
+FETCH_BATCH_SIZE = 50
+
+# Keys of the dataset dicts used to link each dataset to the catalog (see
+# `RDFSerializer._add_dataset_to_catalog`), stored along with its triples
+CATALOG_LINK_KEYS = ('id', 'owner_org', 'holder_identifier', 'holder_name',
+                     'extras', 'dataset_is_local')
+
+
+def dumps_directory():
+    '''
+    Returns the directory the dumps are written to, by default a
+    ``dcat_dumps`` folder in ``ckan.storage_path``, or None if none is
+    configured
+    '''
+    directory = config.get(DUMPS_DIRECTORY_CONFIG_OPTION)
+    if not directory and config.get('ckan.storage_path'):
+        directory = os.path.join(config.get('ckan.storage_path'),
+                                 'dcat_dumps')
+    return directory or None
+
+
+def dumps_formats():
+    formats = toolkit.aslist(config.get(DUMPS_FORMATS_CONFIG_OPTION,
+                                        DEFAULT_DUMPS_FORMATS))
+    unknown = set(formats) - set(DUMP_FORMATS)
+    if unknown:
+        raise ValueError('Unknown catalog dump formats: {0}'.format(
+            ', '.join(sorted(unknown))))
+    return formats
+
+
+def dump_path(_format):
+    '''
+    Returns the path of the dump in the given endpoint format, or None if
+    dumps are not configured or the format is not supported
+    '''
+    if _format == 'xml':
+        _format = 'rdf'
+    directory = dumps_directory()
+    if not directory or _format not in DUMP_FORMATS:
+        return None
+    return os.path.join(directory, 'catalog.{0}.gz'.format(_format))
+
+
+def enqueue_dumps_job(full=False):
+    '''
+    Enqueues a background job running `generate_dumps`
+    '''
+    return toolkit.enqueue_job(generate_dumps, kwargs={'full': full},
+                               title='DCAT catalog dumps',
+                               rq_kwargs={'timeout': DUMPS_JOB_TIMEOUT})
+
+
+def generate_dumps(full=False, processes=None):
+    '''
+    Updates the catalog dumps
+
+    Only the datasets created or modified since the last run are serialized
+    (all of them if `full` is True, or if `_dumps_version` changed), using
+    `processes` worker processes
+    (``ckanext.dcat.dumps.processes`` by default). The dumps are then
+    rewritten if any dataset changed, and replaced atomically.
+
+    Returns the paths of the dumps written.
+    '''
+    directory = dumps_directory()
+    if not directory:
+        log.error('No directory for the catalog dumps, set %s or '
+                  'ckan.storage_path', DUMPS_DIRECTORY_CONFIG_OPTION)
+        return []
+    if processes is None:
+        processes = toolkit.asint(
+            config.get(DUMPS_PROCESSES_CONFIG_OPTION, 1))
+    formats = dumps_formats()
+
+    fragments_directory = os.path.join(directory, 'fragments')
+    if not os.path.isdir(fragments_directory):
+        os.makedirs(fragments_directory)
+
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            log.info('The catalog dumps are already being generated')
+            return []
+
+        index_path = os.path.join(directory, 'index.json')
+        version = _dumps_version()
+        index = {}
+        if not full and os.path.exists(index_path):
+            with open(index_path) as f:
+                stored = json.load(f)
+            if stored.get('version') == version:
+                index = stored['datasets']
+            else:
+                log.info('Catalog dumps: organizations, profiles or '
+                         'vocabularies changed, serializing all the datasets')
+
+        datasets = _catalog_datasets()
+        modified = [dataset_id
+                    for dataset_id, entry_version in datasets.items()
+                    if index.get(dataset_id) != entry_version]
+        removed = [dataset_id for dataset_id in index
+                   if dataset_id not in datasets]
+        log.info('Catalog dumps: %d datasets, %d to serialize, %d removed',
+                 len(datasets), len(modified), len(removed))
+
+        for dataset_dict, fragment in _serialize_datasets(modified,
+                                                          processes):
+            dataset_id = dataset_dict['id']
+            _write_json(_fragment_path(directory, dataset_id), {
+                'dataset': dataset_dict,
+                'fragment': fragment,
+            })
+            index[dataset_id] = datasets[dataset_id]
+        for dataset_id in removed:
+            try:
+                os.remove(_fragment_path(directory, dataset_id))
+            except OSError:
+                pass
+            index.pop(dataset_id)
+        _write_json(index_path, {'version': version, 'datasets': index})
+
+        paths = [dump_path(_format) for _format in formats]
+        if (not modified and not removed
+                and all(os.path.exists(path) for path in paths)):
+            return []
+
+        # Datasets that could not be serialized (eg not indexed yet) are
+        # left out until the next run
+        dataset_ids = sorted((dataset_id for dataset_id in datasets
+                              if dataset_id in index),
+                             key=lambda dataset_id: datasets[dataset_id],
+                             reverse=True)
+        _write_dumps(directory, dataset_ids, formats)
+
+        return paths
+
+
+def _dumps_version():
+    '''
+    Returns a hash of what the triples of a dataset depend on besides the
+    dataset itself (see `RDFSerializer._context_version`), plus the dataset
+    dict keys stored
+    '''
+    version = hashlib.sha1()
+    # stored along with the triples
+    version.update(json.dumps(CATALOG_LINK_KEYS).encode('utf-8'))
+    version.update(RDFSerializer()._context_version().encode('utf-8'))
+    return version.hexdigest()
+
+
+def _catalog_datasets():
+    '''
+    Returns a dict with the id and modification date of all the datasets
+    listed by the catalog endpoint
+    '''
+    context = {'user': ''}
+    package_search = toolkit.get_action('package_search')
+
+    datasets = {}
+    last_id = None
+    while True:
+        fq_list = ['-dataset_type:harvest', '-dataset_type:showcase']
+        if last_id:
+            fq_list.append('id:{{"{0}" TO *]'.format(last_id))
+        results = package_search(context.copy(), {
+            'q': '*:*',
+            'fq_list': fq_list,
+            'fl': 'id,metadata_modified',
+            'sort': 'id asc',
+            'rows': LIST_BATCH_SIZE,
+        })['results']
+        for result in results:
+            datasets[result['id']] = result['metadata_modified']
+        if len(results) < LIST_BATCH_SIZE:
+            break
+        last_id = results[-1]['id']
+
+    return datasets
+
+
+def _dataset_dicts(dataset_ids):
+    '''
+    Generator of lists of up to `FETCH_BATCH_SIZE` dataset dicts, as
+    returned by the catalog endpoint search
+    '''
+    context = {'user': ''}
+    package_search = toolkit.get_action('package_search')
+
+    for i in range(0, len(dataset_ids), FETCH_BATCH_SIZE):
+        batch = dataset_ids[i:i + FETCH_BATCH_SIZE]
+        yield package_search(context.copy(), {
+            'q': '*:*',
+            'fq': 'id:({0})'.format(
+                ' OR '.join('"{0}"'.format(dataset_id)
+                            for dataset_id in batch)),
+            'rows': len(batch),
+        })['results']
+
+
+def _serialize_datasets(dataset_ids, processes):
+    '''
+    Generator of ``(link_dict, fragment)`` tuples for the given datasets
+
+    See `_serialize_datasets_chunk`. With more than one process, chunks of
+    datasets are serialized by a pool of forked workers, only a few chunks
+    per worker being pending at any time.
+    '''
+    profile_names = [profile.name for profile in RDFSerializer()._profiles]
+    chunks = ((profile_names, dataset_dicts)
+              for dataset_dicts in _dataset_dicts(dataset_ids))
+
+    if not processes or processes < 2:
+        for chunk in chunks:
+            for item in _serialize_datasets_chunk(chunk):
+                yield item
+        return
+
+    pool = multiprocessing.get_context('fork').Pool(
+        processes, initializer=_init_worker)
+    try:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_serialize_datasets_chunk,
+                                            (chunk,)))
+            while len(pending) >= processes * 2:
+                for item in pending.popleft().get():
+                    yield item
+        while pending:
+            for item in pending.popleft().get():
+                yield item
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _serialize_datasets_chunk(args):
+    '''
+    Runs the profiles on a list of dataset dicts, returns a list of
+    ``(link_dict, fragment)`` tuples, `link_dict` having the keys in
+    `CATALOG_LINK_KEYS` and `fragment` the dataset triples (see
+    `RDFSerializer._fragment_from_graph`)
+    '''
+    profile_names, dataset_dicts = args
+    serializer = RDFSerializer(profiles=profile_names)
+
+    items = []
+    for dataset_dict, dataset_ref, graph in serializer._dataset_graphs(
+            dataset_dicts):
+        link_dict = dict((key, dataset_dict[key])
+                         for key in CATALOG_LINK_KEYS if key in dataset_dict)
+        if dataset_dict.get('organization'):
+            link_dict['organization'] = {
+                'name': dataset_dict['organization'].get('name')}
+        items.append((link_dict,
+                      serializer._fragment_from_graph(dataset_ref, graph)))
+    return items
+
+
+def _fragment_path(directory, dataset_id):
+    return os.path.join(directory, 'fragments',
+                        '{0}.json'.format(dataset_id))
+
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _stored_dataset_graphs(serializer, directory, dataset_ids):
+    '''
+    Like `RDFSerializer._dataset_graphs`, but taking the triples of the
+    datasets from the stored fragments
+    '''
+    for i in range(0, len(dataset_ids), STREAMING_BATCH_SIZE):
+        graph = rdflib.Graph()
+        bound = set()
+        for dataset_id in dataset_ids[i:i + STREAMING_BATCH_SIZE]:
+            with open(_fragment_path(directory, dataset_id)) as f:
+                stored = json.load(f)
+            graph.remove((None, None, None))
+            dataset_ref = serializer._load_fragment(
+                graph, stored['fragment'], bound)
+            yield stored['dataset'], dataset_ref, graph
+
+
+def _write_dumps(directory, dataset_ids, formats):
+    '''
+    Writes the dumps in all the formats at once, reading the stored
+    triples of each dataset just once
+    '''
+    writers = []
+    try:
+        for _format in formats:
+            writer_class = (_RDFXMLDumpWriter if DUMP_FORMATS[_format] == 'xml'
+                            else _DumpWriter)
+            writers.append(writer_class(dump_path(_format),
+                                        DUMP_FORMATS[_format]))
+
+        serializer = RDFSerializer()
+        dataset_graphs = _stored_dataset_graphs(serializer, directory,
+                                                dataset_ids)
+        for graph in serializer._catalog_graphs({}, dataset_graphs, None):
+            for writer in writers:
+                writer.write(graph)
+
+        for writer in writers:
+            writer.close()
+    finally:
+        for writer in writers:
+            writer.discard()
+
+
+class _DumpWriter(object):
+    '''
+    Writes the graphs of a catalog to a gzip-compressed temporary file,
+    which replaces the dump on `close()`
+
+    Same output as `RDFSerializer.serialize_catalog_stream`.
+    '''
+
+    def __init__(self, path, rdflib_format):
+        self.path = path
+        self.format = rdflib_format
+        self.tmp_path = path + '.tmp'
+        self.out = gzip.open(self.tmp_path, 'wt', encoding='utf-8')
+        self.empty = True
+        if self.format == 'json-ld':
+            self.out.write('[')
+
+    def write(self, graph):
+        if self.format != 'json-ld':
+            self.out.write(graph.serialize(format=self.format))
+            return
+
+        for node in json.loads(graph.serialize(format=self.format)):
+            self.out.write('\n' if self.empty else ',\n')
+            self.out.write(json.dumps(node))
+            self.empty = False
+
+    def _finish(self):
+        if self.format == 'json-ld':
+            self.out.write(']' if self.empty else '\n]')
+
+    def close(self):
+        self._finish()
+        self.out.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self.out.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class _RDFXMLDumpWriter(_DumpWriter):
+    '''
+    RDF/XML version of `_DumpWriter`
+
+    Each graph is serialized as RDF/XML without the enclosing ``rdf:RDF``
+    element, all of them sharing a namespace manager so prefixes are
+    consistent. Descriptions go to an uncompressed temporary file first, as
+    the namespaces to declare on ``rdf:RDF`` are only known at the end.
+    '''
+
+    def __init__(self, path, rdflib_format):
+        super(_RDFXMLDumpWriter, self).__init__(path, rdflib_format)
+        self.namespace_manager = rdflib.Graph().namespace_manager
+        self.body = tempfile.TemporaryFile(
+            mode='w+', encoding='utf-8', dir=os.path.dirname(path))
+
+    def write(self, graph):
+        for prefix, namespace in graph.namespaces():
+            self.namespace_manager.bind(prefix, namespace, override=False)
+        graph.namespace_manager = self.namespace_manager
+
+        output = graph.serialize(format='xml')
+        start = output.index('>\n', output.index('<rdf:RDF')) + 2
+        self.body.write(output[start:output.rindex('</rdf:RDF>')])
+
+    def _finish(self):
+        self.out.write('<?xml version="1.0" encoding="utf-8"?>\n<rdf:RDF\n')
+        for prefix, namespace in sorted(self.namespace_manager.namespaces()):
+            attribute = 'xmlns:{0}'.format(prefix) if prefix else 'xmlns'
+            self.out.write('   {0}={1}\n'.format(attribute,
+                                                 quoteattr(str(namespace))))
+        self.out.write('>\n')
+        self.body.seek(0)
+        shutil.copyfileobj(self.body, self.out)
+        self.out.write('</rdf:RDF>\n')
+
+    def discard(self):
+        self.body.close()
+        super(_RDFXMLDumpWriter, self).discard()
@@ -6,3 +6,7 @@ class RDFParserException(Exception):
 
 class RDFProfileException(Exception):
     pass
+
+
+class ContentNotModified(Exception):
+    pass
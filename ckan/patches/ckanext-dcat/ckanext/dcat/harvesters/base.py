@@ -19,6 +19,9 @@ class CustomSslContextHttpAdapter(HTTPAdapter):
 
 import os
 import logging
+import datetime
+import tempfile
+from collections import OrderedDict
 
 import requests
 import rdflib
@@ -30,32 +33,129 @@ from ckantoolkit import config
 import ckan.plugins.toolkit as toolkit
 
 from ckanext.harvest.harvesters import HarvesterBase
-from ckanext.harvest.model import HarvestObject
+from ckanext.harvest.model import (
+    HarvestJob, HarvestObject, HarvestObjectError, HarvestSourceHttpCache)
 
 from ckanext.dcat.interfaces import IDCATRDFHarvester
+from ckanext.dcat.exceptions import ContentNotModified
 
 
 log = logging.getLogger(__name__)
 
+# harvest source id -> requests session, reused across pages and jobs so
+# connections to the same host are kept alive. Only the most recently used
+# ones are kept (see `DCATHarvester.MAX_SESSIONS`)
+_sessions = OrderedDict()
+
 
 class DCATHarvester(HarvesterBase):
 
     DEFAULT_MAX_FILE_SIZE_MB = 80
     CHUNK_SIZE = 1024 * 512
+    # Downloads bigger than this are spooled to disk when streaming
+    SPOOL_MAX_MEMORY = 1024 * 1024 * 8
+    # Number of per source sessions kept open by each process
+    MAX_SESSIONS = 20
 
     force_import = False
 
+    def _get_session(self, harvest_job):
+        '''
+        Returns the `requests` session used for the source of the job
+
+        Sessions are created once per source (and process), so they are
+        only passed to the `update_session` extension point then. The least
+        recently used ones are closed when there are more than
+        ``MAX_SESSIONS``.
+        '''
+        session = _sessions.get(harvest_job.source_id)
+        if session is not None:
+            _sessions.move_to_end(harvest_job.source_id)
+        else:
+            session = requests.Session()
+            adapter = CustomSslContextHttpAdapter()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+            for harvester in p.PluginImplementations(IDCATRDFHarvester):
+                session = harvester.update_session(session)
+
+            _sessions[harvest_job.source_id] = session
+            while len(_sessions) > self.MAX_SESSIONS:
+                _sessions.popitem(last=False)[1].close()
+        return session
+
+    def _get_http_cache(self, harvest_job, url):
+        '''
+        Returns the HTTP cache validators stored for the source of the job,
+        if they were stored for `url` by a job that finished without object
+        errors, so objects that failed to import are harvested again.
+        '''
+        cache = HarvestSourceHttpCache.get(harvest_job.source_id)
+        if cache is None or cache.url != url or not cache.harvest_job_id:
+            return None
+
+        job = HarvestJob.get(cache.harvest_job_id)
+        if job is None or job.status != u'Finished':
+            return None
+
+        errored = model.Session.query(HarvestObject.id) \
+            .filter(HarvestObject.harvest_job_id == job.id) \
+            .filter(HarvestObject.state == u'ERROR').first()
+        if errored is None:
+            errored = model.Session.query(HarvestObjectError.id) \
+                .join(HarvestObject) \
+                .filter(HarvestObject.harvest_job_id == job.id).first()
+        if errored is not None:
+            return None
+        return cache
+
+    def _update_http_cache(self, harvest_job, validators):
+        '''
+        Stores the HTTP cache validators returned by the last download
+        (see `_get_content_and_type`) for the source of the job, or removes
+        the stored ones if `validators` is None or has no ETag nor
+        Last-Modified value.
+
+        The validators are stored with the job, and only sent once it has
+        finished without object errors (see `_get_http_cache`).
+        '''
+        cache = HarvestSourceHttpCache.get(harvest_job.source_id)
+        if validators and (validators[1] or validators[2]):
+            if cache is None:
+                cache = HarvestSourceHttpCache(
+                    harvest_source_id=harvest_job.source_id)
+            cache.url, cache.etag, cache.last_modified = validators
+            cache.harvest_job_id = harvest_job.id
+            cache.updated = datetime.datetime.utcnow()
+            cache.save()
+        elif cache is not None:
+            cache.delete()
+            cache.commit()
+
     def _get_content_and_type(self, url, harvest_job, page=1,
-                              content_type=None):
+                              content_type=None, stream=False,
+                              conditional=False):
         '''
         Gets the content and type of the given url.
 
+        The url, ETag and Last-Modified values of the response are kept in
+        ``self._http_validators``.
+
         :param url: a web url (starting with http) or a local path
         :param harvest_job: the job, used for error reporting
         :param page: adds paging to the url
         :param content_type: will be returned as type
+        :param stream: if True, the body is not decoded but spooled to a
+            temporary file (kept in memory up to ``SPOOL_MAX_MEMORY``) and
+            returned as a binary file-like object positioned at the start.
+            The caller is responsible for closing it.
+        :param conditional: if True, the validators stored for the source
+            of the job are sent with the request (see `_get_http_cache`), and ``ContentNotModified``
+            is raised if the server answers that the content did not change.
         :return: a tuple containing the content and content-type
         '''
+        self._http_validators = None
         url = url.replace("https://dati.regione.calabria.it", "http://dati.regione.calabria.it/opendata")
         url = url.replace("https://opendata.uniba.it", "http://opendata.uniba.it")
         url = url.replace("https://dati.regione.campania.it/", "http://dati.regione.campania.it/")
@@ -63,8 +163,11 @@ class DCATHarvester(HarvesterBase):
         if not url.lower().startswith('http'):
             # Check local file
             if os.path.exists(url):
-                with open(url, 'r') as f:
-                    content = f.read()
+                if stream:
+                    content = open(url, 'rb')
+                else:
+                    with open(url, 'r') as f:
+                        content = f.read()
                 content_type = content_type or rdflib.util.guess_format(url)
                 return content, content_type
             else:
@@ -80,47 +183,66 @@ class DCATHarvester(HarvesterBase):
 
             log.debug('Getting file %s', url)
 
-            # get the `requests` session object
-            session = requests.Session()
-            session.mount(url, CustomSslContextHttpAdapter())
-         
-            for harvester in p.PluginImplementations(IDCATRDFHarvester):
-                session = harvester.update_session(session)
+            # get the pooled `requests` session object
+            session = self._get_session(harvest_job)
 
-            # first we try a HEAD request which may not be supported
-            did_get = False
-            r = session.head(url)
+            headers = {}
+            if conditional:
+                cache = self._get_http_cache(harvest_job, url)
+                if cache:
+                    if cache.etag:
+                        headers['If-None-Match'] = cache.etag
+                    if cache.last_modified:
+                        headers['If-Modified-Since'] = cache.last_modified
 
-            if r.status_code == 405 or r.status_code == 400:
-                r = session.get(url, stream=True, verify=False)
-                did_get = True
+            # The body is only read once the size has been checked
+            r = session.get(url, stream=True, verify=False, headers=headers)
+
+            if r.status_code == 304 and headers:
+                r.close()
+                raise ContentNotModified(url)
             r.raise_for_status()
 
             max_file_size = 1024 * 1024 * toolkit.asint(config.get('ckanext.dcat.max_file_size', self.DEFAULT_MAX_FILE_SIZE_MB))
             cl = r.headers.get('content-length')
             if cl and int(cl) > max_file_size:
+                r.close()
                 msg = '''Remote file is too big. Allowed
                     file size: {allowed}, Content-Length: {actual}.'''.format(
                     allowed=max_file_size, actual=cl)
                 self._save_gather_error(msg, harvest_job)
                 return None, None
 
-            if not did_get:
-                r = session.get(url, stream=True, verify=False)
+            if stream:
+                content = tempfile.SpooledTemporaryFile(
+                    max_size=self.SPOOL_MAX_MEMORY)
+            else:
+                content = bytearray()
 
             length = 0
-            content = b''
             for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
-                content = content + chunk
-
                 length += len(chunk)
 
                 if length >= max_file_size:
+                    r.close()
+                    if stream:
+                        content.close()
                     self._save_gather_error('Remote file is too big.',
                                             harvest_job)
                     return None, None
 
-            content = content.decode('utf-8')
+                if stream:
+                    content.write(chunk)
+                else:
+                    content.extend(chunk)
+
+            if stream:
+                content.seek(0)
+            else:
+                content = content.decode('utf-8')
+
+            self._http_validators = (url, r.headers.get('etag'),
+                                     r.headers.get('last-modified'))
 
             if content_type is None and r.headers.get('content-type'):
                 content_type = r.headers.get('content-type').split(";", 1)[0]
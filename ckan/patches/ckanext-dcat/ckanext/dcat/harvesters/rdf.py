@@ -6,21 +6,30 @@ import logging
 import hashlib
 import traceback
 
+from sqlalchemy import and_, exists
+from sqlalchemy.orm import aliased
+
 import ckan.plugins as p
 import ckan.model as model
 
 import ckan.lib.plugins as lib_plugins
 from ckanext.harvest.harvesters.base import HarvesterBase
-from ckanext.harvest.model import HarvestObject, HarvestObjectExtra
+from ckanext.harvest.model import HarvestObject, HarvestObjectWriter
 from ckanext.harvest.logic.schema import unicode_safe
 from ckanext.dcat.harvesters.base import DCATHarvester
-from ckanext.dcat.processors import RDFParserException, RDFParser
+from ckanext.dcat.processors import RDFParserException, RDFParser, RDFStreamingParser
 from ckanext.dcat.interfaces import IDCATRDFHarvester
+from ckanext.dcat.exceptions import ContentNotModified
 from ckan.lib.munge import munge_title_to_name, munge_tag
 import ckan.plugins.toolkit as toolkit
 
 log = logging.getLogger(__name__)
 
+STREAM_DOWNLOAD_CONFIG_OPTION = 'ckanext.dcat.harvest.stream_download'
+STREAM_PARSE_CONFIG_OPTION = 'ckanext.dcat.harvest.stream_parse'
+PARSE_PROCESSES_CONFIG_OPTION = 'ckanext.dcat.harvest.parse_processes'
+CONDITIONAL_GET_CONFIG_OPTION = 'ckanext.dcat.harvest.conditional_get'
+
 
 class DCATRDFHarvester(DCATHarvester):
     def _clean_tags(self, tags):
@@ -101,51 +110,64 @@ class DCATRDFHarvester(DCATHarvester):
                 guid = source_url.rstrip('/') + '/' + guid
         return guid
 
-    def _mark_datasets_for_deletion(self, guids_in_source, harvest_job):
+    def _mark_datasets_for_deletion(self, harvest_job):
         '''
-        Given a list of guids in the remote source, checks which in the DB
-        need to be deleted
+        Checks which datasets in the DB need to be deleted, ie the current
+        ones of this source with a guid not gathered by this job
 
-        To do so it queries all guids in the DB for this source and calculates
-        the difference.
+        The comparison is done in the DB against the harvest objects already
+        created for the job, so these need to be flushed first.
 
-        For each of these creates a HarvestObject with the dataset id, marked
-        for deletion.
+        Creates a HarvestObject with the dataset id, marked for deletion,
+        for each of them, and marks the rest of objects for these guids as
+        not current.
 
         Returns a list with the ids of the Harvest Objects to delete.
         '''
-
-        object_ids = []
-
-        # Get all previous current guids and dataset ids for this source
+        gathered = aliased(HarvestObject)
         query = model.Session.query(HarvestObject.guid, HarvestObject.package_id) \
                              .filter(HarvestObject.current==True) \
-                             .filter(HarvestObject.harvest_source_id==harvest_job.source.id)
-
-        guid_to_package_id = {}
-        for guid, package_id in query:
-            guid_to_package_id[guid] = package_id
+                             .filter(HarvestObject.harvest_source_id==harvest_job.source.id) \
+                             .filter(~exists().where(and_(
+                                 gathered.harvest_job_id==harvest_job.id,
+                                 gathered.guid==HarvestObject.guid)))
 
-        guids_in_db = list(guid_to_package_id.keys())
+        guid_to_package_id = dict(query)
+        if not guid_to_package_id:
+            return []
 
-        # Get objects/datasets to delete (ie in the DB but not in the source)
-        guids_to_delete = set(guids_in_db) - set(guids_in_source)
+        # Mark the rest of objects for these guids as not current
+        model.Session.query(HarvestObject) \
+                     .filter(HarvestObject.guid.in_(list(guid_to_package_id.keys()))) \
+                     .update({'current': False}, synchronize_session=False)
 
         # Create a harvest object for each of them, flagged for deletion
-        for guid in guids_to_delete:
-            obj = HarvestObject(guid=guid, job=harvest_job,
-                                package_id=guid_to_package_id[guid],
-                                extras=[HarvestObjectExtra(key='status',
-                                                           value='delete')])
-
-            # Mark the rest of objects for this guid as not current
-            model.Session.query(HarvestObject) \
-                         .filter_by(guid=guid) \
-                         .update({'current': False}, False)
-            obj.save()
-            object_ids.append(obj.id)
+        writer = HarvestObjectWriter(harvest_job)
+        for guid, package_id in guid_to_package_id.items():
+            writer.add(guid=guid, package_id=package_id,
+                       extras={'status': 'delete'})
+        writer.flush()
 
-        return object_ids
+        return writer.ids
+
+    def _content_hash(self, content):
+        '''
+        Returns the md5 hash of the downloaded content
+
+        Content can be a string or a binary file-like object, which is read
+        in chunks and rewound afterwards.
+        '''
+        content_hash = hashlib.md5()
+        if not content:
+            return content_hash
+
+        if hasattr(content, 'read'):
+            for chunk in iter(lambda: content.read(self.CHUNK_SIZE), b''):
+                content_hash.update(chunk)
+            content.seek(0)
+        else:
+            content_hash.update(content.encode('utf8'))
+        return content_hash
 
     def validate_config(self, source_config):
         if not source_config:
@@ -173,111 +195,157 @@ class DCATRDFHarvester(DCATHarvester):
         # Get file contents of first page
         next_page_url = harvest_job.source.url
 
-        guids_in_source = []
-        object_ids = []
+        writer = HarvestObjectWriter(harvest_job)
         last_content_hash = None
         self._names_taken = []
 
-        while next_page_url:
-            for harvester in p.PluginImplementations(IDCATRDFHarvester):
-                next_page_url, before_download_errors = harvester.before_download(next_page_url, harvest_job)
+        stream = toolkit.asbool(
+            toolkit.config.get(STREAM_DOWNLOAD_CONFIG_OPTION, False))
+        stream_parse = toolkit.asbool(
+            toolkit.config.get(STREAM_PARSE_CONFIG_OPTION, False))
+        parse_processes = toolkit.asint(
+            toolkit.config.get(PARSE_PROCESSES_CONFIG_OPTION, 1))
+        conditional = toolkit.asbool(
+            toolkit.config.get(CONDITIONAL_GET_CONFIG_OPTION, False))
 
-                for error_msg in before_download_errors:
-                    self._save_gather_error(error_msg, harvest_job)
+        # HTTP cache validators of the downloaded pages
+        validators = []
 
-                if not next_page_url:
-                    return []
+        # the objects of the pages gathered before an error are not queued
+        gathered = False
+        try:
+            while next_page_url:
+                for harvester in p.PluginImplementations(IDCATRDFHarvester):
+                    next_page_url, before_download_errors = harvester.before_download(next_page_url, harvest_job)
 
-            content, rdf_format = self._get_content_and_type(next_page_url, harvest_job, 1, content_type=rdf_format)
+                    for error_msg in before_download_errors:
+                        self._save_gather_error(error_msg, harvest_job)
 
-            content_hash = hashlib.md5()
-            if content:
-                content_hash.update(content.encode('utf8'))
+                    if not next_page_url:
+                        return []
 
-            if last_content_hash:
-                if content_hash.digest() == last_content_hash.digest():
-                    log.warning('Remote content was the same even when using a paginated URL, skipping')
-                    break
-            else:
-                last_content_hash = content_hash
+                try:
+                    # Only the first page is requested conditionally, the
+                    # validators are not stored for paginated sources
+                    content, rdf_format = self._get_content_and_type(
+                        next_page_url, harvest_job, 1, content_type=rdf_format,
+                        stream=stream, conditional=conditional and not validators)
+                except ContentNotModified:
+                    log.info('Harvest source %s not modified since the last harvest, skipping',
+                             harvest_job.source.url)
+                    return []
+                validators.append(self._http_validators)
 
-            # TODO: store content?
-            for harvester in p.PluginImplementations(IDCATRDFHarvester):
-                content, after_download_errors = harvester.after_download(content, harvest_job)
+                content_hash = self._content_hash(content)
 
-                for error_msg in after_download_errors:
-                    self._save_gather_error(error_msg, harvest_job)
+                if last_content_hash:
+                    if content_hash.digest() == last_content_hash.digest():
+                        log.warning('Remote content was the same even when using a paginated URL, skipping')
+                        if hasattr(content, 'close'):
+                            content.close()
+                        break
+                else:
+                    last_content_hash = content_hash
 
-            if not content:
-                return []
+                # TODO: store content?
+                for harvester in p.PluginImplementations(IDCATRDFHarvester):
+                    new_content, after_download_errors = harvester.after_download(content, harvest_job)
+                    # release the spooled download if the plugin replaced it
+                    if new_content is not content and hasattr(content, 'close'):
+                        content.close()
+                    content = new_content
 
-            # TODO: profiles conf
-            parser = RDFParser()
+                    for error_msg in after_download_errors:
+                        self._save_gather_error(error_msg, harvest_job)
 
-            try:
-                parser.parse(content, _format=rdf_format)
-            except RDFParserException as e:
-                self._save_gather_error('Error parsing the RDF file: {0}'.format(e), harvest_job)
-                return []
+                if not content:
+                    return []
 
-            for harvester in p.PluginImplementations(IDCATRDFHarvester):
-                parser, after_parsing_errors = harvester.after_parsing(parser, harvest_job)
+                # TODO: profiles conf
+                if stream_parse:
+                    parser = RDFStreamingParser()
+                else:
+                    parser = RDFParser()
 
-                for error_msg in after_parsing_errors:
-                    self._save_gather_error(error_msg, harvest_job)
+                try:
+                    parser.parse(content, _format=rdf_format)
+                except RDFParserException as e:
+                    self._save_gather_error('Error parsing the RDF file: {0}'.format(e), harvest_job)
+                    return []
+                finally:
+                    if hasattr(content, 'close'):
+                        content.close()
 
-            if not parser:
-                return []
+                for harvester in p.PluginImplementations(IDCATRDFHarvester):
+                    parser, after_parsing_errors = harvester.after_parsing(parser, harvest_job)
 
-            try:
+                    for error_msg in after_parsing_errors:
+                        self._save_gather_error(error_msg, harvest_job)
 
-                source_dataset = model.Package.get(harvest_job.source.id)
+                if not parser:
+                    return []
 
-                for dataset in parser.datasets():
-                    if not dataset.get('name'):
-                        dataset['name'] = self._gen_new_name(dataset['title'])
-                    if dataset['name'] in self._names_taken:
-                        suffix = len([i for i in self._names_taken if i.startswith(dataset['name'] + '-')]) + 1
-                        dataset['name'] = '{}-{}'.format(dataset['name'], suffix)
-                    self._names_taken.append(dataset['name'])
+                try:
 
-                    # Unless already set by the parser, get the owner organization (if any)
-                    # from the harvest source dataset
-                    if not dataset.get('owner_org'):
-                        if source_dataset.owner_org:
-                            dataset['owner_org'] = source_dataset.owner_org
+                    source_dataset = model.Package.get(harvest_job.source.id)
 
-                    # Try to get a unique identifier for the harvested dataset
-                    guid = self._get_guid(dataset, source_url=source_dataset.url)
+                    if parse_processes > 1:
+                        datasets = parser.datasets_parallel(parse_processes)
+                    else:
+                        datasets = parser.datasets()
+
+                    for dataset in datasets:
+                        if not dataset.get('name'):
+                            dataset['name'] = self._gen_new_name(dataset['title'])
+                        if dataset['name'] in self._names_taken:
+                            suffix = len([i for i in self._names_taken if i.startswith(dataset['name'] + '-')]) + 1
+                            dataset['name'] = '{}-{}'.format(dataset['name'], suffix)
+                        self._names_taken.append(dataset['name'])
+
+                        # Unless already set by the parser, get the owner organization (if any)
+                        # from the harvest source dataset
+                        if not dataset.get('owner_org'):
+                            if source_dataset.owner_org:
+                                dataset['owner_org'] = source_dataset.owner_org
+
+                        # Try to get a unique identifier for the harvested dataset
+                        guid = self._get_guid(dataset, source_url=source_dataset.url)
+
+                        if not guid:
+                            self._save_gather_error('Could not get a unique identifier for dataset: {0}'.format(dataset),
+                                                    harvest_job)
+                            continue
+
+                        dataset['extras'].append({'key': 'guid', 'value': guid})
+                        #log.debug('dataset extras in gather rdf %s',dataset['extras'])
+
+                        writer.add(guid=guid, content=json.dumps(dataset))
+                except Exception as e:
+                    setlic=1
+                    log.debug('ha dato error ma continuo')
+                    self._save_gather_error('Error when processsing dataset: %r / %s' % (e, traceback.format_exc()),
+                                             harvest_job)
+                    return []
+           
 
-                    if not guid:
-                        self._save_gather_error('Could not get a unique identifier for dataset: {0}'.format(dataset),
-                                                harvest_job)
-                        continue
+                # get the next page
+                if setlic==0:
+                   next_page_url = parser.next_page()
 
-                    dataset['extras'].append({'key': 'guid', 'value': guid})
-                    #log.debug('dataset extras in gather rdf %s',dataset['extras'])
-                    guids_in_source.append(guid)
+            writer.flush()
+            gathered = True
+        finally:
+            if not gathered:
+                writer.abort()
 
-                    obj = HarvestObject(guid=guid, job=harvest_job,
-                                        content=json.dumps(dataset))
-            
-                    obj.save()
-                    object_ids.append(obj.id)
-            except Exception as e:
-                setlic=1
-                log.debug('ha dato error ma continuo')
-                self._save_gather_error('Error when processsing dataset: %r / %s' % (e, traceback.format_exc()),
-                                         harvest_job)
-                return []
-           
+        object_ids = writer.ids
 
-            # get the next page
-            if setlic==0:
-               next_page_url = parser.next_page()
+        if conditional:
+            self._update_http_cache(
+                harvest_job, validators[0] if len(validators) == 1 else None)
 
         # Check if some datasets need to be deleted
-        object_ids_to_delete = self._mark_datasets_for_deletion(guids_in_source, harvest_job)
+        object_ids_to_delete = self._mark_datasets_for_deletion(harvest_job)
 
         object_ids.extend(object_ids_to_delete)
 
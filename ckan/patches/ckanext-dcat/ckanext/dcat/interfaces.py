@@ -38,6 +38,10 @@ class IDCATRDFHarvester(Interface):
 
         It returns a valid `requests` session object.
 
+        Sessions are kept and reused for all the requests to the same harvest
+        source, so this is only called when the session of a source is
+        created.
+
         This extension point can be useful to add special parameters to the 
         request (e.g. add client certificates).
 
@@ -61,8 +65,10 @@ class IDCATRDFHarvester(Interface):
         This extension point can be useful to validate the file contents using
         an external service.
 
-        :param content: The remote RDF file contents
-        :type content: string
+        :param content: The remote RDF file contents. When the
+                        ``ckanext.dcat.harvest.stream_download`` option is
+                        enabled this is a binary file-like object instead
+        :type content: string or file-like object
         :param harvest_job: A ``HarvestJob`` domain object which contains a
                             reference to the harvest source
                             (``harvest_job.source``).
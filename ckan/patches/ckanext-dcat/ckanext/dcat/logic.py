@@ -8,7 +8,7 @@ from ckan.plugins import toolkit
 
 import ckanext.dcat.converters as converters
 
-from ckanext.dcat.processors import RDFSerializer
+from ckanext.dcat.processors import RDFSerializer, STREAMING_BATCH_SIZE
 from ckanext.dcat.utils import catalog_uri
 
 DATASETS_PER_PAGE = 100
@@ -49,6 +49,43 @@ def dcat_catalog_show(context, data_dict):
     return output
 
 
+def dcat_catalog_stream(context, data_dict):
+    '''
+    Like `dcat_catalog_show`, but returns a generator of serialization
+    chunks (see `RDFSerializer.serialize_catalog_stream`)
+
+    Datasets are searched in batches while the catalog is serialized, so
+    the generator needs a request context. This is not an action, as the
+    API can not return generators.
+    '''
+    toolkit.check_access('dcat_catalog_show', context, data_dict)
+
+    n = int(config.get('ckanext.dcat.datasets_per_page', DATASETS_PER_PAGE))
+    batch_size = min(n, STREAMING_BATCH_SIZE)
+
+    query = _search_ckan_datasets(context, data_dict, rows=batch_size)
+    pagination_info = _pagination_info(query, data_dict)
+
+    serializer = RDFSerializer(profiles=data_dict.get('profiles'))
+
+    def _dataset_dicts():
+        results = query['results']
+        offset = 0
+        while results:
+            for dataset_dict in results:
+                yield dataset_dict
+            offset += len(results)
+            if len(results) < batch_size or offset >= n:
+                break
+            results = _search_ckan_datasets(
+                context.copy(), data_dict,
+                rows=min(batch_size, n - offset), offset=offset)['results']
+
+    return serializer.serialize_catalog_stream(
+        {}, _dataset_dicts(), _format=data_dict.get('format'),
+        pagination_info=pagination_info)
+
+
 @toolkit.side_effect_free
 def dcat_catalog_search(context, data_dict):
 
@@ -79,7 +116,12 @@ def dcat_datasets_list(context, data_dict):
             for ckan_dataset in ckan_datasets]
 
 
-def _search_ckan_datasets(context, data_dict):
+def _search_ckan_datasets(context, data_dict, rows=None, offset=0):
+    '''
+    Searches the datasets of the requested page
+
+    `rows` and `offset` allow to get just a part of the page.
+    '''
 
     n = int(config.get('ckanext.dcat.datasets_per_page', DATASETS_PER_PAGE))
     page = data_dict.get('page', 1) or 1
@@ -100,8 +142,8 @@ def _search_ckan_datasets(context, data_dict):
                 'Wrong modified date format. Use ISO-8601 format')
 
     search_data_dict = {
-        'rows': n,
-        'start': n * (page - 1),
+        'rows': rows or n,
+        'start': n * (page - 1) + offset,
         'sort': 'metadata_modified desc',
     }
 
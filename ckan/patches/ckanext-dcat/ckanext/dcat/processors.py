@@ -3,9 +3,15 @@ from __future__ import print_function
 from builtins import str
 from builtins import object
 import sys
+import io
+import codecs
 import argparse
 import xml
 import json
+import hashlib
+import collections
+import itertools
+import multiprocessing
 from pkg_resources import iter_entry_points
 import logging
 log = logging.getLogger(__name__)
@@ -14,6 +20,10 @@ from ckantoolkit import config
 import rdflib
 import rdflib.parser
 from rdflib import URIRef, BNode, Literal
+from rdflib.exceptions import ParserError
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.plugins.parsers.nquads import NQuadsParser
+from rdflib.plugins.parsers.rdfxml import create_parser as create_rdfxml_parser
 from rdflib.namespace import Namespace, RDF, XSD
 import datetime
 from dateutil.parser import parse as parse_date
@@ -22,6 +32,8 @@ import ckan.plugins as p
 from ckanext.dcat.utils import catalog_uri, dataset_uri, url_to_rdflib_format, DCAT_EXPOSE_SUBCATALOGS
 from ckanext.dcat.profiles import DCAT, DCT, FOAF
 from ckanext.dcat.exceptions import RDFProfileException, RDFParserException
+from ckanext.dcat import cache
+from ckanext.dcat.source_catalogs import get_source_catalog_matcher
 
 HYDRA = Namespace('http://www.w3.org/ns/hydra/core#')
 DCAT = Namespace("http://www.w3.org/ns/dcat#")
@@ -35,6 +47,30 @@ VCARD = Namespace("http://www.w3.org/2006/vcard/ns#")
 CKAN_SITE_URL='ckanext.dcat.base_uri'
 PREF_LANDING= config.get('ckanext.dcat.base_uri')
 
+# rdflib formats (and media types) that RDFStreamingParser parses
+# incrementally, mapped to the parser used for them
+STREAMING_RDF_FORMATS = {
+    'xml': 'xml',
+    'application/rdf+xml': 'xml',
+    'nt': 'nt',
+    'nt11': 'nt',
+    'ntriples': 'nt',
+    'application/n-triples': 'nt',
+    'nquads': 'nquads',
+    'application/n-quads': 'nquads',
+}
+
+# Number of datasets sent at once to each worker by
+# RDFParser.datasets_parallel
+PARALLEL_CHUNK_SIZE = 20
+
+# rdflib formats RDFSerializer.serialize_catalog_stream can output
+STREAMING_SERIALIZE_FORMATS = ('nt', 'turtle', 'json-ld')
+
+# Number of datasets looked up at once in the fragment cache when
+# streaming a catalog
+STREAMING_BATCH_SIZE = 20
+
 class RDFParserException(Exception):
     pass
 
@@ -74,6 +110,34 @@ class RDFProcessor(object):
 
         self.g = rdflib.ConjunctiveGraph()
 
+        self._profile_instances_key = None
+        self._profile_instances = []
+        self._default_namespaces = None
+        self._context_hash = None
+
+    def _get_profiles(self, graph=None):
+        '''
+        Returns instances of the loaded profiles working on the given graph
+        (by default the class graph)
+
+        Instances are created once per graph and reused for all its datasets,
+        their ``reset()`` method is called before returning them.
+        '''
+        if graph is None:
+            graph = self.g
+
+        key = self._profile_instances_key
+        if not key or key[0] is not graph or key[1] is not self._profiles:
+            self._profile_instances = [
+                profile_class(graph, self.compatibility_mode)
+                for profile_class in self._profiles]
+            self._profile_instances_key = (graph, self._profiles)
+        else:
+            for profile in self._profile_instances:
+                profile.reset()
+
+        return self._profile_instances
+
     def _load_profiles(self, profile_names):
         '''
         Loads the specified RDF parser profiles
@@ -147,6 +211,10 @@ class RDFParser(RDFProcessor):
         ... ). By default RF/XML is expected. The optional parameter _format
         can be used to tell rdflib otherwise.
 
+        Data can also be a binary file-like object (eg the spooled file
+        returned by the harvesters in streaming mode), which is then read
+        by rdflib directly without loading the whole serialization in memory.
+
         It raises a ``RDFParserException`` if there was some error during
         the parsing.
 
@@ -158,7 +226,10 @@ class RDFParser(RDFProcessor):
             _format = 'xml'
 
         try:
-            self.g.parse(data=data, format=_format)
+            if hasattr(data, 'read'):
+                self.g.parse(source=data, format=_format)
+            else:
+                self.g.parse(data=data, format=_format)
         # Apparently there is no single way of catching exceptions from all
         # rdflib parsers at once, so if you use a new one and the parsing
         # exceptions are not cached, add them here.
@@ -188,8 +259,378 @@ class RDFParser(RDFProcessor):
         '''
         for dataset_ref in self._datasets():
             dataset_dict = {}
-            for profile_class in self._profiles:
-                profile = profile_class(self.g, self.compatibility_mode)
+            for profile in self._get_profiles():
+                profile.parse_dataset(dataset_dict, dataset_ref)
+
+            yield dataset_dict
+
+    def _graph_closure(self, refs, stop):
+        '''
+        Returns the triples of the given nodes and of all the nodes
+        reachable from them, without crossing into the `stop` nodes
+        '''
+        triples = []
+        seen = set()
+        stack = list(refs)
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            for pred, o in self.g.predicate_objects(node):
+                triples.append((node, pred, o))
+                if (not isinstance(o, Literal) and o not in seen
+                        and o not in stop):
+                    stack.append(o)
+        return triples
+
+    def _dataset_graphs(self):
+        '''
+        Generator that returns each DCAT dataset on the graph along with a
+        graph holding just the triples needed to parse it
+
+        These are the triples of the dataset node, of the nodes reachable
+        from it (distributions, agents, blank nodes...) and the catalog
+        description.
+
+        Yields (dataset_ref, rdflib.Graph) tuples
+        '''
+        dataset_refs = list(self._datasets())
+        context_refs = (
+            set(self.g.subjects(RDF.type, DCAT.Catalog)) |
+            set(self.g.subjects(RDF.type, HYDRA.PagedCollection)))
+        stop = set(dataset_refs) | context_refs
+
+        context = [triple for triple
+                   in self._graph_closure(context_refs, stop)
+                   if triple[1] != DCAT.dataset]
+
+        for dataset_ref in dataset_refs:
+            g = rdflib.Graph()
+            for triple in context:
+                g.add(triple)
+            for catalog_ref in self.g.subjects(DCAT.dataset, dataset_ref):
+                g.add((catalog_ref, DCAT.dataset, dataset_ref))
+            for triple in self._graph_closure([dataset_ref], stop):
+                g.add(triple)
+            yield dataset_ref, g
+
+    def datasets_parallel(self, processes, chunk_size=PARALLEL_CHUNK_SIZE):
+        '''
+        Generator that returns CKAN datasets parsed from the RDF graph using
+        a pool of worker processes
+
+        The graph of each dataset (see `_dataset_graphs`) is serialized as
+        N-Triples and sent in chunks of `chunk_size` datasets to the workers,
+        which run the profiles on it. Only a few chunks per worker are
+        pending at any time, so datasets are not all serialized upfront.
+
+        Datasets are yielded in the same order as `datasets()`, but note
+        that profiles only see the graph of the dataset being parsed, not
+        the whole catalog.
+
+        If `processes` is lower than 2 this is the same as `datasets()`.
+        '''
+        if not processes or processes < 2:
+            for dataset_dict in self.datasets():
+                yield dataset_dict
+            return
+
+        profile_names = [profile.name for profile in self._profiles]
+
+        def chunks():
+            chunk = []
+            for dataset_ref, g in self._dataset_graphs():
+                # Blank node labels are not kept across serializations,
+                # workers look for the only dataset in the graph instead
+                ref = str(dataset_ref) if isinstance(dataset_ref, URIRef) \
+                    else None
+                chunk.append((ref, g.serialize(format='nt')))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        pool = multiprocessing.get_context('fork').Pool(
+            processes, initializer=_init_parser_worker,
+            initargs=(profile_names, self.compatibility_mode))
+        try:
+            pending = collections.deque()
+            for chunk in chunks():
+                pending.append(pool.apply_async(_parse_datasets_chunk,
+                                                (chunk,)))
+                while len(pending) >= processes * 2:
+                    for dataset_dict in pending.popleft().get():
+                        yield dataset_dict
+            while pending:
+                for dataset_dict in pending.popleft().get():
+                    yield dataset_dict
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+# parser used by each parser worker for all its chunks
+_worker_parser = None
+
+
+def _init_worker():
+    '''
+    Makes sure forked workers do not reuse the database connections of the
+    parent process
+    '''
+    try:
+        import ckan.model as model
+        model.meta.engine.dispose(close=False)
+        model.Session.registry.clear()
+    except Exception as e:
+        log.debug('Could not reset the database session on worker: %s', e)
+
+
+def _init_parser_worker(profile_names, compatibility_mode):
+    '''
+    Initializes a forked parser worker, creating the parser it uses for all
+    its chunks so the profiles are only loaded once
+    '''
+    global _worker_parser
+    _init_worker()
+    _worker_parser = RDFParser(profiles=profile_names,
+                               compatibility_mode=compatibility_mode)
+
+
+def _parse_datasets_chunk(items):
+    '''
+    Runs the profiles on a chunk of datasets sent by
+    `RDFParser.datasets_parallel`, returns a list of dataset dicts
+    '''
+    parser = _worker_parser
+
+    datasets = []
+    for ref, data in items:
+        g = rdflib.Graph()
+        g.parse(data=data, format='nt')
+        if ref:
+            dataset_ref = URIRef(ref)
+        else:
+            dataset_ref = next(g.subjects(RDF.type, DCAT.Dataset))
+
+        dataset_dict = {}
+        for profile in parser._get_profiles(g):
+            profile.parse_dataset(dataset_dict, dataset_ref)
+        datasets.append(dataset_dict)
+
+    return datasets
+
+
+class _TripleSink(object):
+    '''
+    Graph-like target for the rdflib parsers that forwards each parsed
+    triple to a callback instead of storing it
+    '''
+
+    identifier = None
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    # N-Triples parser API
+    def triple(self, s, pred, o):
+        self.callback((s, pred, o))
+
+    # RDF/XML handler and N-Quads parser API
+    def add(self, triple):
+        self.callback(triple)
+
+    def get_context(self, identifier):
+        return self
+
+    def bind(self, *args, **kwargs):
+        pass
+
+
+class RDFStreamingParser(RDFParser):
+    '''
+    An RDF to CKAN parser that does not build a graph for the whole catalog
+
+    While the source is parsed, triples are just grouped by subject.
+    `datasets()` then passes each dataset to the profiles in a small graph
+    containing only the dataset node, the nodes reachable from it
+    (distributions, agents, blank nodes...) and the catalog description.
+    Triples of a dataset are released once it has been yielded, as are
+    the nodes no other pending dataset links to.
+
+    N-Triples, N-Quads and RDF/XML (via SAX) are parsed incrementally,
+    other formats are parsed with rdflib first and then grouped.
+
+    Note that `self.g` only holds the catalog and pagination nodes.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(RDFStreamingParser, self).__init__(*args, **kwargs)
+
+        # subject -> list of (predicate, object)
+        self._index = {}
+        # node -> number of triples linking to it
+        self._refs = {}
+        # dataset refs, in document order
+        self._dataset_refs = {}
+        # dataset ref -> catalogs listing it
+        self._dataset_catalogs = {}
+        self._context_refs = set()
+
+    def _add(self, triple):
+        s, pred, o = triple
+        self._index.setdefault(s, []).append((pred, o))
+
+        if not isinstance(o, Literal):
+            self._refs[o] = self._refs.get(o, 0) + 1
+
+        if pred == RDF.type:
+            if o == DCAT.Dataset:
+                self._dataset_refs[s] = None
+            elif o in (DCAT.Catalog, HYDRA.PagedCollection):
+                self._context_refs.add(s)
+
+    def _text_stream(self, data):
+        if isinstance(data, str):
+            return io.StringIO(data)
+        if isinstance(data, (bytes, bytearray)):
+            data = io.BytesIO(data)
+        if hasattr(data, 'encoding'):
+            return data
+        return codecs.getreader('utf-8')(data)
+
+    def parse(self, data, _format=None):
+        '''
+        Parses an RDF graph serialization into the subject index
+
+        Accepts the same arguments as `RDFParser.parse`, and raises
+        ``RDFParserException`` as well on parsing errors.
+
+        Returns nothing.
+        '''
+        _format = url_to_rdflib_format(_format)
+        if not _format or _format == 'pretty-xml':
+            _format = 'xml'
+
+        streaming_format = STREAMING_RDF_FORMATS.get(_format)
+        if not streaming_format:
+            super(RDFStreamingParser, self).parse(data, _format)
+            for triple in self.g:
+                self._add(triple)
+            self.g = rdflib.ConjunctiveGraph()
+        else:
+            sink = _TripleSink(self._add)
+            try:
+                if streaming_format == 'xml':
+                    if hasattr(data, 'read'):
+                        source = rdflib.parser.create_input_source(source=data)
+                    else:
+                        source = rdflib.parser.create_input_source(data=data)
+                    create_rdfxml_parser(source, sink).parse(source)
+                elif streaming_format == 'nquads':
+                    # Bypass NQuadsParser.parse, which requires a
+                    # context aware store, the line parsing is the same
+                    W3CNTriplesParser.parse(NQuadsParser(sink=sink),
+                                            self._text_stream(data))
+                else:
+                    W3CNTriplesParser(sink=sink).parse(
+                        self._text_stream(data))
+            except (SyntaxError, xml.sax.SAXParseException, ParserError,
+                    TypeError) as e:
+                raise RDFParserException(e)
+
+        self._index_context()
+
+    def _index_context(self):
+        '''
+        Moves the catalog and pagination nodes to `self.g`
+
+        Links from catalogs to their datasets are kept aside, and only added
+        to the graph of the relevant dataset.
+        '''
+        for catalog_ref in self._context_refs:
+            for pred, o in self._index.get(catalog_ref, ()):
+                if pred == DCAT.dataset:
+                    self._dataset_catalogs.setdefault(o, []).append(
+                        catalog_ref)
+
+        for triple in self._reachable(self._context_refs):
+            if triple[1] != DCAT.dataset:
+                self.g.add(triple)
+
+    def _reachable(self, refs):
+        '''
+        Returns the triples of the given nodes and of all the nodes
+        reachable from them, without crossing into datasets or catalogs
+        '''
+        triples = []
+        seen = set()
+        stack = list(refs)
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            for pred, o in self._index.get(node, ()):
+                triples.append((node, pred, o))
+                if (o in self._index and o not in seen
+                        and o not in self._dataset_refs
+                        and o not in self._context_refs):
+                    stack.append(o)
+        return triples
+
+    def _release(self, node):
+        '''
+        Drops the triples of a node, and recursively of the nodes that are
+        not linked from anywhere else anymore
+        '''
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for pred, o in self._index.pop(node, ()):
+                if isinstance(o, Literal):
+                    continue
+                self._refs[o] -= 1
+                if (self._refs[o] <= 0 and o in self._index
+                        and o not in self._dataset_refs
+                        and o not in self._context_refs):
+                    stack.append(o)
+
+    def _dataset_graph(self, dataset_ref):
+        '''
+        Returns a graph with the triples needed to parse a single dataset
+        '''
+        g = rdflib.Graph()
+        for triple in self.g:
+            g.add(triple)
+        for catalog_ref in self._dataset_catalogs.get(dataset_ref, ()):
+            g.add((catalog_ref, DCAT.dataset, dataset_ref))
+        for triple in self._reachable([dataset_ref]):
+            g.add(triple)
+        return g
+
+    def _datasets(self):
+        for dataset in self._dataset_refs:
+            yield dataset
+
+    def _dataset_graphs(self):
+        for dataset_ref in list(self._dataset_refs):
+            yield dataset_ref, self._dataset_graph(dataset_ref)
+            self._release(dataset_ref)
+
+    def datasets(self):
+        '''
+        Generator that returns CKAN datasets parsed from the RDF source
+
+        Works like `RDFParser.datasets`, but each profile is passed a graph
+        with just the dataset being parsed.
+        '''
+        for dataset_ref, g in self._dataset_graphs():
+            dataset_dict = {}
+            for profile in self._get_profiles(g):
                 profile.parse_dataset(dataset_dict, dataset_ref)
 
             yield dataset_dict
@@ -241,12 +682,12 @@ class RDFSerializer(RDFProcessor):
                                 Literal(paging_info[key])))
         return pagination_ref
 
-    def graph_from_dataset(self, dataset_dict):
+    def graph_from_dataset(self, dataset_dict, graph=None):
         '''
         Given a CKAN dataset dict, creates a graph using the loaded profiles
 
         The class RDFLib graph (accessible via `serializer.g`) will be updated
-        by the loaded profiles.
+        by the loaded profiles, unless another `graph` is passed.
 
         Returns the reference to the dataset, which will be an rdflib URIRef.
         '''
@@ -294,12 +735,178 @@ class RDFSerializer(RDFProcessor):
 
         dataset_ref = URIRef(dataset_ref1)
         log.info('dataset_ref in graph_from_dataset %s',dataset_ref)
-        for profile_class in self._profiles:
-            profile = profile_class(self.g, self.compatibility_mode)
+        for profile in self._get_profiles(graph):
             profile.graph_from_dataset(dataset_dict, dataset_ref)
 
         return dataset_ref
 
+    def _context_version(self):
+        '''
+        Returns a hash of what the triples of a dataset depend on besides the
+        dataset itself: the profiles, their vocabularies (see
+        `RDFProfile.dumps_version`) and the organizations, with their extras
+
+        It is computed once per serializer.
+        '''
+        if self._context_hash is not None:
+            return self._context_hash
+
+        import ckan.model as model
+
+        version = hashlib.sha1()
+        for profile_class in self._profiles:
+            profile = profile_class(rdflib.Graph(), self.compatibility_mode)
+            name = getattr(profile_class, 'name', None) or \
+                profile_class.__name__
+            version.update(json.dumps(
+                [name, profile.dumps_version()]).encode('utf-8'))
+
+        organizations = model.Session.query(
+            model.Group.id, model.Group.name, model.Group.title,
+            model.Group.description, model.Group.image_url,
+            model.Group.state) \
+            .filter(model.Group.is_organization.is_(True)) \
+            .order_by(model.Group.id)
+        for row in organizations:
+            version.update(json.dumps(list(row)).encode('utf-8'))
+
+        extras = model.Session.query(
+            model.GroupExtra.group_id, model.GroupExtra.key,
+            model.GroupExtra.value, model.GroupExtra.state) \
+            .join(model.Group, model.Group.id == model.GroupExtra.group_id) \
+            .filter(model.Group.is_organization.is_(True)) \
+            .order_by(model.GroupExtra.group_id, model.GroupExtra.key)
+        for row in extras:
+            version.update(json.dumps(list(row)).encode('utf-8'))
+
+        self._context_hash = version.hexdigest()
+        return self._context_hash
+
+    def _fragment_field(self, dataset_dict):
+        '''
+        Returns the fragment cache field of a dataset, which changes with
+        the dataset modification date, the profiles used and what else
+        their triples depend on (see `_context_version`)
+        '''
+        profiles = ','.join(getattr(profile, 'name', None) or profile.__name__
+                            for profile in self._profiles)
+        return '{0}|{1}|{2}|{3}'.format(
+            profiles, int(self.compatibility_mode), self._context_version(),
+            dataset_dict.get('metadata_modified'))
+
+    def _fragment_from_graph(self, dataset_ref, graph):
+        '''
+        Returns the fragment cache entry for a graph holding the triples of
+        a single dataset
+        '''
+        if self._default_namespaces is None:
+            self._default_namespaces = set(rdflib.Graph().namespaces())
+        return {
+            'ref': str(dataset_ref),
+            'ns': [(prefix, str(namespace))
+                   for prefix, namespace in graph.namespaces()
+                   if (prefix, namespace) not in self._default_namespaces],
+            'nt': graph.serialize(format='nt'),
+        }
+
+    def _load_fragment(self, graph, fragment, bound):
+        '''
+        Adds the triples of a cached fragment to a graph, binding the
+        namespaces not in `bound` yet
+
+        Returns the reference to the dataset.
+        '''
+        for prefix, namespace in fragment['ns']:
+            if prefix not in bound:
+                graph.bind(prefix, namespace)
+                bound.add(prefix)
+        W3CNTriplesParser(sink=_TripleSink(graph.add)).parse(
+            io.StringIO(fragment['nt']))
+        return URIRef(fragment['ref'])
+
+    def _graph_from_datasets_cached(self, dataset_dicts):
+        '''
+        Adds the datasets to the class graph like `graph_from_dataset`, but
+        reusing the triples cached for the datasets not modified since they
+        were last serialized
+
+        The triples of the other datasets are generated on a separate graph
+        and then cached.
+
+        Returns the list of references of the datasets.
+        '''
+        entries = [(dataset_dict['id'], self._fragment_field(dataset_dict))
+                   for dataset_dict in dataset_dicts]
+        fragments = cache.get_fragments(entries)
+
+        fragment_graph = None
+        new_fragments = {}
+        bound = set()
+        dataset_refs = []
+        for dataset_dict, entry, fragment in zip(dataset_dicts, entries,
+                                                 fragments):
+            if fragment is None:
+                if fragment_graph is None:
+                    fragment_graph = rdflib.Graph()
+                else:
+                    fragment_graph.remove((None, None, None))
+                dataset_ref = self.graph_from_dataset(dataset_dict,
+                                                      fragment_graph)
+                fragment = self._fragment_from_graph(dataset_ref,
+                                                     fragment_graph)
+                new_fragments[entry] = fragment
+
+            dataset_refs.append(self._load_fragment(self.g, fragment, bound))
+
+        cache.set_fragments(new_fragments)
+
+        return dataset_refs
+
+    def _dataset_graphs(self, dataset_dicts):
+        '''
+        Generator that adds each dataset to a graph of its own, yielding
+        ``(dataset_dict, dataset_ref, graph)`` tuples
+
+        Datasets are processed in batches of `STREAMING_BATCH_SIZE`, looked
+        up at once in the fragment cache when enabled. The same graph is
+        cleared and reused for all the datasets of a batch (the rdflib
+        memory store keeps some index entries of the removed triples, so
+        it is not reused any longer).
+        '''
+        use_cache = cache.fragment_cache_enabled()
+
+        dataset_dicts = iter(dataset_dicts)
+        while True:
+            batch = list(itertools.islice(dataset_dicts, STREAMING_BATCH_SIZE))
+            if not batch:
+                break
+            graph = rdflib.Graph()
+            bound = set()
+
+            if use_cache:
+                entries = [(dataset_dict['id'],
+                            self._fragment_field(dataset_dict))
+                           for dataset_dict in batch]
+                fragments = cache.get_fragments(entries)
+            else:
+                entries = fragments = [None] * len(batch)
+
+            new_fragments = {}
+            for dataset_dict, entry, fragment in zip(batch, entries,
+                                                     fragments):
+                graph.remove((None, None, None))
+                if fragment is None:
+                    dataset_ref = self.graph_from_dataset(dataset_dict, graph)
+                    if use_cache:
+                        new_fragments[entry] = self._fragment_from_graph(
+                            dataset_ref, graph)
+                else:
+                    dataset_ref = self._load_fragment(graph, fragment, bound)
+
+                yield dataset_dict, dataset_ref, graph
+
+            cache.set_fragments(new_fragments)
+
     def serialize_datasets(self, dataset_dicts, _format='xml'):
         '''
         Given a list of CKAN dataset dicts, returns an RDF serialization
@@ -325,8 +932,7 @@ class RDFSerializer(RDFProcessor):
 
         catalog_ref = URIRef(catalog_uri())
 
-        for profile_class in self._profiles:
-            profile = profile_class(self.g, self.compatibility_mode)
+        for profile in self._get_profiles():
             profile.graph_from_catalog(catalog_dict, catalog_ref)
 
         return catalog_ref
@@ -364,7 +970,9 @@ class RDFSerializer(RDFProcessor):
         values from the CKAN config (eg from `ckan.site_title`).
 
         If passed a list of CKAN dataset dicts, these will be also serializsed
-        as part of the catalog.
+        as part of the catalog. When the ``ckanext.dcat.fragment_cache``
+        option is enabled, the triples of the datasets are cached and reused
+        until the datasets are modified.
         **Note:** There is no hard limit on the number of datasets at this
         level, this should be handled upstream.
 
@@ -379,18 +987,14 @@ class RDFSerializer(RDFProcessor):
 
         catalog_ref = self.graph_from_catalog(catalog_dict)
         if dataset_dicts:
-            for dataset_dict in dataset_dicts:
-                dataset_ref = self.graph_from_dataset(dataset_dict)
-                log.debug('catalog_ref in graph %s',catalog_ref)
-                cat_ref = self._add_source_catalog(catalog_ref, dataset_dict, dataset_ref)
-                if not cat_ref:
-                    org_site=self.g.objects(URIRef(str(catalog_ref)+"/organization/"+dataset_dict.get('owner_org')), VCARD.hasURL)
-                    try:
-                     self.g.add((next(org_site), DCAT.dataset, dataset_ref))
-                    except StopIteration:
-                     log.debug("No more elements in org_site")
-                else:
-                    self.g.add((cat_ref, DCAT.dataset, dataset_ref))
+            if cache.fragment_cache_enabled():
+                dataset_refs = self._graph_from_datasets_cached(dataset_dicts)
+            else:
+                dataset_refs = (self.graph_from_dataset(dataset_dict)
+                                for dataset_dict in dataset_dicts)
+            for dataset_dict, dataset_ref in zip(dataset_dicts, dataset_refs):
+                self._add_dataset_to_catalog(catalog_ref, dataset_dict,
+                                             dataset_ref)
 
         if pagination_info:
             self._add_pagination_triples(pagination_info)
@@ -403,57 +1007,104 @@ class RDFSerializer(RDFProcessor):
 
         return output
 
-    def _add_source_catalog(self, root_catalog_ref, dataset_dict, dataset_ref):
-        if not p.toolkit.asbool(config.get(DCAT_EXPOSE_SUBCATALOGS, False)):
+    def serialize_catalog_stream(self, catalog_dict=None, dataset_dicts=None,
+                                 _format='nt', pagination_info=None):
+        '''
+        Generator version of `serialize_catalog`, yielding the serialization
+        in chunks: the catalog description first, then each dataset as soon
+        as its triples are generated, and the pagination triples last
+
+        `dataset_dicts` can be any iterable, datasets are consumed as they
+        are serialized. Only the formats in `STREAMING_SERIALIZE_FORMATS` are
+        supported. Each Turtle chunk declares the prefixes it uses, and
+        JSON-LD is output as an array of (expanded) node objects.
+        '''
+        _format = url_to_rdflib_format(_format)
+        if _format not in STREAMING_SERIALIZE_FORMATS:
+            raise ValueError('Can not stream the {0} format'.format(_format))
+
+        graphs = self._catalog_graphs(
+            catalog_dict, self._dataset_graphs(dataset_dicts or []),
+            pagination_info)
+        for chunk in self._serialize_graphs(graphs, _format):
+            yield chunk
+
+    def _serialize_graphs(self, graphs, _format):
+        '''
+        Generator that serializes each of the graphs in one of the
+        `STREAMING_SERIALIZE_FORMATS`, so the chunks can be concatenated
+        '''
+        if _format != 'json-ld':
+            for graph in graphs:
+                yield graph.serialize(format=_format)
             return
 
-        def _get_from_extra(key):
-            for ex in dataset_dict.get('extras', []):
-                if ex['key'] == key:
-                    return ex['value']
+        separator = '[\n'
+        for graph in graphs:
+            nodes = json.loads(graph.serialize(format=_format))
+            if nodes:
+                yield separator + ',\n'.join(json.dumps(node)
+                                              for node in nodes)
+                separator = ',\n'
+        yield '[]' if separator == '[\n' else '\n]'
 
-        source_uri = _get_from_extra('source_catalog_homepage') 
+    def _catalog_graphs(self, catalog_dict, dataset_graphs, pagination_info):
+        '''
+        Generator of the graphs serialized by `serialize_catalog_stream`
 
-        log.debug('source_uri pre patch %s',source_uri)
-        # patch per harvesting per hasPart Catalog
-        if 'r_marche' in dataset_dict.get('holder_identifier'):
-            source_uri='https://dati.regione.marche.it/'
-        elif 'r_emiro' in dataset_dict.get('holder_identifier'):
-            source_uri='https://dati.emilia-romagna.it'
-            source_catalog_homepage=source_uri
-        elif 'r_toscan' in dataset_dict.get('holder_identifier'):
-            source_uri='https://dati.toscana.it'
-        elif 'r_lazio' in dataset_dict.get('holder_identifier'):
-            source_uri='http://dati.regione.lazio.it'
-        elif 'r_basili' in dataset_dict.get('holder_identifier'):
-            source_uri='https://dati.regione.basilicata.it'
-        elif 'aci' in dataset_dict.get('holder_identifier'):
-            source_uri='http://lod.aci.it/'
-            source_catalog_homepage=source_uri
-        elif 'm_lps' in dataset_dict.get('holder_identifier'):
-            source_uri='http://dati.lavoro.gov.it/'
-        elif 'c_l219' in dataset_dict.get('holder_identifier'):
-            source_uri='http://aperto.comune.torino.it/'
-        elif 'cr_campa' in dataset_dict.get('holder_identifier'):
-            source_uri='http://opendata-crc.di.unisa.it/'
-        elif '00304260409' in dataset_dict.get('holder_identifier'):
-            source_uri='https://opendata.comune.rimini.it/'
-        elif 'c_a345' in dataset_dict.get('holder_identifier'):
-            source_uri='https://ckan.opendatalaquila.it/'
-        elif 'uds_ca' in dataset_dict.get('holder_identifier'):
-            source_uri='https://data.tdm-project.it'
-        elif 'm_it' in dataset_dict.get('holder_identifier'):
-            source_uri='https://www.interno.gov.it/'
-        elif 'm_inf' in dataset_dict.get('holder_identifier'):
-            source_uri='https://dati.mit.gov.it/'
-        elif 'uni_ba' in dataset_dict.get('holder_identifier'):
-            source_uri='http://opendata.uniba.it/'
-        elif 'opendata.maggioli.cloud' in dataset_dict.get('extras', []):
-            source_uri='https://www.opendata.maggioli.cloud/'
-            log.debug('setto source_uri per Maggioli')
+        `dataset_graphs` yields ``(dataset_dict, dataset_ref, graph)``
+        tuples, like `_dataset_graphs`. Sub-catalogs (see
+        `_add_source_catalog`) are only described along with the first of
+        their datasets.
+        '''
+        self.g = catalog_graph = rdflib.Graph()
+        catalog_ref = self.graph_from_catalog(catalog_dict)
+        yield catalog_graph
+
+        parts = set()
+        for dataset_dict, dataset_ref, graph in dataset_graphs:
+            for triple in parts:
+                graph.add(triple)
+            self.g = graph
+            try:
+                self._add_dataset_to_catalog(catalog_ref, dataset_dict,
+                                             dataset_ref)
+            finally:
+                self.g = catalog_graph
+            for triple in parts:
+                graph.remove(triple)
+            parts.update(graph.triples((catalog_ref, DCT.hasPart, None)))
+
+            yield graph
 
+        if pagination_info:
+            self.g = rdflib.Graph()
+            self._add_pagination_triples(pagination_info)
+            yield self.g
+
+    def _add_dataset_to_catalog(self, catalog_ref, dataset_dict, dataset_ref):
+        log.debug('catalog_ref in graph %s',catalog_ref)
+        cat_ref = self._add_source_catalog(catalog_ref, dataset_dict, dataset_ref)
+        if not cat_ref:
+            org_site=self.g.objects(URIRef(str(catalog_ref)+"/organization/"+dataset_dict.get('owner_org')), VCARD.hasURL)
+            try:
+             self.g.add((next(org_site), DCAT.dataset, dataset_ref))
+            except StopIteration:
+             log.debug("No more elements in org_site")
         else:
-            source_uri = _get_from_extra('source_catalog_homepage')
+            self.g.add((cat_ref, DCAT.dataset, dataset_ref))
+
+    def _add_source_catalog(self, root_catalog_ref, dataset_dict, dataset_ref):
+        if not p.toolkit.asbool(config.get(DCAT_EXPOSE_SUBCATALOGS, False)):
+            return
+
+        # the first value of a key wins
+        extras = dict((ex['key'], ex['value']) for ex in reversed(dataset_dict.get('extras') or []))
+        _get_from_extra = extras.get
+
+        # harvested catalogs without source catalog metadata, see source_catalogs.ini
+        source_uri = get_source_catalog_matcher().match(dataset_dict.get('holder_identifier'))\
+            or _get_from_extra('source_catalog_homepage')
 
         if not source_uri:
             return
@@ -518,6 +1169,8 @@ class RDFSerializer(RDFProcessor):
                    if 'aci' in dataset_dict.get('holder_identifier'):
                       dataset_dict['extras'].append({'key': 'source_catalog_modified', 'value': _get_from_extra('dcat_modified')})
                       dataset_dict['extras'].append({'key': 'source_catalog_language', 'value': 'ITA'})
+                      extras.setdefault('source_catalog_modified', _get_from_extra('dcat_modified'))
+                      extras.setdefault('source_catalog_language', 'ITA')
                  if key == 'source_catalog_modified':
                    default_datetime = datetime.datetime(1, 1, 1, 0, 0, 0)
                    _date = parse_date(value, default=default_datetime)
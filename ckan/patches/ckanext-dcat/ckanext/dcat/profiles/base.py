@@ -128,6 +128,33 @@ class RDFProfile(object):
         # _license().
         self._licenceregister_cache = None
 
+        # Config options used on every dataset are read once, as instances
+        # are reused by the processors for all datasets in a graph
+        self._default_lang = config.get("ckan.locale_default", "it")
+        self._expose_subcatalogs = asbool(
+            config.get(DCAT_EXPOSE_SUBCATALOGS, False))
+
+    def reset(self):
+        """
+        Called by the processors before the instance is used on another
+        dataset (or catalog) of the same graph
+
+        Profiles keeping per-dataset state on the instance should clear it
+        here. State shared by all datasets (like the license register cache
+        or config values read in the constructor) can be kept.
+        """
+        pass
+
+    def dumps_version(self):
+        """
+        Returns a JSON serializable value that changes when the triples the
+        profile generates for unchanged datasets change, eg when the
+        vocabularies it uses are reloaded. The catalog dumps serialize all
+        the datasets again when it changes, and cached dataset triples
+        are not reused.
+        """
+        return None
+
     def _datasets(self):
         """
         Generator that returns all DCAT datasets on the graph
@@ -180,7 +207,7 @@ class RDFProfile(object):
 
         If found, the string representation is returned, else an empty string
         """
-        default_lang = config.get("ckan.locale_default", "it")
+        default_lang = self._default_lang
         fallback = ""
         for o in self.g.objects(subject, predicate):
             if isinstance(o, Literal):
@@ -928,7 +955,7 @@ class RDFProfile(object):
         This will not be used if ckanext.dcat.expose_subcatalogs
         configuration option is set to False.
         """
-        if not asbool(config.get(DCAT_EXPOSE_SUBCATALOGS, False)):
+        if not self._expose_subcatalogs:
             return
         catalogs = set(self.g.subjects(DCAT.dataset, dataset_ref))
         root = self._get_root_catalog_ref()
@@ -51,6 +51,17 @@ class EuropeanDCATAPProfile(RDFProfile):
 
     """
 
+    def __init__(self, graph, compatibility_mode=False):
+        super(EuropeanDCATAPProfile, self).__init__(graph, compatibility_mode)
+
+        self._do_clean_tags = toolkit.asbool(config.get(DCAT_CLEAN_TAGS, False))
+        self._normalize_ckan_format = toolkit.asbool(
+            config.get("ckanext.dcat.normalize_ckan_format", True)
+        )
+        self._inherit_license = toolkit.asbool(
+            config.get(DISTRIBUTION_LICENSE_FALLBACK_CONFIG, False)
+        )
+
     def parse_dataset(self, dataset_dict, dataset_ref):
 
         dataset_dict["extras"] = []
@@ -88,7 +99,7 @@ class EuropeanDCATAPProfile(RDFProfile):
 
         # Tags
         # replace munge_tag to noop if there's no need to clean tags
-        do_clean = toolkit.asbool(config.get(DCAT_CLEAN_TAGS, False))
+        do_clean = self._do_clean_tags
         tags_val = [
             munge_tag(tag) if do_clean else tag for tag in self._keywords(dataset_ref)
         ]
@@ -197,7 +208,7 @@ class EuropeanDCATAPProfile(RDFProfile):
             dataset_dict["license_id"] = self._license(dataset_ref)
 
         # Source Catalog
-        if toolkit.asbool(config.get(DCAT_EXPOSE_SUBCATALOGS, False)):
+        if self._expose_subcatalogs:
             catalog_src = self._get_source_catalog(dataset_ref)
             if catalog_src is not None:
                 src_data = self._extract_catalog_dict(catalog_src)
@@ -254,10 +265,7 @@ class EuropeanDCATAPProfile(RDFProfile):
                 resource_dict["rights"] = rights
 
             # Format and media type
-            normalize_ckan_format = toolkit.asbool(
-                config.get("ckanext.dcat.normalize_ckan_format", True)
-            )
-            imt, label = self._distribution_format(distribution, normalize_ckan_format)
+            imt, label = self._distribution_format(distribution, self._normalize_ckan_format)
 
             if imt:
                 resource_dict["mimetype"] = imt
@@ -532,7 +540,7 @@ class EuropeanDCATAPProfile(RDFProfile):
 
         # Use fallback license if set in config
         resource_license_fallback = None
-        if toolkit.asbool(config.get(DISTRIBUTION_LICENSE_FALLBACK_CONFIG, False)):
+        if self._inherit_license:
             if "license_id" in dataset_dict and isinstance(
                 URIRefOrLiteral(dataset_dict["license_id"]), URIRef
             ):
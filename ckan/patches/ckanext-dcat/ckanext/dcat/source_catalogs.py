@@ -0,0 +1,103 @@
+import logging
+import os
+import re
+from configparser import ConfigParser
+
+from ckantoolkit import config
+
+log = logging.getLogger(__name__)
+
+SOURCE_CATALOGS_FILE = 'ckanext.dcat.source_catalogs.file'
+DEFAULT_SOURCE_CATALOGS_FILE = '/srv/app/patches/source_catalogs.ini'
+SOURCE_CATALOGS_SECTION = 'dcat:source_catalogs'
+
+# max number of holder identifiers whose homepage is kept by a matcher
+MATCH_CACHE_SIZE = 10000
+
+
+class SourceCatalogMatcher(object):
+    '''
+    Finds the homepage of the catalog a dataset was harvested from, given
+    its holder identifier.
+
+    Rules are ``(substring, homepage)`` pairs: the first rule whose
+    substring is contained in the identifier wins. All the substrings are
+    compiled into a single regular expression, so each identifier is
+    scanned once whatever the number of rules.
+    '''
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._priority = {}
+        for idx, (substring, homepage) in enumerate(self.rules):
+            self._priority.setdefault(substring, (idx, homepage))
+        self._pattern = None
+        if self._priority:
+            # the lookahead finds the matches starting at every position,
+            # with the first rule matching at that position
+            self._pattern = re.compile('(?=({}))'.format(
+                '|'.join(re.escape(substring) for substring, homepage in self.rules)))
+        self._cache = {}
+
+    def match(self, identifier):
+        if not identifier or self._pattern is None:
+            return None
+        try:
+            return self._cache[identifier]
+        except KeyError:
+            pass
+
+        found = [self._priority[m.group(1)] for m in self._pattern.finditer(identifier)]
+        homepage = min(found)[1] if found else None
+
+        if len(self._cache) >= MATCH_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[identifier] = homepage
+        return homepage
+
+
+def load_source_catalogs(fname):
+    '''
+    Reads the holder identifier to source catalog homepage rules from an
+    .ini file:
+
+[dcat:source_catalogs]
+
+# the first identifier part found in the holder identifier wins
+r_marche = https://dati.regione.marche.it/
+r_emiro = https://dati.emilia-romagna.it
+    '''
+    fpath = os.path.abspath(fname)
+    conf = ConfigParser()
+    # keep identifiers case
+    conf.optionxform = str
+    conf.read([fpath])
+    if not conf.has_section(SOURCE_CATALOGS_SECTION):
+        log.warning('Source catalogs config: cannot find %s section in %s',
+                    SOURCE_CATALOGS_SECTION, fpath)
+        return SourceCatalogMatcher([])
+    rules = [(identifier, homepage.strip())
+             for identifier, homepage in conf.items(SOURCE_CATALOGS_SECTION, raw=True)
+             if identifier and homepage.strip()]
+    log.info('Read %s source catalogs from %s', len(rules), fpath)
+    return SourceCatalogMatcher(rules)
+
+
+_matchers = {}
+
+
+def get_source_catalog_matcher():
+    '''
+    Returns the matcher of the file set in `ckanext.dcat.source_catalogs.file`,
+    read once per process
+    '''
+    fname = config.get(SOURCE_CATALOGS_FILE, DEFAULT_SOURCE_CATALOGS_FILE)
+    matcher = _matchers.get(fname)
+    if matcher is None:
+        if fname and os.path.exists(fname):
+            matcher = load_source_catalogs(fname)
+        else:
+            log.warning('Cannot read source catalogs, no such file: %s', fname)
+            matcher = SourceCatalogMatcher([])
+        _matchers[fname] = matcher
+    return matcher
@@ -1,5 +1,6 @@
 from builtins import str
 from builtins import object
+import io
 
 import pytest
 
@@ -10,12 +11,14 @@ from rdflib.namespace import Namespace, RDF
 
 from ckanext.dcat.processors import (
     RDFParser,
+    RDFStreamingParser,
     RDFParserException,
     RDFProfileException,
     DEFAULT_RDF_PROFILES,
     RDF_PROFILES_CONFIG_OPTION
 )
 
+from ckanext.dcat import processors
 from ckanext.dcat.profiles import RDFProfile
 
 DCT = Namespace("http://purl.org/dc/terms/")
@@ -71,6 +74,36 @@ class MockRDFProfile2(RDFProfile):
         return dataset_dict
 
 
+class MockRDFCountingProfile(RDFProfile):
+
+    instances = 0
+    resets = 0
+
+    def __init__(self, *args, **kwargs):
+        super(MockRDFCountingProfile, self).__init__(*args, **kwargs)
+        MockRDFCountingProfile.instances += 1
+
+    def reset(self):
+        MockRDFCountingProfile.resets += 1
+
+    def parse_dataset(self, dataset_dict, dataset_ref):
+
+        dataset_dict['profile_instance'] = id(self)
+
+        return dataset_dict
+
+
+class MockRDFGraphProfile(RDFProfile):
+
+    def parse_dataset(self, dataset_dict, dataset_ref):
+
+        dataset_dict['title'] = str(self.g.value(dataset_ref, DCT.title))
+        dataset_dict['num_resources'] = len(list(self._distributions(dataset_ref)))
+        dataset_dict['num_datasets_in_graph'] = len(list(self._datasets()))
+
+        return dataset_dict
+
+
 class TestRDFParser(object):
 
     def test_default_profile(self):
@@ -120,6 +153,40 @@ class TestRDFParser(object):
             assert dataset['profile_1']
             assert dataset['profile_2']
 
+    def test_profiles_are_reused_across_datasets(self):
+
+        MockRDFCountingProfile.instances = 0
+        MockRDFCountingProfile.resets = 0
+
+        p = RDFParser()
+
+        p._profiles = [MockRDFCountingProfile]
+
+        p.g = _default_graph()
+
+        datasets = [d for d in p.datasets()]
+
+        assert len(datasets) == 3
+        assert len(set(d['profile_instance'] for d in datasets)) == 1
+        assert MockRDFCountingProfile.instances == 1
+        assert MockRDFCountingProfile.resets == 2
+
+    def test_profiles_are_recreated_for_new_graph(self):
+
+        MockRDFCountingProfile.instances = 0
+
+        p = RDFParser()
+
+        p._profiles = [MockRDFCountingProfile]
+
+        p.g = _default_graph()
+        [d for d in p.datasets()]
+
+        p.g = _default_graph()
+        [d for d in p.datasets()]
+
+        assert MockRDFCountingProfile.instances == 2
+
     def test_parse_data(self):
 
         data = '''<?xml version="1.0" encoding="utf-8" ?>
@@ -319,3 +386,174 @@ class TestRDFParser(object):
         p.g = Graph()
 
         assert len([d for d in p.datasets()]) == 0
+
+    def test_dataset_graphs(self):
+
+        p = RDFParser(profiles=['euro_dcat_ap'])
+        p._profiles = [MockRDFGraphProfile]
+
+        p.g = _default_graph()
+
+        graphs = dict(p._dataset_graphs())
+
+        assert len(graphs) == 3
+        for dataset_ref, g in graphs.items():
+            assert list(g.subjects(RDF.type, DCAT.Dataset)) == [dataset_ref]
+            assert (len(list(g.objects(dataset_ref, DCAT.distribution))) ==
+                    len(list(p.g.objects(dataset_ref, DCAT.distribution))))
+
+    def test_datasets_parallel(self):
+
+        p = RDFParser(profiles=['euro_dcat_ap'])
+
+        p.g = _default_graph()
+
+        datasets = list(p.datasets())
+        parallel_datasets = list(p.datasets_parallel(2, chunk_size=1))
+
+        assert len(parallel_datasets) == 3
+        assert ([d['title'] for d in parallel_datasets] ==
+                [d['title'] for d in datasets])
+        assert ([len(d['resources']) for d in parallel_datasets] ==
+                [len(d['resources']) for d in datasets])
+
+    def test_parse_datasets_chunk_reuses_worker_parser(self, monkeypatch):
+
+        p = RDFParser(profiles=['euro_dcat_ap'])
+
+        p.g = _default_graph()
+
+        chunk = [(str(dataset_ref), g.serialize(format='nt'))
+                 for dataset_ref, g in p._dataset_graphs()]
+
+        # Not run in a forked worker, so leave the database session alone
+        monkeypatch.setattr(processors, '_init_worker', lambda: None)
+        monkeypatch.setattr(processors, '_worker_parser', None)
+        processors._init_parser_worker(['euro_dcat_ap'], False)
+
+        loaded = []
+        monkeypatch.setattr(RDFParser, '_load_profiles',
+                            lambda self, names: loaded.append(names))
+
+        datasets = (processors._parse_datasets_chunk(chunk[:1]) +
+                    processors._parse_datasets_chunk(chunk[1:]))
+
+        assert ([d['title'] for d in datasets] ==
+                [d['title'] for d in p.datasets()])
+        assert loaded == []
+
+    def test_datasets_parallel_single_process(self):
+
+        p = RDFParser(profiles=['euro_dcat_ap'])
+        p._profiles = [MockRDFGraphProfile]
+
+        p.g = _default_graph()
+
+        datasets = list(p.datasets_parallel(1))
+
+        assert len(datasets) == 3
+        # Not split in graphs per dataset
+        assert all(d['num_datasets_in_graph'] == 3 for d in datasets)
+
+
+class TestRDFStreamingParser(object):
+
+    def _parse(self, data, _format=None):
+        p = RDFStreamingParser()
+        p._profiles = [MockRDFGraphProfile]
+        p.parse(data, _format=_format)
+        return p
+
+    def _check_datasets(self, p):
+        datasets = sorted(p.datasets(), key=lambda d: d['title'])
+
+        assert [d['title'] for d in datasets] == [
+            'Test Dataset 1', 'Test Dataset 2', 'Test Dataset 3']
+        assert [d['num_resources'] for d in datasets] == [2, 1, 0]
+        # Each profile only sees the dataset being parsed
+        assert all(d['num_datasets_in_graph'] == 1 for d in datasets)
+
+    def test_parse_data_rdfxml(self):
+
+        p = self._parse(_default_graph().serialize(format='xml'))
+
+        self._check_datasets(p)
+
+    def test_parse_data_ntriples(self):
+
+        p = self._parse(_default_graph().serialize(format='nt'), _format='nt')
+
+        self._check_datasets(p)
+
+    def test_parse_data_file_object(self):
+
+        data = _default_graph().serialize(format='nt')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        p = self._parse(io.BytesIO(data), _format='application/n-triples')
+
+        self._check_datasets(p)
+
+    def test_parse_data_non_streaming_format(self):
+
+        p = self._parse(_default_graph().serialize(format='turtle'),
+                        _format='turtle')
+
+        self._check_datasets(p)
+
+    def test_datasets_release_triples(self):
+
+        p = self._parse(_default_graph().serialize(format='nt'), _format='nt')
+
+        assert len(p._index) == 6
+
+        for dataset in p.datasets():
+            pass
+
+        assert len(p._index) == 0
+
+    def test_parse_catalog_and_pagination(self):
+
+        data = '''<?xml version="1.0" encoding="utf-8" ?>
+        <rdf:RDF
+         xmlns:dct="http://purl.org/dc/terms/"
+         xmlns:dcat="http://www.w3.org/ns/dcat#"
+         xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:hydra="http://www.w3.org/ns/hydra/core#">
+        <dcat:Catalog rdf:about="http://example.com/catalog">
+          <dct:title>Some catalog</dct:title>
+          <dcat:dataset>
+            <dcat:Dataset rdf:about="http://example.com/datasets/1">
+              <dct:title>Test Dataset 1</dct:title>
+            </dcat:Dataset>
+          </dcat:dataset>
+        </dcat:Catalog>
+        <hydra:PagedCollection rdf:about="http://example.com/catalog.xml?page=1">
+            <hydra:next>http://example.com/catalog.xml?page=2</hydra:next>
+        </hydra:PagedCollection>
+        </rdf:RDF>
+        '''
+
+        p = self._parse(data)
+
+        assert p.next_page() == 'http://example.com/catalog.xml?page=2'
+        assert (URIRef('http://example.com/catalog'), DCT.title,
+                Literal('Some catalog')) in p.g
+        # Links to datasets are only added to each dataset graph
+        assert len(list(p.g.objects(None, DCAT.dataset))) == 0
+
+        dataset_ref = URIRef('http://example.com/datasets/1')
+        g = p._dataset_graph(dataset_ref)
+        assert (URIRef('http://example.com/catalog'), DCAT.dataset,
+                dataset_ref) in g
+
+    def test_parse_data_raises_on_parse_error(self):
+
+        p = RDFStreamingParser()
+
+        with pytest.raises(RDFParserException):
+            p.parse('Wrong data')
+
+        with pytest.raises(RDFParserException):
+            p.parse('Wrong data', _format='nt')
@@ -1,8 +1,11 @@
 from builtins import str
 
+import pytest
+
 from ckantoolkit import config
+from ckantoolkit.tests import factories, helpers
 
-from rdflib import URIRef, Literal
+from rdflib import Graph, URIRef, Literal
 from rdflib.namespace import Namespace, RDF
 
 from ckanext.dcat.processors import (
@@ -12,6 +15,7 @@ from ckanext.dcat.processors import (
     RDF_PROFILES_CONFIG_OPTION
 )
 
+from ckanext.dcat import cache
 from ckanext.dcat.profiles import RDFProfile
 from ckanext.dcat.tests.utils import BaseSerializeTest
 
@@ -54,6 +58,18 @@ class MockRDFProfile2(RDFProfile):
         self.g.add((dataset_ref, DCAT.keyword, Literal('profile_2')))
 
 
+class MockRDFProfileCounter(RDFProfile):
+
+    calls = 0
+
+    def graph_from_dataset(self, dataset_dict, dataset_ref):
+
+        MockRDFProfileCounter.calls += 1
+        self.g.add((dataset_ref, DCT.title, Literal(dataset_dict['title'])))
+        self.g.add((dataset_ref, DCT.modified,
+                    Literal(dataset_dict['metadata_modified'])))
+
+
 class TestRDFSerializer(BaseSerializeTest):
 
     def test_default_profile(self):
@@ -116,3 +132,117 @@ class TestRDFSerializer(BaseSerializeTest):
 
         assert self._triples(s.g, None, DCT.description, Literal('Lorem ipsum'))
         assert len(self._triples(s.g, None, DCAT.distribution, None)) == 1
+
+    def test_serialize_catalog_stream(self):
+
+        dataset_dicts = []
+        for i in range(3):
+            dataset = _default_dict()
+            dataset.update({
+                'id': 'dataset-{0}'.format(i),
+                'name': 'test-dataset-{0}'.format(i),
+                'title': 'Test DCAT dataset {0}'.format(i),
+                'holder_identifier': 'test_org',
+                'owner_org': 'test_org',
+            })
+            dataset['resources'][0]['id'] = 'resource-{0}'.format(i)
+            dataset['resources'][0]['package_id'] = dataset['id']
+            dataset_dicts.append(dataset)
+
+        s = RDFSerializer()
+        s.serialize_catalog({}, dataset_dicts=dataset_dicts)
+        triples = set(s.g)
+
+        for _format, rdflib_format in (('nt', 'nt'), ('ttl', 'turtle'),
+                                       ('jsonld', 'json-ld')):
+            s = RDFSerializer()
+            chunks = s.serialize_catalog_stream(
+                {}, dataset_dicts=iter(dataset_dicts), _format=_format)
+
+            g = Graph()
+            g.parse(data=''.join(chunks), format=rdflib_format)
+
+            assert len(g) == len(triples)
+            assert (set(g.subjects(RDF.type, DCAT.Dataset)) ==
+                    set(s for s, p, o in triples
+                        if p == RDF.type and o == DCAT.Dataset))
+            assert (sorted(self._triples(g, None, DCT.title, None)) ==
+                    sorted(t for t in triples if t[1] == DCT.title))
+
+    def test_serialize_catalog_stream_format_not_supported(self):
+
+        s = RDFSerializer()
+
+        with pytest.raises(ValueError):
+            next(s.serialize_catalog_stream({}, [], _format='xml'))
+
+    @pytest.mark.usefixtures('clean_db')
+    @pytest.mark.ckan_config(cache.FRAGMENT_CACHE_CONFIG_OPTION, 'true')
+    def test_serialize_catalog_fragment_cache(self):
+
+        dataset = _default_dict()
+        dataset.update({
+            'id': 'ecde6a9d-1c05-4ecb-a0e0-8d8cfa3c6bc6',
+            'metadata_modified': '2024-01-01T10:00:00',
+            'holder_identifier': 'test_org',
+            'owner_org': 'test_org',
+        })
+        cache.invalidate_fragments(dataset['id'])
+
+        def _serialize():
+            s = RDFSerializer()
+            s._profiles = [MockRDFProfileCounter]
+            s.serialize_catalog({}, dataset_dicts=[dataset], _format='ttl')
+            return s.g
+
+        MockRDFProfileCounter.calls = 0
+
+        g = _serialize()
+        assert MockRDFProfileCounter.calls == 1
+
+        # Second time the dataset triples come from the cache
+        g_cached = _serialize()
+        assert MockRDFProfileCounter.calls == 1
+        assert (sorted(self._triples(g_cached, None, DCT.title, None)) ==
+                sorted(self._triples(g, None, DCT.title, None)))
+
+        # A new modification date is a different cache entry
+        dataset['metadata_modified'] = '2024-01-02T10:00:00'
+        g = _serialize()
+        assert MockRDFProfileCounter.calls == 2
+        assert self._triples(g, None, DCT.modified,
+                             Literal('2024-01-02T10:00:00'))
+
+        cache.invalidate_fragments(dataset['id'])
+        _serialize()
+        assert MockRDFProfileCounter.calls == 3
+
+    @pytest.mark.usefixtures('clean_db')
+    @pytest.mark.ckan_config(cache.FRAGMENT_CACHE_CONFIG_OPTION, 'true')
+    def test_serialize_catalog_fragment_cache_organization_edited(self):
+
+        org = factories.Organization()
+        dataset = _default_dict()
+        dataset.update({
+            'id': 'a5d2ab83-5f1c-4f56-9c0a-16c2f4d1e0b2',
+            'metadata_modified': '2024-01-01T10:00:00',
+            'owner_org': org['id'],
+        })
+        cache.invalidate_fragments(dataset['id'])
+
+        def _serialize():
+            s = RDFSerializer()
+            s._profiles = [MockRDFProfileCounter]
+            s.serialize_catalog({}, dataset_dicts=[dataset], _format='ttl')
+
+        MockRDFProfileCounter.calls = 0
+
+        _serialize()
+        _serialize()
+        assert MockRDFProfileCounter.calls == 1
+
+        # The cached triples may include organization data
+        helpers.call_action('organization_patch', id=org['id'],
+                            title='New title')
+        _serialize()
+        assert MockRDFProfileCounter.calls == 2
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from builtins import str
 from builtins import range
+import gzip
 import time
 
 from collections import OrderedDict
@@ -12,10 +13,12 @@ from ckan import plugins as p
 
 from rdflib import Graph
 from ckantoolkit import url_for
-from ckantoolkit.tests import factories
+from ckantoolkit.tests import factories, helpers
 
 from ckanext.dcat.processors import RDFParser
-from ckanext.dcat.profiles import RDF, DCAT
+from ckanext.dcat import dumps
+from ckanext.dcat.dumps import generate_dumps
+from ckanext.dcat.profiles import RDF, DCAT, DCT
 from ckanext.dcat.processors import HYDRA
 
 
@@ -416,6 +419,109 @@ class TestEndpoints():
 
         assert 'Unknown RDF profiles: nope' in response.body
 
+    @pytest.mark.ckan_config('ckanext.dcat.catalog_streaming', 'true')
+    @pytest.mark.ckan_config('ckanext.dcat.datasets_per_page', 10)
+    def test_catalog_streaming(self, app, monkeypatch):
+
+        # Search the datasets of the page in several batches
+        monkeypatch.setattr('ckanext.dcat.logic.STREAMING_BATCH_SIZE', 4)
+
+        for i in range(12):
+            factories.Dataset()
+
+        for _format, rdflib_format, content_type in (
+                ('ttl', 'turtle', 'text/turtle'),
+                ('nt', 'nt', 'application/n-triples'),
+                ('jsonld', 'json-ld', 'application/ld+json')):
+            url = url_for('dcat.read_catalog', _format=_format)
+
+            response = app.get(url)
+
+            assert response.headers['Content-Type'] == content_type
+
+            g = Graph()
+            g.parse(data=response.body, format=rdflib_format)
+
+            datasets = set(g.subjects(RDF.type, DCAT.Dataset))
+            assert len(datasets) == 10
+
+            pagination = [o for o in g.subjects(RDF.type, HYDRA.PagedCollection)][0]
+            assert self._object_value(g, pagination, HYDRA.totalItems) == '12'
+
+    def test_catalog_dumps(self, app, ckan_config, monkeypatch, tmp_path):
+
+        monkeypatch.setitem(ckan_config, 'ckanext.dcat.dumps.directory',
+                            str(tmp_path))
+
+        dataset1 = factories.Dataset()
+        dataset2 = factories.Dataset()
+
+        url = url_for('dcat.read_catalog', _format='ttl.gz')
+
+        app.get(url, status=404)
+
+        generate_dumps()
+
+        response = app.get(url)
+
+        assert response.headers['Content-Type'] == 'application/gzip'
+
+        g = Graph()
+        g.parse(data=gzip.decompress(response.data), format='turtle')
+
+        titles = [str(g.value(d, DCT.title))
+                  for d in g.subjects(RDF.type, DCAT.Dataset)]
+        assert sorted(titles) == sorted([dataset1['title'], dataset2['title']])
+
+        etag = response.headers['ETag']
+        app.get(url, headers={'If-None-Match': etag}, status=304)
+
+        response = app.get(url, headers={'Range': 'bytes=0-9'}, status=206)
+        assert len(response.data) == 10
+
+        # Only the modified datasets are serialized again
+        serialized = []
+        serialize_datasets_chunk = dumps._serialize_datasets_chunk
+
+        def _serialize_datasets_chunk(args):
+            serialized.extend(d['id'] for d in args[1])
+            return serialize_datasets_chunk(args)
+
+        monkeypatch.setattr(dumps, '_serialize_datasets_chunk',
+                            _serialize_datasets_chunk)
+
+        helpers.call_action('package_patch', id=dataset1['id'],
+                            title='Updated title')
+        generate_dumps()
+
+        assert serialized == [dataset1['id']]
+
+        response = app.get(url)
+        assert response.headers['ETag'] != etag
+
+        g = Graph()
+        g.parse(data=gzip.decompress(response.data), format='turtle')
+
+        titles = [str(g.value(d, DCT.title))
+                  for d in g.subjects(RDF.type, DCAT.Dataset)]
+        assert sorted(titles) == sorted(['Updated title', dataset2['title']])
+
+        # All the datasets are serialized again when the organizations change
+        del serialized[:]
+        factories.Organization()
+        generate_dumps()
+
+        assert sorted(serialized) == sorted([dataset1['id'], dataset2['id']])
+
+        for _format, rdflib_format in (('rdf', 'xml'), ('jsonld', 'json-ld')):
+            response = app.get(url_for('dcat.read_catalog',
+                                       _format=_format + '.gz'))
+
+            g = Graph()
+            g.parse(data=gzip.decompress(response.data), format=rdflib_format)
+
+            assert len(set(g.subjects(RDF.type, DCAT.Dataset))) == 2
+
 
 @pytest.mark.usefixtures('with_plugins', 'clean_db', 'clean_index')
 class TestAcceptHeader():
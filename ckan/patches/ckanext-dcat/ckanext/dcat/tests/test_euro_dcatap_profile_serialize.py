@@ -1252,6 +1252,38 @@ class TestEuroDCATAPProfileSerializeCatalog(BaseSerializeTest):
         assert len(dataset_title) == 1
         assert str(dataset_title[0]) == dataset['title']
 
+    @pytest.mark.ckan_config(DCAT_EXPOSE_SUBCATALOGS, 'true')
+    @pytest.mark.parametrize('dataset_is_local', [True, None])
+    def test_subcatalog_local_dataset(self, dataset_is_local):
+        # dataset_is_local is set by the ckanext-dcatapit search hooks but
+        # not by package_show, the sub-catalog does not depend on it
+        dataset = {
+            'id': '4b6fe9ca-dc77-4cec-92a4-55c6624a5bd6',
+            'name': 'test-dataset',
+            'title': 'test dataset',
+            'holder_identifier': 'test_org',
+            'extras': [
+                {'key': 'source_catalog_title', 'value': 'Subcatalog example'},
+                {'key': 'source_catalog_homepage', 'value': 'http://subcatalog.example'},
+                {'key': 'source_catalog_description', 'value': 'Subcatalog example description'},
+            ]
+        }
+        if dataset_is_local is not None:
+            dataset['dataset_is_local'] = dataset_is_local
+
+        s = RDFSerializer(profiles=['euro_dcat_ap'])
+        g = s.g
+
+        s.serialize_catalog({}, dataset_dicts=[dataset])
+
+        subcatalogs = list(g.subjects(RDF.type, DCAT.Catalog))
+        subcatalogs = [ref for ref in subcatalogs
+                       if str(ref).startswith('http://subcatalog.example')]
+        assert len(subcatalogs) == 1
+        assert (str(list(g.objects(subcatalogs[0], DCT.title))[0]) ==
+                'Subcatalog example')
+        assert len(list(g.objects(subcatalogs[0], DCAT.dataset))) == 1
+
     def test_catalog_pagination(self):
         dataset = {
             'id': '4b6fe9ca-dc77-4cec-92a4-55c6624a5bd6',
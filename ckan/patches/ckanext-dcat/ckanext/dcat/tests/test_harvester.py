@@ -22,6 +22,7 @@ from ckanext.harvest import queue
 
 from ckanext.dcat.harvesters import DCATRDFHarvester
 from ckanext.dcat.interfaces import IDCATRDFHarvester
+import ckanext.dcat.harvesters.base
 import ckanext.dcat.harvesters.rdf
 
 
@@ -264,6 +265,26 @@ class TestDCATHarvestUnit(object):
 
         assert guid == None
 
+    def test_get_session_evicts_least_recently_used(self):
+        harvester = DCATRDFHarvester()
+
+        class Job(object):
+            def __init__(self, source_id):
+                self.source_id = source_id
+
+        with patch.object(DCATRDFHarvester, 'MAX_SESSIONS', 2), \
+                patch.dict(ckanext.dcat.harvesters.base._sessions, clear=True):
+            first = harvester._get_session(Job('a'))
+            harvester._get_session(Job('b'))
+            assert harvester._get_session(Job('a')) is first
+
+            with patch.object(first, 'close') as close_first:
+                harvester._get_session(Job('c'))
+                harvester._get_session(Job('d'))
+                close_first.assert_called_once_with()
+
+            assert list(ckanext.dcat.harvesters.base._sessions) == ['c', 'd']
+
 
 class FunctionalHarvestTest(object):
 
@@ -688,9 +709,8 @@ class TestDCATHarvestFunctional(FunctionalHarvestTest):
         actual_file_size =  1024 * 1024 * 110
         allowed_file_size = 1024 * 1024 * 50
 
-        # The harvester will try to do a HEAD request first so we need to mock
-        # this as well
-        responses.add(responses.HEAD, self.ttl_mock_url,
+        # The harvester checks the size before reading the body
+        responses.add(responses.GET, self.ttl_mock_url,
                                status=200, content_type=self.ttl_content_type,
                                adding_headers = {'content-length': str(actual_file_size)})
 
@@ -717,9 +737,8 @@ class TestDCATHarvestFunctional(FunctionalHarvestTest):
         actual_file_size =  1024 * 1024 * 110
         allowed_file_size = 1024 * 1024 * 100
 
-        # The harvester will try to do a HEAD request first so we need to mock
-        # this as well  , content_length=file_size
-        responses.add(responses.HEAD, self.ttl_mock_url,
+        # The harvester checks the size before reading the body
+        responses.add(responses.GET, self.ttl_mock_url,
                                status=200, content_type=self.ttl_content_type,
                                adding_headers = {'content-length': str(actual_file_size)})
 
@@ -736,6 +755,114 @@ class TestDCATHarvestFunctional(FunctionalHarvestTest):
                     allowed=allowed_file_size, actual=actual_file_size)
         mock_save_gather_error.assert_called_once_with(msg, harvest_job)
 
+    @responses.activate
+    def test_get_content_and_type_stream(self):
+        harvester = DCATRDFHarvester()
+        self._add_responses_solr_passthru()
+
+        responses.add(responses.GET, self.rdf_mock_url,
+                               body=self.rdf_content,
+                               content_type=self.rdf_content_type)
+        responses.add(responses.HEAD, self.rdf_mock_url,
+                               status=405,
+                               content_type=self.rdf_content_type)
+
+        harvest_source = self._create_harvest_source(self.rdf_mock_url)
+        harvest_job = self._create_harvest_job(harvest_source['id'])
+
+        content, content_type = harvester._get_content_and_type(
+            self.rdf_mock_url, harvest_job, 1, stream=True)
+
+        assert hasattr(content, 'read')
+        assert content.read().decode('utf-8') == self.rdf_content
+        assert content_type == self.rdf_content_type
+        content.close()
+
+    @responses.activate
+    @pytest.mark.ckan_config('ckanext.dcat.harvest.conditional_get', True)
+    def test_harvest_conditional_get_not_modified(self):
+        harvester = DCATRDFHarvester()
+        self._add_responses_solr_passthru()
+
+        requests_headers = []
+
+        def get_callback(request):
+            requests_headers.append(dict(request.headers))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return (304, {}, '')
+            return (200, {'ETag': '"v1"',
+                          'Content-Type': self.rdf_content_type},
+                    self.rdf_content)
+
+        responses.add_callback(responses.GET, self.rdf_mock_url,
+                               callback=get_callback)
+
+        harvest_source = self._create_harvest_source(self.rdf_mock_url)
+
+        harvest_job = harvest_model.HarvestJob.get(
+            self._create_harvest_job(harvest_source['id'])['id'])
+        assert len(harvester.gather_stage(harvest_job)) == 2
+        assert 'If-None-Match' not in requests_headers[0]
+
+        cache = harvest_model.HarvestSourceHttpCache.get(harvest_source['id'])
+        assert cache.url == self.rdf_mock_url
+        assert cache.etag == '"v1"'
+
+        harvest_job.status = u'Finished'
+        harvest_job.save()
+
+        harvest_job = harvest_model.HarvestJob.get(
+            self._create_harvest_job(harvest_source['id'])['id'])
+        assert harvester.gather_stage(harvest_job) == []
+        assert requests_headers[1]['If-None-Match'] == '"v1"'
+
+    @responses.activate
+    @pytest.mark.ckan_config('ckanext.dcat.harvest.conditional_get', True)
+    def test_harvest_conditional_get_after_object_errors(self):
+        harvester = DCATRDFHarvester()
+        self._add_responses_solr_passthru()
+
+        requests_headers = []
+
+        def get_callback(request):
+            requests_headers.append(dict(request.headers))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return (304, {}, '')
+            return (200, {'ETag': '"v1"',
+                          'Content-Type': self.rdf_content_type},
+                    self.rdf_content)
+
+        responses.add_callback(responses.GET, self.rdf_mock_url,
+                               callback=get_callback)
+
+        harvest_source = self._create_harvest_source(self.rdf_mock_url)
+
+        harvest_job = harvest_model.HarvestJob.get(
+            self._create_harvest_job(harvest_source['id'])['id'])
+        object_ids = harvester.gather_stage(harvest_job)
+        assert len(object_ids) == 2
+
+        # One of the objects failed to import
+        harvest_object = harvest_model.HarvestObject.get(object_ids[0])
+        harvest_object.state = u'ERROR'
+        harvest_object.save()
+
+        harvest_job.status = u'Finished'
+        harvest_job.save()
+
+        # The validators are not sent, so the source is harvested again
+        harvest_job = harvest_model.HarvestJob.get(
+            self._create_harvest_job(harvest_source['id'])['id'])
+        assert len(harvester.gather_stage(harvest_job)) == 2
+        assert 'If-None-Match' not in requests_headers[1]
+
+    @pytest.mark.ckan_config('ckanext.dcat.harvest.stream_download', True)
+    def test_harvest_create_rdf_stream(self):
+
+        self._test_harvest_create(self.rdf_mock_url,
+                                  self.rdf_content,
+                                  self.rdf_content_type)
+
     @responses.activate
     def test_harvest_create_rdf_pagination(self):
 
@@ -998,6 +1125,31 @@ class TestDCATHarvestFunctional(FunctionalHarvestTest):
 
         assert results['results'][0]['title'] == 'Example dataset 1'
 
+    @responses.activate
+    @pytest.mark.ckan_config('ckan.harvest.object_batch_size', 1)
+    def test_harvest_rdf_pagination_bad_format_second_page(self):
+
+        self._add_responses_solr_passthru()
+
+        responses.add(responses.GET, self.rdf_mock_url_pagination_1,
+                               body=self.rdf_content_pagination_1,
+                               content_type=self.rdf_content_type)
+
+        responses.add(responses.GET, self.rdf_mock_url_pagination_2,
+                               body=self.rdf_remote_file_invalid,
+                               content_type=self.rdf_content_type)
+
+        harvest_source = self._create_harvest_source(
+            self.rdf_mock_url_pagination_1)
+        harvest_job = harvest_model.HarvestJob.get(
+            self._create_harvest_job(harvest_source['id'])['id'])
+
+        assert DCATRDFHarvester().gather_stage(harvest_job) == []
+
+        # The objects of the first page, already inserted, are deleted
+        assert harvest_model.HarvestObject.filter(
+            harvest_job_id=harvest_job.id).count() == 0
+
     def test_harvest_bad_format_rdf(self):
 
         self._test_harvest_bad_format(self.rdf_mock_url,
@@ -1,3 +1,4 @@
+from ckanext.dcat.source_catalogs import SourceCatalogMatcher, load_source_catalogs
 from ckanext.dcat.utils import parse_accept_header
 
 
@@ -120,3 +121,34 @@ def test_accept_header_html_multiple():
     _format = parse_accept_header(header)
 
     assert _format is None
+
+
+def test_source_catalog_matcher():
+
+    matcher = SourceCatalogMatcher([
+        ('r_marche', 'https://dati.regione.marche.it/'),
+        ('aci', 'http://lod.aci.it/'),
+        ('m_it', 'https://www.interno.gov.it/'),
+    ])
+
+    assert matcher.match('r_marche') == 'https://dati.regione.marche.it/'
+    # the first rule wins, wherever it is found in the identifier
+    assert matcher.match('m_it_aci') == 'http://lod.aci.it/'
+    assert matcher.match('aci_r_marche') == 'https://dati.regione.marche.it/'
+    assert matcher.match('c_h501') is None
+    assert matcher.match(None) is None
+
+
+def test_load_source_catalogs(tmp_path):
+
+    fname = tmp_path / 'source_catalogs.ini'
+    fname.write_text(
+        '[dcat:source_catalogs]\n'
+        'r_Emiro = https://dati.emilia-romagna.it\n'
+        '00304260409 = https://opendata.comune.rimini.it/\n')
+
+    matcher = load_source_catalogs(str(fname))
+
+    assert matcher.match('r_Emiro') == 'https://dati.emilia-romagna.it'
+    assert matcher.match('r_emiro') is None
+    assert matcher.match('00304260409') == 'https://opendata.comune.rimini.it/'
@@ -2,6 +2,7 @@
 
 from builtins import str
 import logging
+import os
 import uuid
 import simplejson as json
 import re
@@ -32,6 +33,7 @@ CONTENT_TYPES = {
     'n3': 'text/n3',
     'ttl': 'text/turtle',
     'jsonld': 'application/ld+json',
+    'nt': 'application/n-triples',
 }
 
 DCAT_CLEAN_TAGS = 'ckanext.dcat.clean_tags'
@@ -39,6 +41,7 @@ DCAT_CLEAN_TAGS = 'ckanext.dcat.clean_tags'
 DEFAULT_CATALOG_ENDPOINT = '/catalog.{_format}'
 ENABLE_RDF_ENDPOINTS_CONFIG = 'ckanext.dcat.enable_rdf_endpoints'
 ENABLE_CONTENT_NEGOTIATION_CONFIG = 'ckanext.dcat.enable_content_negotiation'
+CATALOG_STREAMING_CONFIG = 'ckanext.dcat.catalog_streaming'
 
 
 def _get_package_type(id):
@@ -429,6 +432,9 @@ def read_catalog_page(_format):
     if not _format:
         return index_endpoint()
 
+    if _format.endswith('.gz'):
+        return _send_catalog_dump(_format[:-len('.gz')])
+
     _profiles = toolkit.request.params.get('profiles')
     if _profiles:
         _profiles = _profiles.split(',')
@@ -442,6 +448,9 @@ def read_catalog_page(_format):
         'profiles': _profiles,
     }
 
+    if _catalog_streaming(_format):
+        return _stream_catalog_page(_format, data_dict)
+
     try:
         response = toolkit.get_action('dcat_catalog_show')({}, data_dict)
     except (toolkit.ValidationError, RDFProfileException) as e:
@@ -454,6 +463,40 @@ def read_catalog_page(_format):
     return response
 
 
+def _catalog_streaming(_format):
+    from ckanext.dcat.processors import STREAMING_SERIALIZE_FORMATS
+
+    return (toolkit.asbool(config.get(CATALOG_STREAMING_CONFIG, False))
+            and url_to_rdflib_format(_format) in STREAMING_SERIALIZE_FORMATS)
+
+
+def _stream_catalog_page(_format, data_dict):
+    from flask import Response, stream_with_context
+    from ckanext.dcat.logic import dcat_catalog_stream
+
+    try:
+        chunks = dcat_catalog_stream({}, data_dict)
+    except (toolkit.ValidationError, RDFProfileException) as e:
+        toolkit.abort(409, str(e))
+
+    return Response(stream_with_context(chunks),
+                    content_type=CONTENT_TYPES[_format])
+
+
+def _send_catalog_dump(_format):
+    from flask import send_file
+    from ckanext.dcat.dumps import dump_path
+
+    path = dump_path(_format)
+    if not path or not os.path.exists(path):
+        toolkit.abort(404, toolkit._('Catalog dump not found'))
+
+    # Conditional and Range requests are handled by Flask, using the
+    # modification time and size of the file for the ETag
+    return send_file(path, mimetype='application/gzip', conditional=True,
+                     download_name=os.path.basename(path))
+
+
 def endpoints_enabled():
     return toolkit.asbool(config.get(ENABLE_RDF_ENDPOINTS_CONFIG, True))
 
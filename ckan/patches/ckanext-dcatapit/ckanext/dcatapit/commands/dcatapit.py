@@ -4,6 +4,7 @@ import logging
 
 import ckanext.dcatapit.commands.migrate110 as migrate110
 import ckanext.dcatapit.commands.migrate200 as migrate200
+import ckanext.dcatapit.commands.search_index as search_index
 from ckanext.dcatapit.commands.vocabulary import load_from_file as load_voc
 
 log = logging.getLogger(__name__)
@@ -47,6 +48,20 @@ def migrate_200(fix_old):
     migrate200.migrate(fix_old)
 
 
+@dcatapit.command(help='Rebuild the search index, sending datasets to Solr in batches')
+@click.option('-b', '--batch-size', default=search_index.DEFAULT_BATCH_SIZE, type=int,
+              help='Number of datasets sent to Solr in a single request')
+@click.option('-c', '--commit-size', default=search_index.DEFAULT_COMMIT_SIZE, type=int,
+              help='Number of datasets indexed between Solr commits')
+@click.option('-r', '--refresh', is_flag=True,
+              help='Refresh the current index (does not clear the existing one)')
+def rebuild_index(batch_size, commit_size, refresh):
+    indexed, failed = search_index.rebuild(batch_size=batch_size, commit_size=commit_size, refresh=refresh)
+    click.secho(f'{indexed} datasets indexed', fg=u"green")
+    if failed:
+        click.secho(f'{failed} datasets could not be indexed', fg=u"red")
+
+
 @dcatapit.command(help='Load an RDF vocabulary into the DB')
 @click.option('-f', "--filename", required=False, help='Path to a file', type=str)
 @click.option('--url', required=False, help='URL to a resource')
@@ -0,0 +1,117 @@
+import contextlib
+import logging
+
+import ckan.lib.search as search
+import ckan.lib.search.index as search_index
+import ckan.plugins.toolkit as toolkit
+from ckan import model
+
+from ckanext.dcatapit.model.license import license_index
+from ckanext.dcatapit.model.subtheme import subtheme_label_index
+from ckanext.dcatapit.model.vocabulary import tag_localization_index
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_COMMIT_SIZE = 10000
+
+
+class _BatchingConnection(object):
+    """
+    Solr connection buffering the documents added, which are sent to Solr
+    `batch_size` at a time
+    """
+
+    def __init__(self, conn, batch_size):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.docs = []
+        self.failed = 0
+
+    def add(self, docs, commit=False, **kwargs):
+        self.docs.extend(docs)
+        if commit or len(self.docs) >= self.batch_size:
+            self.flush(commit=commit)
+
+    def flush(self, commit=False):
+        if not self.docs:
+            return
+        docs, self.docs = self.docs, []
+        try:
+            self.conn.add(docs=docs, commit=commit)
+        except Exception as err:
+            # find out which documents were rejected
+            log.warning('Error adding %d documents to Solr, adding them one by one: %s', len(docs), err)
+            for doc in docs:
+                try:
+                    self.conn.add(docs=[doc], commit=commit)
+                except Exception as err:
+                    self.failed += 1
+                    log.error('Error indexing dataset %s: %s', doc.get('id'), err)
+
+    def __getattr__(self, name):
+        # any other operation (eg deletes) goes through after the pending adds
+        self.flush()
+        return getattr(self.conn, name)
+
+
+@contextlib.contextmanager
+def batched_solr_adds(batch_size):
+    """
+    Makes `PackageSearchIndex.index_package` buffer the documents it sends
+    to Solr, so they are sent in batches. Yields the connection, to be
+    flushed before committing.
+    """
+    make_connection = search_index.make_connection
+    conn = _BatchingConnection(make_connection(), batch_size)
+    search_index.make_connection = lambda *args, **kwargs: conn
+    try:
+        yield conn
+        conn.flush()
+    finally:
+        search_index.make_connection = make_connection
+
+
+def rebuild(batch_size=DEFAULT_BATCH_SIZE, commit_size=DEFAULT_COMMIT_SIZE, refresh=False):
+    """
+    Rebuilds the search index of all the active datasets
+
+    Unlike `ckan search-index rebuild`, documents are sent to Solr
+    `batch_size` at a time and committed every `commit_size` datasets.
+    """
+    package_ids = [r[0] for r in model.Session.query(model.Package.id)
+                   .filter(model.Package.state != 'deleted')
+                   .order_by(model.Package.id)]
+    package_index = search.index_for(model.Package)
+    package_show = toolkit.get_action('package_show')
+    context = {'model': model, 'ignore_auth': True, 'validate': False, 'use_cache': False}
+
+    if not refresh:
+        package_index.clear()
+
+    # load the vocabularies used by before_dataset_index once
+    for index in (license_index, tag_localization_index, subtheme_label_index):
+        index.data()
+
+    total = len(package_ids)
+    failed = 0
+    log.info('Indexing %d datasets', total)
+    with batched_solr_adds(batch_size) as conn:
+        for counter, package_id in enumerate(package_ids, 1):
+            try:
+                package_index.index_package(package_show(context.copy(), {'id': package_id}),
+                                            defer_commit=True)
+            except Exception as err:
+                failed += 1
+                log.error('Error indexing dataset %s: %s', package_id, err)
+            if counter % commit_size == 0 or counter == total:
+                conn.flush()
+                package_index.commit()
+                log.info('Indexed %d/%d datasets', counter, total)
+                # do not keep the objects of the datasets already indexed
+                model.Session.remove()
+
+    failed += conn.failed
+    if failed:
+        log.warning('%d datasets could not be indexed', failed)
+    return total - failed, failed
@@ -20,6 +20,7 @@ from ckanext.dcatapit import interfaces
 from ckanext.dcatapit.commands import DataException, ConfigException
 from ckanext.dcatapit.interfaces import DBAction
 from ckanext.dcatapit.model import License, ThemeToSubtheme, Subtheme, SubthemeLabel
+from ckanext.dcatapit.model.index import bump_vocabulary_version
 from ckanext.dcatapit.model.license import clear_licenses
 from ckanext.dcatapit.model.subtheme import clear_subthemes
 
@@ -221,6 +222,7 @@ def do_load(g, vocab_name: str):
             cnt.incr('tag_notdeletable')
 
     log.info(f'Vocabulary successfully loaded ({vocab_name})')
+    bump_vocabulary_version()
 
     return cnt.get()
 
@@ -310,7 +312,9 @@ def load_licenses(g: Graph):
         parents = list(g.objects(license, SKOS.broader))
         if parents:
             parent = parents[0]
-            License.get(license).set_parent(parent)
+            License.get_from_db(license).set_parent(parent)
+
+    bump_vocabulary_version()
 
 
 def load_subthemes(t2sub_mapping, eurovoc, themes_g=None):
@@ -328,6 +332,8 @@ def load_subthemes(t2sub_mapping, eurovoc, themes_g=None):
         for sub_theme in sub_themes:
             add_subtheme(eurovoc_g, theme, sub_theme)
 
+    bump_vocabulary_version()
+
 
 def add_subtheme(eurovoc, theme_ref, subtheme_ref, parent=None):
 
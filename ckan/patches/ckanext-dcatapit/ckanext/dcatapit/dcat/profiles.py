@@ -5,7 +5,6 @@ import logging
 from rdflib import BNode, Literal, URIRef
 from rdflib.namespace import RDF, SKOS
 
-import ckan.logic as logic
 from ckan.common import config
 from ckan.lib.i18n import get_lang, get_locales
 
@@ -31,6 +30,7 @@ from ckanext.dcatapit.dcat.const import DCATAPIT, it_namespaces, THEME_BASE_URI,
     FORMAT_BASE_URI, GEO_BASE_URI, THEME_CONCEPTS, GEO_CONCEPTS, DEFAULT_THEME_KEY, DEFAULT_FORMAT_CODE, \
     DEFAULT_FREQ_CODE, LOCALISED_DICT_NAME_BASE, LOCALISED_DICT_NAME_RESOURCES, lang_mapping_ckan_to_voc, \
     lang_mapping_xmllang_to_ckan, lang_mapping_ckan_to_xmllang, format_mapping
+from ckanext.dcatapit.model.index import get_vocabulary_version
 from ckanext.dcatapit.model.subtheme import Subtheme
 from ckanext.dcatapit.mapping import theme_name_to_uri, theme_aggrs_unpack, theme_names_to_uris, themes_parse_to_uris
 from ckanext.dcatapit.schema import FIELD_THEMES_AGGREGATE
@@ -50,6 +50,11 @@ class ItalianDCATAPProfile(RDFProfile):
     It requires the European DCAT-AP profile (`euro_dcat_ap`)
     '''
 
+    def dumps_version(self):
+        # licenses, themes and the other vocabularies are labelled from
+        # the database
+        return get_vocabulary_version()
+
     def parse_dataset(self, dataset_dict, dataset_ref):
 
         # check the dataset type
@@ -1235,20 +1240,10 @@ class ItalianDCATAPProfile(RDFProfile):
         org_id = dataset_dict.get('owner_org')
 
         # get orga info
-        org_show = logic.get_action('organization_show')
-
         org_dict = {}
         if org_id:
             try:
-                org_dict = org_show({'ignore_auth': True},
-                                    {'id': org_id,
-                                     'include_datasets': False,
-                                     'include_tags': False,
-                                     'include_users': False,
-                                     'include_groups': False,
-                                     'include_extras': True,
-                                     'include_followers': False}
-                                    )
+                org_dict = helpers.get_organization(org_id)
             except Exception as err:
                 log.warning('Cannot get org for %s: %s', org_id, err, exc_info=err)
 
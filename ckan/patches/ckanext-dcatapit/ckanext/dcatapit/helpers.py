@@ -1,6 +1,10 @@
+import copy
 import datetime
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
 
 import ckan.lib.helpers as h
 import ckan.plugins.toolkit as toolkit
@@ -30,6 +34,12 @@ dateformats = [
 DCATAPIT_ENABLE_FORM_TABS = 'ckanext.dcatapit.form_tabs'
 GEONAMES_USERNAME = 'geonames.username'
 GEONAMES_LIMIT_TO = 'geonames.limits.countries'
+ORGANIZATION_CACHE_TTL = 'ckanext.dcatapit.organization_cache_ttl'
+DEFAULT_ORGANIZATION_CACHE_TTL = 60
+DATASET_ORIGIN_CACHE_SIZE = 'ckanext.dcatapit.dataset_origin_cache_size'
+DEFAULT_DATASET_ORIGIN_CACHE_SIZE = 10000
+DATASET_ORIGIN_CACHE_TTL = 'ckanext.dcatapit.dataset_origin_cache_ttl'
+DEFAULT_DATASET_ORIGIN_CACHE_TTL = 300
 DEFAULT_CTX = {'ignore_auth': True}
 DEFAULT_ORG_CTX = DEFAULT_CTX.copy()
 DEFAULT_ORG_CTX.update(dict((k, False) for k in ('include_tags',
@@ -360,6 +370,58 @@ def get_org_context():
     return DEFAULT_ORG_CTX.copy()
 
 
+# (org id, for_view, lang) -> (expiry time, organization dict)
+_organization_cache = {}
+
+
+def get_organization(org_id, for_view=False):
+    """
+    Returns the dict of an organization, with its extras but no datasets,
+    users, groups or tags.
+
+    Dicts are kept for `ckanext.dcatapit.organization_cache_ttl` seconds
+    (0 to disable), so serializing or indexing many datasets of the same
+    organization only looks it up once. Entries are dropped when the
+    organization is updated in this process, other processes see the
+    changes once their entries expire.
+
+    `for_view` dicts are localized by the multilang plugin, so they are
+    cached per language. Callers get a deep copy they can modify.
+    """
+    key = (org_id, for_view, interfaces.get_language() if for_view else None)
+    ttl = toolkit.asint(config.get(ORGANIZATION_CACHE_TTL,
+                                   DEFAULT_ORGANIZATION_CACHE_TTL))
+    now = time.time()
+
+    cached = _organization_cache.get(key)
+    if ttl > 0 and cached and cached[0] > now:
+        return copy.deepcopy(cached[1])
+
+    ctx = get_org_context()
+    ctx['for_view'] = for_view
+    org = toolkit.get_action('organization_show')(ctx, {
+        'id': org_id,
+        'include_tags': False,
+        'include_users': False,
+        'include_groups': False,
+        'include_extras': True,
+        'include_followers': False,
+        'include_datasets': False,
+    })
+    if ttl > 0:
+        _organization_cache[key] = (now + ttl, copy.deepcopy(org))
+    return org
+
+
+def invalidate_organization(org):
+    """
+    Drops the cached dicts of an organization, passed as a model object
+    """
+    for key, (expiry, org_dict) in list(_organization_cache.items()):
+        if org.id in (key[0], org_dict.get('id')) or org.name == key[0]:
+            _organization_cache.pop(key, None)
+
+
 def get_icustomschema_fields():
     out = []
     for plugin in PluginImplementations(interfaces.ICustomSchema):
@@ -383,7 +445,69 @@ def get_icustomschema_org_fields():
     return out
 
 
+DatasetOrigin = namedtuple('DatasetOrigin', ['is_local', 'harvest_source_id'])
+
+# pkg id -> (expiry time, DatasetOrigin), least recently used first
+_dataset_origin_cache = OrderedDict()
+_dataset_origin_lock = threading.Lock()
+
+
+def datasets_origin(pkg_ids):
+    """
+    Returns a dict with the `DatasetOrigin` of each of the given dataset
+    ids: whether it is local or harvested, and the harvest source it comes
+    from.
+
+    Datasets not cached yet are looked up with a single query. The last
+    `ckanext.dcatapit.dataset_origin_cache_size` origins are kept in
+    memory (0 to disable) for `ckanext.dcatapit.dataset_origin_cache_ttl`
+    seconds, and dropped when the dataset is created or updated in this
+    process, as done by the harvest import. Other processes see the
+    changes (eg a harvest source cleared) once their entries expire.
+    """
+    size = toolkit.asint(config.get(DATASET_ORIGIN_CACHE_SIZE,
+                                    DEFAULT_DATASET_ORIGIN_CACHE_SIZE))
+    ttl = toolkit.asint(config.get(DATASET_ORIGIN_CACHE_TTL,
+                                   DEFAULT_DATASET_ORIGIN_CACHE_TTL))
+    now = time.time()
+    out = {}
+    missing = set()
+    with _dataset_origin_lock:
+        for pkg_id in pkg_ids:
+            cached = _dataset_origin_cache.get(pkg_id)
+            if cached is None or cached[0] <= now:
+                missing.add(pkg_id)
+            else:
+                _dataset_origin_cache.move_to_end(pkg_id)
+                out[pkg_id] = cached[1]
+
+    if not missing:
+        return out
+
+    sources = {}
+    q = Session.query(HarvestObject.package_id, HarvestObject.harvest_source_id)\
+        .filter(HarvestObject.package_id.in_(missing))\
+        .order_by(HarvestObject.current)
+    # the current object, if any, comes last and wins
+    for pkg_id, source_id in q:
+        sources[pkg_id] = source_id
+
+    with _dataset_origin_lock:
+        for pkg_id in missing:
+            origin = DatasetOrigin(pkg_id not in sources, sources.get(pkg_id))
+            out[pkg_id] = origin
+            if size > 0 and ttl > 0:
+                _dataset_origin_cache[pkg_id] = (now + ttl, origin)
+                _dataset_origin_cache.move_to_end(pkg_id)
+        while len(_dataset_origin_cache) > max(size, 0):
+            _dataset_origin_cache.popitem(last=False)
+    return out
+
+
+def invalidate_dataset_origin(pkg_id):
+    with _dataset_origin_lock:
+        _dataset_origin_cache.pop(pkg_id, None)
+
+
 def dataset_is_local(pkg_id):
-    q = Session.query(HarvestObject).filter(HarvestObject.package_id == pkg_id).exists()
-    is_remote = Session.query(q).scalar()
-    return not is_remote
+    return datasets_origin([pkg_id])[pkg_id].is_local
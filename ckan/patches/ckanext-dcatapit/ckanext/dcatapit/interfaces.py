@@ -12,7 +12,9 @@ from ckanext.dcatapit.model import (
     TagLocalization,
     License,
     Subtheme,
+    tag_localization_index,
 )
+from ckanext.dcatapit.model.subtheme import subtheme_label_index
 
 log = logging.getLogger(__name__)
 import os #inserimento in xloader
@@ -326,16 +328,15 @@ def get_localized_tag_name(tag_name=None, fallback_lang=None, lang=None):
         if lang is None:
             lang = get_language()
 
-        localized_tag_name = TagLocalization.by_name(tag_name, lang)
+        localized_tag_name = tag_localization_index.by_name(tag_name, lang)
 
         if localized_tag_name:
-            return localized_tag_name.text
+            return localized_tag_name
         else:
             if fallback_lang:
-                fallback_name = TagLocalization.by_name(tag_name, fallback_lang)
+                fallback_name = tag_localization_index.by_name(tag_name, fallback_lang)
 
                 if fallback_name:
-                    fallback_name = fallback_name.text
                     return fallback_name
                 else:
                     return tag_name
@@ -345,16 +346,27 @@ def get_localized_tag_name(tag_name=None, fallback_lang=None, lang=None):
         return None
 
 
+def get_localized_tag_names(tag_names, lang=None):
+    """
+    Bulk version of `get_localized_tag_name`, returns a dict with the label
+    of each tag name (the name itself if it has none)
+    """
+    if lang is None:
+        lang = get_language()
+
+    labels = tag_localization_index.by_names(tag_names, lang)
+    return dict((tag_name, labels.get(tag_name) or tag_name) for tag_name in tag_names)
+
+
 def get_localized_tag_by_id(tag_id, lang=None):
     if lang is None:
         lang = get_language()
 
-    localized_tag_name = TagLocalization.by_tag_id(tag_id, lang)
-    return localized_tag_name.text if localized_tag_name else None
+    return tag_localization_index.by_tag_id(tag_id, lang)
 
 
 def get_all_localized_tag_labels(tag_name):
-    return TagLocalization.all_by_name(tag_name)
+    return tag_localization_index.all_by_name(tag_name)
 
 
 def get_resource_licenses_tree(value, lang):
@@ -410,8 +422,7 @@ def get_localized_subtheme(subtheme, lang):
 
 
 def get_localized_subthemes(subthemes):
-    viewonly=True
-    q = Subtheme.get_localized(*subthemes)
+    q = subtheme_label_index.get_localized(*subthemes)
     out = {}
     for item in q:
         lang, label = item  # .lang, item.label
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+import redis
+
+from ckan.common import config
+from ckan.lib.redis import connect_to_redis
+
+log = logging.getLogger(__name__)
+
+__all__ = ['VersionedIndex', 'bump_vocabulary_version', ]
+
+# Seconds between checks of the vocabulary version
+VERSION_CHECK_INTERVAL = 10
+
+
+def _vocabulary_version_key():
+    return '{}:ckanext-dcatapit:vocabulary-version'.format(config.get('ckan.site_id'))
+
+
+def get_vocabulary_version():
+    try:
+        return connect_to_redis().get(_vocabulary_version_key())
+    except redis.RedisError as err:
+        log.warning('Cannot read the vocabulary version: %s', err)
+        return None
+
+
+def bump_vocabulary_version():
+    '''
+    Tells all processes the vocabularies changed, so they reload their
+    indexes. To be called after loading a vocabulary.
+    '''
+    try:
+        connect_to_redis().incr(_vocabulary_version_key())
+    except redis.RedisError as err:
+        log.warning('Cannot update the vocabulary version: %s', err)
+    VersionedIndex.invalidate_all()
+
+
+class VersionedIndex(object):
+    '''
+    In memory index of vocabulary tables, shared by the whole process.
+
+    Subclasses implement `_load()`, returning the data of the index. It is
+    loaded on first use, and loaded again when the vocabulary version
+    changes (see `bump_vocabulary_version`), which is checked at most once
+    every `VERSION_CHECK_INTERVAL` seconds.
+    '''
+
+    _instances = []
+
+    def __init__(self):
+        self._data = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        VersionedIndex._instances.append(self)
+
+    def _load(self):
+        raise NotImplementedError
+
+    def data(self):
+        data = self._data
+        if data is not None and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL:
+            return data
+
+        with self._lock:
+            version = get_vocabulary_version()
+            if self._data is None or version != self._version:
+                log.debug('Loading %s (version %s)', type(self).__name__, version)
+                self._data = self._load()
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._data
+
+    def invalidate(self):
+        self._data = None
+
+    @classmethod
+    def invalidate_all(cls):
+        for index in cls._instances:
+            index.invalidate()
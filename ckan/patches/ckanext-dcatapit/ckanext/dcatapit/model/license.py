@@ -1,13 +1,16 @@
 import logging
 import re
+from collections import namedtuple
 
 from ckan.model import meta, DomainObject
 from sqlalchemy import Column, ForeignKey, orm, types
 from sqlalchemy.ext.declarative import declarative_base
 
+from ckanext.dcatapit.model.index import VersionedIndex
+
 log = logging.getLogger(__name__)
 
-__all__ = ['License', 'LocalizedLicenseName']
+__all__ = ['License', 'LocalizedLicenseName', 'LicenseRecord']
 
 DeclarativeBase = declarative_base(metadata=meta.metadata)
 
@@ -70,6 +73,16 @@ class License(DeclarativeBase, DomainObject):
             * document uri (dcatapit reference to normative doc)
             * license name (dcatapit refererence from foaf:name)
             * license_type (dcat uri)
+
+        Returns a `LicenseRecord` from the license index, use `get_from_db`
+        to get the License object.
+        """
+        return license_index.get(id_or_uri)
+
+    @classmethod
+    def get_from_db(cls, id_or_uri):
+        """
+        Same as `get`, but querying the database
         """
         inst = None
         try:
@@ -134,7 +147,7 @@ class License(DeclarativeBase, DomainObject):
         """
         Set parent for given license
         """
-        parent = License.get(parent_uri)
+        parent = License.get_from_db(parent_uri)
         if not parent:
             raise ValueError('No parent %s object' % parent_uri)
         self.parent_id = parent.id
@@ -164,11 +177,7 @@ class License(DeclarativeBase, DomainObject):
 
     @classmethod
     def get_by_lang(cls, lang, label):
-        q = cls.q().join(LocalizedLicenseName,
-                         LocalizedLicenseName.license_id == cls.id)\
-            .filter(LocalizedLicenseName.lang == lang,
-                    LocalizedLicenseName.label == label)
-        return q.first()
+        return license_index.get_by_lang(lang, label)
 
     @classmethod
     def delete_all(cls):
@@ -200,26 +209,15 @@ class License(DeclarativeBase, DomainObject):
             and used in order provided
         :type *search_for: list of str
 
-        :return: Returns tuple of License and fallback marker as boolean.
+        :return: Returns tuple of LicenseRecord and fallback marker as boolean.
             Fallback set to True means that no license could be found for
             given token, and license returned is a default one.
 
         :rtype: (License, bool,)
         """
-        # get list of token-> license mapping
-        tokenized = cls.get_as_tokens()
-
-        # generate tokens from input
-        normalized_tokens = cls.generate_tokens_from_str(*search_for)
-        for token in normalized_tokens:
-            try:
-                from_tokenized = tokenized[token]
-                from_tokenized.sort(key=lambda t: t.version or t.rank_order)
-                # return latest version
-                license = from_tokenized[-1]
-                return license, False
-            except KeyError:
-                pass
+        license = license_index.find_by_tokens(cls.generate_tokens_from_str(*search_for))
+        if license:
+            return license, False
         # return default if nothing was found
         license = cls.get(cls.DEFAULT_LICENSE)
         assert license is not None
@@ -308,6 +306,102 @@ class LocalizedLicenseName(DeclarativeBase, DomainObject):
         return cls.Session.query(cls)
 
 
+class LicenseRecord(namedtuple('LicenseRecord', ('id', 'license_type', 'version', 'uri', 'path',
+                                                  'document_uri', 'rank_order', 'default_name',
+                                                  'parent_id', 'names'))):
+    """
+    Immutable copy of a License, `names` being a tuple of (lang, label)
+    """
+    __slots__ = ()
+
+    __str__ = License.__str__
+
+    def get_name(self, lang):
+        for name_lang, label in self.names:
+            if name_lang == lang:
+                return label
+        return self.default_name
+
+    def get_names(self):
+        return [{'lang': lang, 'name': label} for lang, label in self.names]
+
+
+class LicenseIndex(VersionedIndex):
+    """
+    In memory lookup tables for `License.get`, `License.get_by_lang` and
+    `License.find_by_token`, holding `LicenseRecord` objects
+    """
+
+    def _load(self):
+        names = {}
+        for license_id, lang, label in meta.Session.query(LocalizedLicenseName.license_id,
+                                                          LocalizedLicenseName.lang,
+                                                          LocalizedLicenseName.label)\
+                .order_by(LocalizedLicenseName.id):
+            names.setdefault(license_id, []).append((lang, label))
+
+        licenses = list(License.q().order_by(License.id))
+        records = dict((l.id, LicenseRecord(l.id, l.license_type, l.version, l.uri, l.path,
+                                            l.document_uri, l.rank_order, l.default_name,
+                                            l.parent_id, tuple(names.get(l.id, ()))))
+                       for l in licenses)
+
+        # lookups of `License.get`, in order of precedence
+        by_ref = ({}, {}, {}, {})
+        by_lang = {}
+        by_token = {}
+        # as in `get_from_db`, the first license by rank order wins for a uri
+        for l in sorted(licenses, key=lambda l: (l.rank_order, l.id)):
+            by_ref[0].setdefault(l.uri, records[l.id])
+        for l in licenses:
+            record = records[l.id]
+            for table, key in zip(by_ref[1:], (l.document_uri, l.default_name, l.license_type)):
+                if key is not None:
+                    table.setdefault(key, record)
+            for lang, label in record.names:
+                by_lang.setdefault((lang, label), record)
+            for token in l.generate_tokens():
+                by_token.setdefault(token, []).append(record)
+
+        # keep the latest version for each token
+        for token, matches in by_token.items():
+            try:
+                matches.sort(key=lambda t: t.version or t.rank_order)
+            except TypeError:
+                matches.sort(key=lambda t: str(t.version or t.rank_order))
+            by_token[token] = matches[-1]
+
+        return records, by_ref, by_lang, by_token
+
+    def get(self, id_or_uri):
+        records, by_ref, by_lang, by_token = self.data()
+        try:
+            record = records.get(int(id_or_uri))
+            if record:
+                return record
+        except (TypeError, ValueError):
+            pass
+        for table in by_ref:
+            record = table.get(id_or_uri)
+            if record:
+                return record
+        return None
+
+    def get_by_lang(self, lang, label):
+        return self.data()[2].get((lang, label))
+
+    def find_by_tokens(self, tokens):
+        by_token = self.data()[3]
+        for token in tokens:
+            record = by_token.get(token)
+            if record:
+                return record
+        return None
+
+
+license_index = LicenseIndex()
+
+
 def clear_licenses():
     LocalizedLicenseName.q().delete()
     License.q().delete()
@@ -11,11 +11,12 @@ from sqlalchemy.exc import SQLAlchemyError as SAError, IntegrityError
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
 
 from ckanext.dcat.profiles.base import DCT
+from ckanext.dcatapit.model.index import VersionedIndex
 
 log = logging.getLogger(__name__)
 
 __all__ = ['Subtheme', 'SubthemeLabel',
-           'clear_subthemes']
+           'clear_subthemes', 'subtheme_label_index']
 
 DeclarativeBase = declarative_base(metadata=meta.metadata)
 
@@ -198,6 +199,46 @@ class SubthemeLabel(DeclarativeBase, DomainObject):
                       'subtheme_id', 'lang'),)
 
 
+class SubthemeLabelIndex(VersionedIndex):
+    """
+    In memory version of `Subtheme.get_localized`
+    """
+
+    def _load(self):
+        by_value = {}
+        for subtheme_id, uri, default_label in meta.Session.query(Subtheme.id,
+                                                                  Subtheme.uri,
+                                                                  Subtheme.default_label):
+            by_value.setdefault(uri, set()).add(subtheme_id)
+            by_value.setdefault(default_label, set()).add(subtheme_id)
+
+        labels = {}
+        for subtheme_id, lang, label in meta.Session.query(SubthemeLabel.subtheme_id,
+                                                           SubthemeLabel.lang,
+                                                           SubthemeLabel.label)\
+                .order_by(SubthemeLabel.id):
+            labels.setdefault(subtheme_id, []).append((lang, label))
+
+        return by_value, labels
+
+    def get_localized(self, *subthemes):
+        """
+        Returns the (lang, label) tuples of the given subthemes, by uri or
+        default label
+        """
+        by_value, labels = self.data()
+        subtheme_ids = set()
+        for value in subthemes:
+            subtheme_ids.update(by_value.get(value, ()))
+        out = []
+        for subtheme_id in sorted(subtheme_ids):
+            out.extend(labels.get(subtheme_id, ()))
+        return out
+
+
+subtheme_label_index = SubthemeLabelIndex()
+
+
 def clear_subthemes():
     SubthemeLabel.q().delete()
     ThemeToSubtheme.q().delete()
@@ -5,9 +5,11 @@ from sqlalchemy import Column, ForeignKey, Table, types
 from ckan.model import Session, meta
 from ckan.model.domain_object import DomainObject
 
+from ckanext.dcatapit.model.index import VersionedIndex
+
 log = logging.getLogger(__name__)
 
-__all__ = ['TagLocalization', 'dcatapit_vocabulary_table', ]
+__all__ = ['TagLocalization', 'dcatapit_vocabulary_table', 'tag_localization_index', ]
 
 dcatapit_vocabulary_table = Table(
     'dcatapit_vocabulary', meta.metadata,
@@ -81,3 +83,44 @@ class TagLocalization(DomainObject):
 
 
 meta.mapper(TagLocalization, dcatapit_vocabulary_table)
+
+
+class TagLocalizationIndex(VersionedIndex):
+    '''
+    In memory version of the TagLocalization lookups
+    '''
+
+    def _load(self):
+        by_name_lang = {}
+        by_name = {}
+        by_tag_id = {}
+
+        query = meta.Session.query(TagLocalization.tag_id,
+                                   TagLocalization.tag_name,
+                                   TagLocalization.lang,
+                                   TagLocalization.text)\
+            .order_by(TagLocalization.id)
+
+        for tag_id, tag_name, lang, text in query:
+            # names are not unique across vocabularies, keep the first one
+            by_name_lang.setdefault((tag_name, lang), text)
+            by_name.setdefault(tag_name, {})[lang] = text
+            by_tag_id.setdefault(tag_id, {}).setdefault(lang, text)
+
+        return by_name_lang, by_name, by_tag_id
+
+    def by_name(self, tag_name, tag_lang):
+        return self.data()[0].get((tag_name, tag_lang))
+
+    def by_names(self, tag_names, tag_lang):
+        by_name_lang = self.data()[0]
+        return dict((tag_name, by_name_lang.get((tag_name, tag_lang))) for tag_name in tag_names)
+
+    def all_by_name(self, tag_name):
+        return dict(self.data()[1].get(tag_name, {}))
+
+    def by_tag_id(self, tag_id, tag_lang):
+        return self.data()[2].get(tag_id, {}).get(tag_lang)
+
+
+tag_localization_index = TagLocalizationIndex()
@@ -1,6 +1,7 @@
 import datetime
 import json
 import logging
+import re
 
 import ckan.plugins as plugins
 import ckan.plugins.toolkit as toolkit
@@ -15,12 +16,13 @@ import ckanext.dcatapit.schema as dcatapit_schema
 import ckanext.dcatapit.validators as validators
 from ckanext.dcatapit.commands import dcatapit as dcatapit_cli
 from ckanext.dcatapit.controllers.harvest import HarvesterController
-from ckanext.dcatapit.helpers import get_org_context, dcatapit_string_to_aggregated_themes
+from ckanext.dcatapit.helpers import dcatapit_string_to_aggregated_themes
 from ckanext.dcatapit.mapping import populate_theme_groups, theme_name_to_uri
 from ckanext.dcatapit.mapping import populate_theme_groups
 from ckanext.dcatapit.controllers.thesaurus import ThesaurusController, get_thesaurus_admin_page, update_vocab_admin
 from ckanext.dcatapit.model.license import License
 from ckanext.dcatapit.schema import FIELD_THEMES_AGGREGATE
+from ckanext.dcat.cache import invalidate_fragments
 
 log = logging.getLogger(__name__)
 
@@ -30,6 +32,17 @@ except ImportError:
     class DefaultTranslation():
         pass
 
+# labels of the High Value Datasets categories
+HVD_CATEGORY_LABELS = {
+    'http://data.europa.eu/bna/c_b79e35eb': 'Dati relativi alla mobilità',
+    'http://data.europa.eu/bna/asd487ae75': 'Dati metereologici',
+    'http://data.europa.eu/bna/c_a9135398': 'Dati relativi alle imprese e alla proprietà delle imprese',
+    'http://data.europa.eu/bna/c_ac64a52d': 'Dati geospaziali',
+    'http://data.europa.eu/bna/c_dd313021': 'Dati relativi a osservazione della terra e ad ambiente',
+    'http://data.europa.eu/bna/c_e1da4e07': 'Dati statistici',
+}
+HVD_CATEGORIES = re.compile('|'.join(re.escape(uri) for uri in HVD_CATEGORY_LABELS))
+
 LOCALIZED_RESOURCES_KEY = 'ckanext.dcatapit.localized_resources'
 LOCALIZED_RESOURCES_ENABLED = toolkit.asbool(config.get(LOCALIZED_RESOURCES_KEY, 'False'))
 MLR = None
@@ -262,6 +275,9 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
     # ------------- IPackageController ---------------#
 
     def after_dataset_create(self, context, pkg_dict):
+        invalidate_fragments(pkg_dict.get('id'))
+        helpers.invalidate_dataset_origin(pkg_dict.get('id'))
+
         # During the harvest the get_lang() is not defined
         lang = interfaces.get_language()
         otype = pkg_dict.get('type')
@@ -283,6 +299,9 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
                             self.create_loc_field(extra, lang, pkg_dict.get('id'))
 
     def after_dataset_update(self, context, pkg_dict):
+        invalidate_fragments(pkg_dict.get('id'))
+        helpers.invalidate_dataset_origin(pkg_dict.get('id'))
+
         # During the harvest the get_lang() is not defined
         lang = interfaces.get_language()
         otype = pkg_dict.get('type')
@@ -309,9 +328,10 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
 
         extra_theme1 = dataset_dict.get(f'extras_{FIELD_THEMES_AGGREGATE}', None) or ''
        # theme_normal = dataset_dict.get(tuple['theme'])
-        if json.loads(dataset_dict['theme']):
-         log.warning('json.loads del tema %s',str(json.loads(dataset_dict['theme'])))
-         theme_normal1 = str(json.loads(dataset_dict['theme']))
+        themes = json.loads(dataset_dict['theme'])
+        if themes:
+         log.debug('json.loads del tema %s', themes)
+         theme_normal1 = str(themes)
         else:
          dataset_dict['theme'] = 'OP_DATPRO'
          theme_normal1 = dataset_dict['theme']
@@ -341,8 +361,6 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
            for t in aggr_themes:
                stringtheme+=''+t
            search_terms.insert(0,stringtheme)
-         finally:
-          log.warning('ok')
 
         if search_terms:
 #            search_terms=search_terms.replace('http%3A%2F%2Fpublications.europa.eu%2Fresource%2Fauthority%2Fdata-theme%2F','')
@@ -378,16 +396,8 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
         dataset_dict['resource_license'] = _licenses
         ##log.warning('licenza ricercata %s ', _licenses)
         org_id = dataset_dict['owner_org']
-        organization_show = plugins.toolkit.get_action('organization_show')
         if org_id:
-            org = organization_show(get_org_context(), {'id': org_id,
-                                                        'include_tags': False,
-                                                        'include_users': False,
-                                                        'include_groups': False,
-                                                        'include_extras': True,
-                                                        'include_followers': False,
-                                                        'include_datasets': False,
-                                                        })
+            org = helpers.get_organization(org_id)
         else:
             org = {}
         if org.get('region'):
@@ -441,6 +451,8 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
 
         dcatapit_schema_fields = dcatapit_schema.get_custom_package_schema()
 
+        origins = helpers.datasets_origin([_dict['id'] for _dict in search_dicts])
+
         for _dict in search_dicts:
             _dict_extras = _dict.get('extras', None)
 
@@ -458,7 +470,7 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
 
             # remove holder info if pkg is local, use org as a source
             # see https://github.com/geosolutions-it/ckanext-dcatapit/pull/213#issuecomment-410668740
-            _dict['dataset_is_local'] = helpers.dataset_is_local(_dict['id'])
+            _dict['dataset_is_local'] = origins[_dict['id']].is_local
             if _dict['dataset_is_local']:
                 _dict.pop('holder_identifier', None)
                 _dict.pop('holder_name', None)
@@ -468,30 +480,17 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
         facets = search_results['search_facets']
         #log.debug('search_results in plugin %s',facets)
         if 'dcat_theme' in facets:
-            themes = facets['dcat_theme']
-            for item in themes['items']:
-                name = item['name']
-                label = interfaces.get_localized_tag_name(tag_name=name, lang=lang)
-                item['display_name'] = label
-                ##log.warning('search facets in plugin %s',themes)
+            items = facets['dcat_theme']['items']
+            labels = interfaces.get_localized_tag_names([item['name'] for item in items], lang=lang)
+            for item in items:
+                item['display_name'] = labels[item['name']]
         if 'hvd_category' in facets:
-            hvdcat=facets['hvd_category']
-            for item in hvdcat['items']:
-                name = item['name']
-                if 'c_b79e35eb' in name:
-                 name = name.replace('http://data.europa.eu/bna/c_b79e35eb','Dati relativi alla mobilità')
-                if 'asd487ae75' in name: 
-                 name = name.replace('http://data.europa.eu/bna/asd487ae75','Dati metereologici')
-                if 'c_a9135398' in name:
-                 name = name.replace('http://data.europa.eu/bna/c_a9135398','Dati relativi alle imprese e alla proprietà delle imprese')
-                if 'c_ac64a52d' in name:
-                 name = name.replace('http://data.europa.eu/bna/c_ac64a52d','Dati geospaziali')
-                if 'c_dd313021' in name:
-                 name = name.replace('http://data.europa.eu/bna/c_dd313021','Dati relativi a osservazione della terra e ad ambiente')
-                if 'c_e1da4e07' in name:
-                 name = name.replace('http://data.europa.eu/bna/c_e1da4e07','Dati statistici')
-                label = interfaces.get_localized_tag_name(tag_name=name, lang=lang)
-                item['display_name'] = label
+            items = facets['hvd_category']['items']
+            names = [HVD_CATEGORIES.sub(lambda m: HVD_CATEGORY_LABELS[m.group(0)], item['name'])
+                     for item in items]
+            labels = interfaces.get_localized_tag_names(names, lang=lang)
+            for item, name in zip(items, names):
+                item['display_name'] = labels[name]
         return search_results
 
     def manage_extras_for_search(self, field, _dict, _dict_extras):
@@ -599,18 +598,9 @@ class DCATAPITPackagePlugin(plugins.SingletonPlugin, toolkit.DefaultDatasetForm,
             if not pkg_dict.get('owner_org'):
                 return pkg_dict
             if org is None:
-                get_org = toolkit.get_action('organization_show')
-                ctx = get_org_context()
                 # force multilang use
-                ctx['for_view'] = True
-                org = get_org(ctx, {'id': pkg_dict['owner_org'],
-                                    'include_tags': False,
-                                    'include_users': False,
-                                    'include_groups': False,
-                                    'include_extras': True,
-                                    'include_followers': False,
-                                    'include_datasets': False,
-                                    })
+                org = helpers.get_organization(pkg_dict['owner_org'],
+                                               for_view=True)
             pkg_dict['holder_name'] = org['title']
             pkg_dict['holder_identifier'] = org.get('identifier') or None
         return pkg_dict
@@ -653,6 +643,9 @@ class DCATAPITOrganizationPlugin(plugins.SingletonPlugin, toolkit.DefaultOrganiz
     # IGroupForm
     plugins.implements(plugins.IGroupForm, inherit=True)
 
+    # IOrganizationController
+    plugins.implements(plugins.IOrganizationController, inherit=True)
+
     # ------------- IConfigurer ---------------#
 
     def update_config(self, config_):
@@ -667,6 +660,14 @@ class DCATAPITOrganizationPlugin(plugins.SingletonPlugin, toolkit.DefaultOrganiz
             'get_dcatapit_organization_schema': helpers.get_dcatapit_organization_schema
         }
 
+    # ------------- IOrganizationController ---------------#
+
+    def edit(self, entity):
+        helpers.invalidate_organization(entity)
+
+    def delete(self, entity):
+        helpers.invalidate_organization(entity)
+
     # ------------- IGroupForm ---------------#
 
     def is_fallback(self):
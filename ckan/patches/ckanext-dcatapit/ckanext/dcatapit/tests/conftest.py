@@ -11,11 +11,13 @@ from ckanext.spatial.tests.conftest import clean_postgis, spatial_setup
 from ckanext.multilang.tests.conftest import multilang_setup
 
 from ckanext.dcatapit.model import setup_db as dcatapit_setup_db
+from ckanext.dcatapit.model.index import VersionedIndex
 
 
 @pytest.fixture
 def dcatapit_setup():
     dcatapit_setup_db()
+    VersionedIndex.invalidate_all()
 
 
 @pytest.fixture
@@ -21,3 +21,38 @@ class TestDCATAPITCommand(BaseCommandTest):
 
         tag_localized = interfaces.get_localized_tag_name('ECON')
         self.assertTrue(tag_localized)
+
+
+class _FakeSolrConnection(object):
+
+    def __init__(self):
+        self.added = []
+
+    def add(self, docs, commit=False):
+        if any(doc.get('bad') for doc in docs):
+            raise ValueError('Bad document')
+        self.added.append([doc['id'] for doc in docs])
+
+    def delete(self, q):
+        self.added.append(['delete'])
+
+
+class TestSearchIndexRebuild(unittest.TestCase):
+
+    def test_batching_connection(self):
+        from ckanext.dcatapit.commands.search_index import _BatchingConnection
+
+        solr = _FakeSolrConnection()
+        conn = _BatchingConnection(solr, 2)
+        for i in range(5):
+            conn.add(docs=[{'id': i}])
+        self.assertEqual(solr.added, [[0, 1], [2, 3]])
+
+        conn.delete(q='*:*')
+        self.assertEqual(solr.added, [[0, 1], [2, 3], [4], ['delete']])
+
+        # rejected batches are sent again one document at a time
+        conn.add(docs=[{'id': 5}])
+        conn.add(docs=[{'id': 6, 'bad': True}])
+        self.assertEqual(solr.added[-1], [5])
+        self.assertEqual(conn.failed, 1)
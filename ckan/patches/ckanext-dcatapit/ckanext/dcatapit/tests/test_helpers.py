@@ -1,9 +1,15 @@
 
 import os
+from collections import OrderedDict
 
 import nose
 import pytest
 
+from ckan.tests import factories
+from ckan.model import Session
+from ckan.tests.helpers import call_action
+from ckanext.harvest.tests import factories as harvest_factories
+
 import ckanext.dcatapit.helpers as helpers
 from ckanext.dcatapit.tests.utils import get_voc_file, SKOS_THEME_FILE, get_test_file, load_graph
 
@@ -69,3 +75,71 @@ def test_org_context():
     ctx2 = helpers.get_org_context()
 
     assert ctx2.get('test') is None
+
+
+@pytest.mark.usefixtures('with_request_context', 'clean_dcatapit_db')
+def test_get_organization_cached(monkeypatch):
+    org = factories.Organization()
+
+    calls = []
+    get_action = helpers.toolkit.get_action
+
+    def _get_action(name):
+        calls.append(name)
+        return get_action(name)
+
+    monkeypatch.setattr(helpers.toolkit, 'get_action', _get_action)
+    monkeypatch.setattr(helpers, '_organization_cache', {})
+
+    for i in range(3):
+        eq_(helpers.get_organization(org['id'])['title'], org['title'])
+    eq_(calls.count('organization_show'), 1)
+
+    # changes to the returned dicts do not reach the cache
+    org_dict = helpers.get_organization(org['id'])
+    org_dict['extras'].append({'key': 'test', 'value': 'test'})
+    org_dict['title'] = 'Changed'
+    org_dict = helpers.get_organization(org['id'])
+    eq_(org_dict['title'], org['title'])
+    ok_('test' not in [extra['key'] for extra in org_dict['extras']])
+
+    # updating the organization drops the cached dict
+    call_action('organization_patch', id=org['id'], title='New title')
+    del calls[:]
+    eq_(helpers.get_organization(org['id'])['title'], 'New title')
+    eq_(calls.count('organization_show'), 1)
+
+
+@pytest.mark.usefixtures('with_request_context', 'clean_dcatapit_db')
+def test_datasets_origin(monkeypatch):
+    # harvest sources are datasets too
+    local_id = harvest_factories.HarvestSourceObj(url='http://example.com/local').id
+    harvest_object = harvest_factories.HarvestObjectObj(guid='test-origin')
+    harvested_id = harvest_object.harvest_source_id
+    harvest_object.package_id = harvested_id
+    harvest_object.current = True
+    Session.flush()
+
+    monkeypatch.setattr(helpers, '_dataset_origin_cache', OrderedDict())
+
+    origins = helpers.datasets_origin([local_id, harvested_id])
+    eq_(origins[local_id], (True, None))
+    eq_(origins[harvested_id], (False, harvested_id))
+    ok_(helpers.dataset_is_local(local_id))
+    ok_(not helpers.dataset_is_local(harvested_id))
+
+    # origins are cached until the dataset changes
+    harvest_object.package_id = local_id
+    Session.flush()
+    ok_(helpers.dataset_is_local(local_id))
+    helpers.invalidate_dataset_origin(local_id)
+    ok_(not helpers.dataset_is_local(local_id))
+
+    # changes made by other processes show up when the entries expire
+    harvest_object.package_id = harvested_id
+    Session.flush()
+    ok_(not helpers.dataset_is_local(local_id))
+    now = helpers.time.time()
+    monkeypatch.setattr(helpers.time, 'time',
+                        lambda: now + helpers.DEFAULT_DATASET_ORIGIN_CACHE_TTL + 1)
+    ok_(helpers.dataset_is_local(local_id))
@@ -1,5 +1,11 @@
 import os
 import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pytest
 
 from ckan.model.meta import Session
 from rdflib import RDF, Graph
@@ -11,6 +17,7 @@ from ckanext.dcatapit.tests.utils import (
     get_test_file,
     get_voc_file,
     load_graph, LICENSES_FILE,
+    SKOS_THEME_FILE,
 )
 
 try:
@@ -22,10 +29,15 @@ from ckanext.dcatapit.model.license import (
     License,
     LocalizedLicenseName,
 )
+from ckanext.dcatapit import interfaces
 from ckanext.dcatapit.commands.vocabulary import SKOS, load_licenses as load_license, load_subthemes
+from ckanext.dcatapit.commands.vocabulary import EUROPEAN_THEME_NAME, do_load
+from ckanext.dcatapit.model import TagLocalization
+from ckanext.dcatapit.model.index import VersionedIndex, bump_vocabulary_version
 from ckanext.dcatapit.model.subtheme import (
     Subtheme,
     clear_subthemes,
+    subtheme_label_index,
 )
 
 
@@ -85,8 +97,47 @@ class LicenseTestCase(unittest.TestCase):
         self.assertTrue(from_token)
         self.assertTrue('odbl' in from_token.default_name.lower())
 
+    def test_index(self):
+
+        load_license(self.g)
+        Session.flush()
+
+        for license in License.q():
+            for ref in (license.id, str(license.id), license.uri):
+                record = License.get(ref)
+                self.assertEqual(record.id, license.id)
+                self.assertEqual(record.uri, license.uri)
+                self.assertEqual(record.license_type, license.license_type)
+                self.assertEqual(record.get_names(), license.get_names())
+                self.assertEqual(record.get_name('en'), license.get_name('en'))
+            if license.document_uri:
+                self.assertEqual(License.get(license.document_uri).document_uri, license.document_uri)
+            for name in license.get_names():
+                self.assertEqual(License.get_by_lang(name['lang'], name['name']).get_name(name['lang']), name['name'])
+
+        self.assertIsNone(License.get('http://example.com/no-license'))
+
+        # the index is only read from the database again when the licenses are loaded
+        License.delete_all()
+        self.assertIsNotNone(License.get(License.DEFAULT_LICENSE))
+
+    def test_index_duplicate_uri(self):
+
+        uri = 'http://example.com/license'
+        licenses = [
+            License(id=1, uri=uri, path='a', rank_order=2, default_name='A'),
+            License(id=2, uri=uri, path='b', rank_order=1, default_name='B'),
+        ]
+        # the uri column is unique in new databases, not in older ones
+        with mock.patch.object(License, 'q') as q:
+            q.return_value.order_by.return_value = licenses
+            VersionedIndex.invalidate_all()
+
+            self.assertEqual(License.get(uri).id, 2)
+
     def tearDown(self):
         Session.rollback()
+        VersionedIndex.invalidate_all()
 
 
 class SubthemeTestCase(unittest.TestCase):
@@ -124,5 +175,43 @@ class SubthemeTestCase(unittest.TestCase):
             q = Subtheme.for_theme(theme_name)
             self.assertGreaterEqual(q.count(), len(list(theme_len)))
 
+        # in memory labels match the ones in the database
+        subthemes = [str(ref) for ref in refs[:5]]
+        self.assertEqual(sorted(subtheme_label_index.get_localized(*subthemes)),
+                         sorted(tuple(row) for row in Subtheme.get_localized(*subthemes)))
+
+    def tearDown(self):
+        Session.rollback()
+        VersionedIndex.invalidate_all()
+
+
+@pytest.mark.usefixtures("with_request_context")
+class TagLocalizationIndexTestCase(unittest.TestCase):
+
+    def test_index(self):
+        do_load(load_graph(path=get_test_file(SKOS_THEME_FILE)), EUROPEAN_THEME_NAME)
+
+        label = interfaces.get_localized_tag_name('ECON', lang='it')
+        self.assertTrue(label)
+        self.assertEqual(interfaces.get_all_localized_tag_labels('ECON')['it'], label)
+
+        tag_loc = Session.query(TagLocalization).filter_by(tag_name='ECON', lang='it').first()
+        self.assertEqual(interfaces.get_localized_tag_by_id(tag_loc.tag_id, lang='it'), label)
+
+        tag_loc.text = 'Updated label'
+        Session.flush()
+
+        # labels are kept in memory until the vocabularies change
+        self.assertEqual(interfaces.get_localized_tag_name('ECON', lang='it'), label)
+
+        bump_vocabulary_version()
+
+        self.assertEqual(interfaces.get_localized_tag_name('ECON', lang='it'), 'Updated label')
+        self.assertEqual(interfaces.get_all_localized_tag_labels('ECON')['it'], 'Updated label')
+        self.assertEqual(interfaces.get_localized_tag_name('NOPE', lang='it'), 'NOPE')
+        self.assertEqual(interfaces.get_localized_tag_names(['ECON', 'NOPE'], lang='it'),
+                         {'ECON': 'Updated label', 'NOPE': 'NOPE'})
+
     def tearDown(self):
         Session.rollback()
+        VersionedIndex.invalidate_all()
@@ -234,11 +234,19 @@ def gather_consumer():
 
 
 @harvester.command()
-def fetch_consumer():
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="""Number of worker processes consuming the queue. Defaults to
+    the ckan.harvest.fetch_workers config option, or 1.""",
+)
+def fetch_consumer(workers):
     """Starts the consumer for the fetching queue.
 
     """
-    utils.fetch_consumer()
+    utils.fetch_consumer(workers)
 
 
 @harvester.command()
@@ -11,7 +11,7 @@ from ckan.logic import ValidationError, NotFound, get_action
 from ckan.lib.helpers import json
 from ckan.plugins import toolkit
 
-from ckanext.harvest.model import HarvestObject
+from ckanext.harvest.model import HarvestObjectWriter
 from .base import HarvesterBase
 
 import logging
@@ -266,7 +266,7 @@ class CKANHarvester(HarvesterBase):
         # Create harvest objects for each dataset
         try:
             package_ids = set()
-            object_ids = []
+            writer = HarvestObjectWriter(harvest_job)
             for pkg_dict in pkg_dicts:
                 if pkg_dict['id'] in package_ids:
                     log.info('Discarding duplicate dataset %s - probably due '
@@ -278,13 +278,11 @@ class CKANHarvester(HarvesterBase):
 
                 log.debug('Creating HarvestObject for %s %s',
                           pkg_dict['name'], pkg_dict['id'])
-                obj = HarvestObject(guid=pkg_dict['id'],
-                                    job=harvest_job,
-                                    content=json.dumps(pkg_dict))
-                obj.save()
-                object_ids.append(obj.id)
+                writer.add(guid=pkg_dict['id'],
+                           content=json.dumps(pkg_dict))
+            writer.flush()
 
-            return object_ids
+            return writer.ids
         except Exception as e:
             self._save_gather_error('%r' % e.message, harvest_job)
 
@@ -1,17 +1,148 @@
+import datetime
+import os
+import queue
+import threading
+import time
 from logging import Handler, NOTSET
 
-from ckanext.harvest.model import HarvestLog
+from ckan.model import meta
+from ckan.model.types import make_uuid
+
+from ckanext.harvest.model import harvest_log_table, ensure_harvest_log_partitions
+
+# max number of records waiting to be written, newer records are dropped
+# when it is full
+QUEUE_SIZE = 10000
+# max number of records written with a single insert
+BATCH_SIZE = 500
+# seconds a record can wait for the batch to fill up
+FLUSH_INTERVAL = 2.0
+# seconds close waits for the pending records to be written
+CLOSE_TIMEOUT = 10.0
+# seconds between the checks of the daily partitions of harvest_log
+PARTITIONS_CHECK_INTERVAL = 6 * 60 * 60
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+_STOP = object()
 
 
 class DBLogHandler(Handler):
-    def __init__(self, level=NOTSET):
+    '''
+    Stores log records in the harvest_log table.
+
+    Records are formatted when logged and put in a bounded queue. A
+    background thread writes them with multi-row inserts on its own
+    database connection, so logging neither waits for the database nor
+    touches the session of the harvest. When the queue is full new
+    records are dropped, and counted in ``dropped``.
+
+    The thread also creates the partitions of the next days every
+    ``PARTITIONS_CHECK_INTERVAL`` seconds (see
+    ``ensure_harvest_log_partitions``).
+    '''
+
+    def __init__(self, level=NOTSET, queue_size=QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
         super(DBLogHandler, self).__init__(level=level)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
 
     def emit(self, record):
         try:
-            level = record.levelname
-            msg = self.format(record)
-            obj = HarvestLog(level=level, content=msg)
-            obj.save()
+            self._start()
+            level = record.levelname if record.levelname in LEVELS else "DEBUG"
+            row = {
+                "id": make_uuid(),
+                "level": level,
+                "content": self.format(record),
+                "created": datetime.datetime.utcfromtimestamp(record.created),
+            }
+        except Exception:
+            return
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        '''Waits until the queued records are written'''
+        if self._thread is None or self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + CLOSE_TIMEOUT
+        while self._queue.unfinished_tasks and time.monotonic() < deadline \
+                and self._thread.is_alive():
+            time.sleep(0.05)
+
+    def close(self):
+        self.acquire()
+        try:
+            if self._thread is not None and self._pid == os.getpid():
+                try:
+                    self._queue.put(_STOP, timeout=CLOSE_TIMEOUT)
+                except queue.Full:
+                    pass
+                self._thread.join(CLOSE_TIMEOUT)
+            self._thread = None
+        finally:
+            self.release()
+        super(DBLogHandler, self).close()
+
+    def _start(self):
+        # the writer thread does not survive a fork, so forked processes
+        # start their own, without the records queued by the parent
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self.acquire()
+        try:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._thread = threading.Thread(
+                    target=self._run, name="harvest-log-writer", daemon=True)
+                self._thread.start()
+        finally:
+            self.release()
+
+    def _run(self):
+        next_check = 0
+        stopping = False
+        while not stopping:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if _STOP in rows:
+                stopping = True
+                rows = [row for row in rows if row is not _STOP]
+            if rows:
+                if time.monotonic() >= next_check:
+                    next_check = time.monotonic() + PARTITIONS_CHECK_INTERVAL
+                    self._check_partitions()
+                self._write(rows)
+            for _ in range(len(rows) + stopping):
+                self._queue.task_done()
+
+    def _check_partitions(self):
+        try:
+            ensure_harvest_log_partitions()
         except Exception:
             pass
+
+    def _write(self, rows):
+        try:
+            with meta.engine.begin() as connection:
+                connection.execute(harvest_log_table.insert().values(rows))
+        except Exception:
+            self.dropped += len(rows)
@@ -9,12 +9,13 @@ from ckanext.harvest.utils import (
     DATASET_TYPE_NAME
 )
 from ckanext.harvest.model import (HarvestSource, HarvestJob, HarvestObject,
-                                   HarvestObjectExtra)
+                                   HarvestObjectExtra, HarvestSourceStats)
 from ckanext.harvest.logic.dictization import (harvest_job_dictize,
                                                harvest_object_dictize)
 from ckanext.harvest.logic.schema import harvest_object_create_schema
 from ckanext.harvest.logic.action.get import (harvest_source_list,
-                                              harvest_job_list)
+                                              harvest_job_list,
+                                              _refresh_source_stats)
 
 log = logging.getLogger(__name__)
 
@@ -115,6 +116,10 @@ def harvest_job_create(context, data_dict):
     job.save()
     log.info('Harvest job saved %s', job.id)
 
+    if not HarvestSourceStats.job_created(source.id, job.id):
+        _refresh_source_stats(context, source.id)
+    context['model'].Session.commit()
+
     if run_it:
         toolkit.get_action('harvest_send_job_to_gather_queue')(
             context, {'id': job.id})
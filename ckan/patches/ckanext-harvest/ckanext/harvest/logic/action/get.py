@@ -1,6 +1,7 @@
+import json
 import logging
 from ckan.lib.base import config
-from sqlalchemy import or_
+from sqlalchemy import and_, func, or_
 from ckan.model import User, Package
 import datetime
 
@@ -14,6 +15,7 @@ from ckan.logic import NotFound, check_access, side_effect_free
 from ckanext.harvest import model as harvest_model
 
 from ckanext.harvest.model import (HarvestSource, HarvestJob, HarvestObject, HarvestLog)
+from ckanext.harvest.queue import get_harvester
 from ckanext.harvest.logic.dictization import (harvest_source_dictize,
                                                harvest_job_dictize,
                                                harvest_object_dictize,
@@ -21,6 +23,10 @@ from ckanext.harvest.logic.dictization import (harvest_source_dictize,
 
 log = logging.getLogger(__name__)
 
+# objects or errors per page of the job reports
+REPORT_PAGE_SIZE = 100
+REPORT_MAX_PAGE_SIZE = 1000
+
 
 @side_effect_free
 def harvest_source_show(context, data_dict):
@@ -89,36 +95,77 @@ def harvest_source_show_status(context, data_dict):
            'total_datasets': 0,
            }
 
-    jobs = harvest_model.HarvestJob.filter(source=source).all()
+    stats = harvest_model.HarvestSourceStats.get(source.id)
+    if stats is None:
+        # not stored until the source has a new job
+        stats = _compute_source_stats(context, source.id,
+                                      harvest_model.HarvestSourceStats())
 
-    job_count = len(jobs)
-    if job_count == 0:
+    if stats.job_count == 0:
         return out
 
-    out['job_count'] = job_count
+    out['job_count'] = stats.job_count
 
-    # Get the most recent job
-    last_job = harvest_model.HarvestJob.filter(source=source) \
-        .order_by(harvest_model.HarvestJob.created.desc()).first()
+    if stats.last_job:
+        last_job = json.loads(stats.last_job)
+        if not context.get('return_stats', True):
+            last_job.pop('stats', None)
+        if not context.get('return_error_summary', True):
+            last_job.pop('object_error_summary', None)
+            last_job.pop('gather_error_summary', None)
+        out['last_job'] = last_job
+    else:
+        # still running
+        last_job = harvest_model.HarvestJob.get(stats.last_job_id)
+        if not last_job:
+            return out
+        out['last_job'] = harvest_job_dictize(last_job, context)
 
-    if not last_job:
-        return out
+    out['total_datasets'] = stats.total_datasets
+
+    return out
+
+
+def _refresh_source_stats(context, source_id):
+    '''
+    Builds again the `HarvestSourceStats` of a source from its jobs and
+    objects. The dict of the last job is stored if the job is finished.
+
+    The changes are not committed.
+    '''
+    stats = harvest_model.HarvestSourceStats.get(source_id)
+    if stats is None:
+        stats = harvest_model.HarvestSourceStats(harvest_source_id=source_id)
+        context['model'].Session.add(stats)
+    return _compute_source_stats(context, source_id, stats)
 
-    out['last_job'] = harvest_job_dictize(last_job, context)
 
-    # Overall statistics
-    packages = model.Session.query(model.Package) \
+def _compute_source_stats(context, source_id, stats):
+    model = context['model']
+
+    stats.job_count = model.Session.query(HarvestJob) \
+        .filter(HarvestJob.source_id == source_id) \
+        .count()
+
+    last_job = model.Session.query(HarvestJob) \
+        .filter(HarvestJob.source_id == source_id) \
+        .order_by(HarvestJob.created.desc()).first()
+    stats.last_job_id = last_job.id if last_job else None
+    stats.last_job = None
+    if last_job and last_job.status == u'Finished':
+        stats.last_job = json.dumps(harvest_job_dictize(last_job, {'model': model}))
+
+    stats.total_datasets = model.Session.query(model.Package) \
         .join(harvest_model.HarvestObject) \
-        .filter(harvest_model.HarvestObject.harvest_source_id == source.id) \
+        .filter(harvest_model.HarvestObject.harvest_source_id == source_id) \
         .filter(
         harvest_model.HarvestObject.current == True  # noqa: E712
     ).filter(model.Package.state == u'active') \
         .filter(
         model.Package.private == False  # noqa: E712
-    )
-    out['total_datasets'] = packages.count()
-
-    return out
+    ).count()
+    stats.updated = datetime.datetime.utcnow()
+    return stats
 
 
 @side_effect_free
@@ -154,65 +201,249 @@ def harvest_job_show(context, data_dict):
 
 @side_effect_free
 def harvest_job_report(context, data_dict):
+    '''
+    Returns the errors of a harvest job: the first page of gather errors
+    and a page of objects with errors, keyed by object id.
 
-    check_access('harvest_job_show', context, data_dict)
+    Use ``harvest_job_gather_errors`` and ``harvest_job_object_errors`` to
+    get the following pages, or export all the errors from
+    ``/harvest/<source>/job/<id>/errors.csv``.
 
-    model = context['model']
-    id = data_dict.get('id')
+    :param id: the id of the harvest job
+    :type id: string
+    :param limit: max number of gather errors and of objects (default: 100,
+        max: 1000)
+    :type limit: int
+    :param after: return the objects after this object id, as in
+        ``object_errors_next`` (optional)
+    :type after: string
+    :param message: only return the objects with this error message
+        (optional)
+    :type message: string
+    '''
 
-    job = HarvestJob.get(id)
-    if not job:
-        raise NotFound
+    check_access('harvest_job_show', context, data_dict)
 
-    report = {
-        'gather_errors': [],
-        'object_errors': {}
+    gather_errors = harvest_job_gather_errors(
+        context, {'id': data_dict.get('id'), 'limit': data_dict.get('limit')})
+    object_errors = harvest_job_object_errors(context, data_dict)
+
+    return {
+        'gather_errors': gather_errors['errors'],
+        'gather_errors_next': gather_errors['next'],
+        'object_errors': object_errors['objects'],
+        'object_errors_next': object_errors['next'],
     }
 
-    # Gather errors
+
+@side_effect_free
+def harvest_job_gather_errors(context, data_dict):
+    '''
+    Returns a page of the gather errors of a harvest job, newest first.
+
+    :param id: the id of the harvest job
+    :type id: string
+    :param limit: max number of errors (default: 100, max: 1000)
+    :type limit: int
+    :param after: return the errors after this error id, as in ``next``
+        (optional)
+    :type after: string
+
+    :returns: ``errors``, and the ``next`` cursor or None on the last page
+    :rtype: dictionary
+    '''
+
+    check_access('harvest_job_show', context, data_dict)
+
+    model = context['model']
+    job = _get_report_job(data_dict)
+    limit = _get_report_limit(data_dict)
+    after = data_dict.get('after')
+
     q = model.Session.query(harvest_model.HarvestGatherError) \
-        .join(harvest_model.HarvestJob) \
-        .filter(harvest_model.HarvestGatherError.harvest_job_id == job.id) \
-        .order_by(harvest_model.HarvestGatherError.created.desc())
+        .filter(harvest_model.HarvestGatherError.harvest_job_id == job.id)
+
+    if after:
+        created = model.Session.query(harvest_model.HarvestGatherError.created) \
+            .filter(harvest_model.HarvestGatherError.id == after) \
+            .filter(harvest_model.HarvestGatherError.harvest_job_id == job.id) \
+            .scalar()
+        if created is None:
+            raise logic.ValidationError({'after': ['Unknown gather error: {}'.format(after)]})
+        q = q.filter(or_(
+            harvest_model.HarvestGatherError.created < created,
+            and_(harvest_model.HarvestGatherError.created == created,
+                 harvest_model.HarvestGatherError.id < after)))
+
+    q = q.order_by(harvest_model.HarvestGatherError.created.desc(),
+                   harvest_model.HarvestGatherError.id.desc()) \
+        .limit(limit + 1)
+
+    errors = q.all()
+    next_id = errors[limit - 1].id if len(errors) > limit else None
+
+    return {
+        'errors': [{
+            'id': error.id,
+            'message': error.message,
+            'created': error.created.isoformat() if error.created else None,
+        } for error in errors[:limit]],
+        'next': next_id,
+    }
 
-    for error in q.all():
-        report['gather_errors'].append({
-            'message': error.message
-        })
 
-    # Object errors
+@side_effect_free
+def harvest_job_object_errors(context, data_dict):
+    '''
+    Returns a page of the objects of a harvest job that have errors, with
+    their errors, in object id order.
 
-    # Check if the harvester for this job's source has a method for returning
-    # the URL to the original document
-    original_url_builder = None
-    for harvester in PluginImplementations(IHarvester):
-        if harvester.info()['name'] == job.source.type:
-            if hasattr(harvester, 'get_original_url'):
-                original_url_builder = harvester.get_original_url
+    :param id: the id of the harvest job
+    :type id: string
+    :param limit: max number of objects (default: 100, max: 1000)
+    :type limit: int
+    :param after: return the objects after this object id, as in ``next``
+        (optional)
+    :type after: string
+    :param message: only return the objects with this error message, e.g.
+        one from ``harvest_job_error_histogram`` (optional)
+    :type message: string
+
+    :returns: ``objects``, keyed by object id, and the ``next`` cursor or
+        None on the last page
+    :rtype: dictionary
+    '''
 
-    q = model.Session.query(harvest_model.HarvestObjectError, harvest_model.HarvestObject.guid) \
-        .join(harvest_model.HarvestObject) \
-        .filter(harvest_model.HarvestObject.harvest_job_id == job.id) \
-        .order_by(harvest_model.HarvestObjectError.harvest_object_id)
+    check_access('harvest_job_show', context, data_dict)
 
-    for error, guid in q.all():
-        if error.harvest_object_id not in report['object_errors']:
-            report['object_errors'][error.harvest_object_id] = {
+    model = context['model']
+    job = _get_report_job(data_dict)
+    limit = _get_report_limit(data_dict)
+    after = data_dict.get('after')
+    message = data_dict.get('message')
+
+    HarvestObjectError = harvest_model.HarvestObjectError
+
+    q = model.Session.query(HarvestObjectError.harvest_object_id) \
+        .join(HarvestObject) \
+        .filter(HarvestObject.harvest_job_id == job.id)
+    if message:
+        q = q.filter(HarvestObjectError.message == message)
+    if after:
+        q = q.filter(HarvestObjectError.harvest_object_id > after)
+    q = q.distinct() \
+        .order_by(HarvestObjectError.harvest_object_id) \
+        .limit(limit + 1)
+
+    object_ids = [object_id for object_id, in q]
+    next_id = object_ids[limit - 1] if len(object_ids) > limit else None
+    object_ids = object_ids[:limit]
+
+    objects = {}
+    if not object_ids:
+        return {'objects': objects, 'next': next_id}
+
+    # Check if the harvester for this job's source has a method for returning
+    # the URL to the original document
+    harvester = get_harvester(job.source.type)
+    original_url_builder = getattr(harvester, 'get_original_url', None)
+
+    q = model.Session.query(HarvestObjectError, HarvestObject.guid) \
+        .join(HarvestObject) \
+        .filter(HarvestObjectError.harvest_object_id.in_(object_ids)) \
+        .order_by(HarvestObjectError.harvest_object_id,
+                  HarvestObjectError.created)
+
+    for error, guid in q:
+        if error.harvest_object_id not in objects:
+            objects[error.harvest_object_id] = {
                 'guid': guid,
                 'errors': []
             }
             if original_url_builder:
                 url = original_url_builder(error.harvest_object_id)
                 if url:
-                    report['object_errors'][error.harvest_object_id]['original_url'] = url
+                    objects[error.harvest_object_id]['original_url'] = url
 
-        report['object_errors'][error.harvest_object_id]['errors'].append({
+        objects[error.harvest_object_id]['errors'].append({
             'message': error.message,
             'line': error.line,
             'type': error.stage
-         })
+        })
+
+    return {'objects': objects, 'next': next_id}
 
-    return report
+
+@side_effect_free
+def harvest_job_error_histogram(context, data_dict):
+    '''
+    Returns the error messages of a harvest job with their number of
+    occurrences, most frequent first.
+
+    :param id: the id of the harvest job
+    :type id: string
+    :param limit: max number of messages of each kind (default: 100,
+        max: 1000)
+    :type limit: int
+
+    :returns: ``gather_errors`` with ``message`` and ``error_count``, and
+        ``object_errors`` with ``message``, ``stage``, ``error_count`` and
+        the number of objects with the error, ``object_count``
+    :rtype: dictionary
+    '''
+
+    check_access('harvest_job_show', context, data_dict)
+
+    model = context['model']
+    job = _get_report_job(data_dict)
+    limit = _get_report_limit(data_dict)
+
+    HarvestGatherError = harvest_model.HarvestGatherError
+    HarvestObjectError = harvest_model.HarvestObjectError
+
+    error_count = func.count(HarvestGatherError.id).label('error_count')
+    q = model.Session.query(HarvestGatherError.message, error_count) \
+        .filter(HarvestGatherError.harvest_job_id == job.id) \
+        .group_by(HarvestGatherError.message) \
+        .order_by(error_count.desc(), HarvestGatherError.message) \
+        .limit(limit)
+    gather_errors = [{'message': message, 'error_count': count}
+                     for message, count in q]
+
+    error_count = func.count(HarvestObjectError.id).label('error_count')
+    q = model.Session.query(
+        HarvestObjectError.message,
+        HarvestObjectError.stage,
+        error_count,
+        func.count(func.distinct(HarvestObjectError.harvest_object_id))) \
+        .join(HarvestObject) \
+        .filter(HarvestObject.harvest_job_id == job.id) \
+        .group_by(HarvestObjectError.message, HarvestObjectError.stage) \
+        .order_by(error_count.desc(), HarvestObjectError.message) \
+        .limit(limit)
+    object_errors = [{'message': message, 'stage': stage,
+                      'error_count': count, 'object_count': object_count}
+                     for message, stage, count, object_count in q]
+
+    return {
+        'gather_errors': gather_errors,
+        'object_errors': object_errors,
+    }
+
+
+def _get_report_job(data_dict):
+    job = HarvestJob.get(data_dict.get('id'))
+    if not job:
+        raise NotFound
+    return job
+
+
+def _get_report_limit(data_dict):
+    try:
+        limit = int(data_dict.get('limit') or REPORT_PAGE_SIZE)
+    except ValueError:
+        limit = REPORT_PAGE_SIZE
+    return max(1, min(limit, REPORT_MAX_PAGE_SIZE))
 
 
 @side_effect_free
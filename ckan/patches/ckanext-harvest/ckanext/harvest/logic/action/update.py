@@ -8,7 +8,7 @@ import logging
 import datetime
 
 from ckantoolkit import config
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, case, func, or_
 from urllib.parse import urljoin
 
 from ckan.lib.search.index import PackageSearchIndex
@@ -33,7 +33,7 @@ from ckanext.harvest.logic import HarvestJobExists
 from ckanext.harvest.logic.dictization import harvest_job_dictize
 
 from ckanext.harvest.logic.action.get import (
-    harvest_source_show, harvest_job_list, _get_sources_for_user)
+    harvest_source_show, _get_sources_for_user, _refresh_source_stats)
 
 import ckan.lib.mailer as mailer
 from itertools import islice
@@ -42,6 +42,10 @@ from ckan.plugins.toolkit import render
 
 log = logging.getLogger(__name__)
 
+# run the tasks of the finished jobs (source reindex, stats and
+# notification emails) in a background job
+BACKGROUND_JOB_FINISHED = 'ckan.harvest.background_job_finished'
+
 
 def harvest_source_update(context, data_dict):
     '''
@@ -183,6 +187,8 @@ def harvest_source_clear(context, data_dict):
     delete from harvest_gather_error where harvest_job_id in (
         select id from harvest_job where source_id = '{harvest_source_id}');
     delete from harvest_job where source_id = '{harvest_source_id}';
+    delete from harvest_source_http_cache where harvest_source_id = '{harvest_source_id}';
+    delete from harvest_source_stats where harvest_source_id = '{harvest_source_id}';
     delete from package_tag_revision where package_id in (
         select id from package where state = 'to_delete');
     delete from member_revision where table_id in (
@@ -393,6 +399,7 @@ def harvest_source_job_history_clear(context, data_dict):
         DELETE FROM harvest_job AS job WHERE source_id = '{harvest_source_id}'
          AND job.status != 'Running'
          AND NOT EXISTS (SELECT id FROM harvest_object WHERE harvest_job_id = job.id);
+        DELETE FROM harvest_source_stats WHERE harvest_source_id = '{harvest_source_id}';
         COMMIT;
         '''.format(harvest_source_id=harvest_source_id)
     else:
@@ -405,6 +412,7 @@ def harvest_source_job_history_clear(context, data_dict):
         DELETE FROM harvest_gather_error WHERE harvest_job_id
          IN (SELECT id FROM harvest_job WHERE source_id = '{harvest_source_id}');
         DELETE FROM harvest_job WHERE source_id = '{harvest_source_id}';
+        DELETE FROM harvest_source_stats WHERE harvest_source_id = '{harvest_source_id}';
         COMMIT;
         '''.format(harvest_source_id=harvest_source_id)
 
@@ -643,78 +651,55 @@ def harvest_jobs_run(context, data_dict):
     context['return_objects'] = False
 
     # Flag finished jobs as such
-    jobs = harvest_job_list(
-        context, {'source_id': source_id, 'status': u'Running'})
-    if len(jobs):
-        for job in jobs:
-            job_obj = HarvestJob.get(job['id'])
-            if timeout:
-                last_time = job_obj.get_last_action_time()
-                now = datetime.datetime.utcnow()
-                if now - last_time > datetime.timedelta(minutes=int(timeout)):
-                    msg = 'Job {} timeout ({} minutes)\n'.format(job_obj.id, timeout)
-                    msg += '\tJob created: {}\n'.format(job_obj.created)
-                    msg += '\tJob gather finished: {}\n'.format(job_obj.created)
-                    msg += '\tJob last action time: {}\n'.format(last_time)
-
-                    job_obj.status = u'Finished'
-                    job_obj.finished = now
-                    job_obj.save()
-
-                    err = HarvestGatherError(message=msg, job=job_obj)
-                    err.save()
-                    log.info('Marking job as finished due to error: %s %s',
-                             job_obj.source.url, job_obj.id)
-                    continue
-
-            if job['gather_finished']:
-                num_objects_in_progress = \
-                    session.query(HarvestObject.id) \
-                           .filter(HarvestObject.harvest_job_id == job['id']) \
-                           .filter(and_((HarvestObject.state != u'COMPLETE'),
-                                        (HarvestObject.state != u'ERROR'))) \
-                           .count()
-
-                if num_objects_in_progress == 0:
-
-                    job_obj.status = u'Finished'
-                    log.info('Marking job as finished %s %s',
-                             job_obj.source.url, job_obj.id)
-
-                    # save the time of finish, according to the last running
-                    # object
-                    last_object = session.query(HarvestObject) \
-                        .filter(HarvestObject.harvest_job_id == job['id']) \
-                        .filter(
-                        HarvestObject.import_finished != None  # noqa: E711
-                    ).order_by(HarvestObject.import_finished.desc()) \
-                        .first()
-                    if last_object:
-                        job_obj.finished = last_object.import_finished
-                    else:
-                        job_obj.finished = job['gather_finished']
-                    job_obj.save()
-
-                    # Reindex the harvest source dataset so it has the latest
-                    # status
-                    get_action('harvest_source_reindex')(
-                        context, {'id': job_obj.source.id})
-
-                    status = get_action('harvest_source_show_status')(
-                        context, {'id': job_obj.source.id})
-
-                    notify_all = toolkit.asbool(config.get('ckan.harvest.status_mail.all'))
-                    notify_errors = toolkit.asbool(config.get('ckan.harvest.status_mail.errored'))
-                    last_job_errors = status['last_job']['stats'].get('errored', 0)
-                    log.debug('Notifications: All:{} On error:{} Errors:{}'.format(notify_all, notify_errors, last_job_errors))
-
-                    if last_job_errors > 0 and (notify_all or notify_errors):
-                        send_error_email(context, job_obj.source.id, status)
-                    elif notify_all:
-                        send_summary_email(context, job_obj.source.id, status)
+    jobs = session.query(HarvestJob).filter(HarvestJob.status == u'Running')
+    if source_id:
+        jobs = jobs.filter(HarvestJob.source_id == source_id)
+    jobs = jobs.order_by(HarvestJob.created.desc()).all()
+    job_stats = _running_jobs_stats(session, [job.id for job in jobs])
+    now = datetime.datetime.utcnow()
+    for job_obj in jobs:
+        stats = job_stats.get(job_obj.id)
+        if timeout:
+            last_time = _last_action_time(job_obj, stats)
+            if now - last_time > datetime.timedelta(minutes=int(timeout)):
+                msg = 'Job {} timeout ({} minutes)\n'.format(job_obj.id, timeout)
+                msg += '\tJob created: {}\n'.format(job_obj.created)
+                msg += '\tJob gather finished: {}\n'.format(job_obj.created)
+                msg += '\tJob last action time: {}\n'.format(last_time)
+
+                job_obj.status = u'Finished'
+                job_obj.finished = now
+                job_obj.save()
+
+                err = HarvestGatherError(message=msg, job=job_obj)
+                err.save()
+                log.info('Marking job as finished due to error: %s %s',
+                         job_obj.source.url, job_obj.id)
+                continue
+
+        if job_obj.gather_finished:
+            num_objects_in_progress = stats.in_progress if stats else 0
+
+            if num_objects_in_progress == 0:
+
+                job_obj.status = u'Finished'
+                log.info('Marking job as finished %s %s',
+                         job_obj.source.url, job_obj.id)
+
+                # save the time of finish, according to the last running
+                # object
+                if stats and stats.last_import_finished:
+                    job_obj.finished = stats.last_import_finished
                 else:
-                    log.debug('%d Ongoing jobs for %s (source:%s)',
-                              num_objects_in_progress, job['id'], job['source_id'])
+                    job_obj.finished = job_obj.gather_finished
+                job_obj.save()
+
+                # Reindex the harvest source dataset and send the
+                # notifications, out of the cron run if configured
+                _enqueue_job_finished(job_obj.source_id)
+            else:
+                log.debug('%d Ongoing jobs for %s (source:%s)',
+                          num_objects_in_progress, job_obj.id, job_obj.source_id)
     log.debug('No jobs to send to the gather queue')
 
     # Resubmit old redis tasks
@@ -726,12 +711,97 @@ def harvest_jobs_run(context, data_dict):
     return []  # merely for backwards compatibility
 
 
+def _running_jobs_stats(session, job_ids):
+    '''
+    Returns the stats of the objects of the given jobs, by job id, computed
+    with a single query: number of objects in progress, time of the last
+    complete object, of the last imported object and of the last gathered
+    object.
+    '''
+    if not job_ids:
+        return {}
+    query = session.query(
+        HarvestObject.harvest_job_id,
+        func.sum(case((and_(HarvestObject.state != u'COMPLETE',
+                            HarvestObject.state != u'ERROR'), 1),
+                      else_=0)).label('in_progress'),
+        func.max(case((HarvestObject.state == u'COMPLETE',
+                       HarvestObject.import_finished))).label('last_complete'),
+        func.max(HarvestObject.import_finished).label('last_import_finished'),
+        func.max(HarvestObject.gathered).label('last_gathered'),
+    ).filter(HarvestObject.harvest_job_id.in_(job_ids)) \
+        .group_by(HarvestObject.harvest_job_id)
+    return dict((row.harvest_job_id, row) for row in query)
+
+
+def _last_action_time(job, stats):
+    '''
+    Same as `HarvestJob.get_last_action_time`, from the `_running_jobs_stats`
+    of the job
+    '''
+    if stats and stats.last_complete:
+        return stats.last_complete
+    if job.gather_finished is not None:
+        return job.gather_finished
+    if stats and stats.last_gathered:
+        return stats.last_gathered
+    return job.created
+
+
+def _enqueue_job_finished(source_id):
+    '''
+    Runs the tasks of a finished job of a source. They run now, unless
+    `ckan.harvest.background_job_finished` is set: then they are sent to
+    the background jobs queue, which needs a `ckan jobs worker` running.
+    '''
+    if toolkit.asbool(config.get(BACKGROUND_JOB_FINISHED, False)):
+        try:
+            toolkit.enqueue_job(_harvest_job_finished, [source_id],
+                                title='Harvest job finished: {}'.format(source_id))
+            return
+        except Exception as e:
+            log.warning('Cannot enqueue the finished job of source %s, running it now: %s',
+                        source_id, e)
+    _harvest_job_finished(source_id)
+
+
+def _harvest_job_finished(source_id):
+    '''
+    Run when the job of a harvest source finishes, possibly as a background
+    job: stores the source stats, reindexes the source dataset so it has
+    the latest status, and sends the notification emails.
+    '''
+    from ckan import model
+
+    context = {'model': model, 'session': model.Session, 'ignore_auth': True,
+               'return_objects': False}
+    context['user'] = get_action('get_site_user')(
+        {'model': model, 'ignore_auth': True}, {})['name']
+
+    _refresh_source_stats(context, source_id)
+    model.Session.commit()
+
+    get_action('harvest_source_reindex')(context, {'id': source_id})
+
+    status = get_action('harvest_source_show_status')(context, {'id': source_id})
+
+    notify_all = toolkit.asbool(config.get('ckan.harvest.status_mail.all'))
+    notify_errors = toolkit.asbool(config.get('ckan.harvest.status_mail.errored'))
+    last_job_errors = status['last_job']['stats'].get('errored', 0)
+    log.debug('Notifications: All:{} On error:{} Errors:{}'.format(notify_all, notify_errors, last_job_errors))
+
+    if last_job_errors > 0 and (notify_all or notify_errors):
+        send_error_email(context, source_id, status)
+    elif notify_all:
+        send_summary_email(context, source_id, status)
+
+
 def get_mail_extra_vars(context, source_id, status):
     last_job = status['last_job']
 
     source = get_action('harvest_source_show')(context, {'id': source_id})
     report = get_action(
-        'harvest_job_report')(context, {'id': status['last_job']['id']})
+        'harvest_job_report')(context, {'id': status['last_job']['id'], 'limit': 20})
     obj_errors = []
     job_errors = []
 
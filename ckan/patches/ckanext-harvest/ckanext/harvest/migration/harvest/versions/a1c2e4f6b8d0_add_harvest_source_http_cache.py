@@ -0,0 +1,41 @@
+"""add harvest source http cache
+
+Revision ID: a1c2e4f6b8d0
+Revises: 75d650dfd519
+Create Date: 2026-10-18 10:12:41.512873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a1c2e4f6b8d0"
+down_revision = "75d650dfd519"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "harvest_source_http_cache",
+        sa.Column(
+            "harvest_source_id",
+            sa.UnicodeText,
+            sa.ForeignKey("harvest_source.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("url", sa.UnicodeText, nullable=False),
+        sa.Column("etag", sa.UnicodeText),
+        sa.Column("last_modified", sa.UnicodeText),
+        sa.Column(
+            "harvest_job_id",
+            sa.UnicodeText,
+            sa.ForeignKey("harvest_job.id", ondelete="CASCADE"),
+        ),
+        sa.Column("updated", sa.DateTime),
+    )
+
+
+def downgrade():
+    op.drop_table("harvest_source_http_cache")
@@ -0,0 +1,37 @@
+"""add harvest source stats
+
+Revision ID: c3d5e7f9a1b2
+Revises: a1c2e4f6b8d0
+Create Date: 2026-10-18 16:40:12.205417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c3d5e7f9a1b2"
+down_revision = "a1c2e4f6b8d0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "harvest_source_stats",
+        sa.Column(
+            "harvest_source_id",
+            sa.UnicodeText,
+            sa.ForeignKey("harvest_source.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("job_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("last_job_id", sa.UnicodeText),
+        sa.Column("last_job", sa.UnicodeText),
+        sa.Column("total_datasets", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("updated", sa.DateTime),
+    )
+
+
+def downgrade():
+    op.drop_table("harvest_source_stats")
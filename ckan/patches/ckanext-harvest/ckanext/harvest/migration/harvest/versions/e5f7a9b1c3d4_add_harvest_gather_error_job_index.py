@@ -0,0 +1,27 @@
+"""add harvest gather error job index
+
+Revision ID: e5f7a9b1c3d4
+Revises: c3d5e7f9a1b2
+Create Date: 2026-10-18 18:02:37.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e5f7a9b1c3d4"
+down_revision = "c3d5e7f9a1b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "harvest_gather_error_harvest_job_id_idx",
+        "harvest_gather_error",
+        ["harvest_job_id", "created"],
+    )
+
+
+def downgrade():
+    op.drop_index("harvest_gather_error_harvest_job_id_idx")
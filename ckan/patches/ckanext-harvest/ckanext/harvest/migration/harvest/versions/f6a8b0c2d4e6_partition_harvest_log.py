@@ -0,0 +1,88 @@
+"""partition harvest log
+
+Revision ID: f6a8b0c2d4e6
+Revises: e5f7a9b1c3d4
+Create Date: 2026-10-18 19:21:05.640193
+
+"""
+import datetime
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "f6a8b0c2d4e6"
+down_revision = "e5f7a9b1c3d4"
+branch_labels = None
+depends_on = None
+
+# days the partitions are created in advance, then the DBLogHandler
+# writers and clean_harvest_log create the following ones
+PARTITION_DAYS = 7
+
+
+def upgrade():
+    op.execute("ALTER TABLE harvest_log RENAME TO harvest_log_old")
+    op.execute(
+        "ALTER TABLE harvest_log_old RENAME CONSTRAINT harvest_log_pkey "
+        "TO harvest_log_old_pkey"
+    )
+    op.execute(
+        """
+        CREATE TABLE harvest_log (
+            id text NOT NULL,
+            content text NOT NULL,
+            level log_level,
+            created timestamp without time zone NOT NULL,
+            PRIMARY KEY (id, created)
+        ) PARTITION BY RANGE (created)
+        """
+    )
+    op.execute("CREATE TABLE harvest_log_default PARTITION OF harvest_log DEFAULT")
+    # the existing records go to the default partition, which
+    # clean_harvest_log empties in time
+    op.execute(
+        """
+        INSERT INTO harvest_log (id, content, level, created)
+        SELECT id, content, level, COALESCE(created, NOW() AT TIME ZONE 'utc')
+        FROM harvest_log_old
+        """
+    )
+    op.execute("DROP TABLE harvest_log_old")
+
+    today = datetime.datetime.utcnow().date()
+    for offset in range(1, PARTITION_DAYS + 1):
+        day = today + datetime.timedelta(days=offset)
+        op.execute(
+            "CREATE TABLE harvest_log_p{0} PARTITION OF harvest_log "
+            "FOR VALUES FROM ('{1}') TO ('{2}')".format(
+                day.strftime("%Y%m%d"),
+                day.isoformat(),
+                (day + datetime.timedelta(days=1)).isoformat(),
+            )
+        )
+
+
+def downgrade():
+    op.execute("ALTER TABLE harvest_log RENAME TO harvest_log_partitioned")
+    op.execute(
+        "ALTER TABLE harvest_log_partitioned RENAME CONSTRAINT harvest_log_pkey "
+        "TO harvest_log_partitioned_pkey"
+    )
+    op.execute(
+        """
+        CREATE TABLE harvest_log (
+            id text PRIMARY KEY,
+            content text NOT NULL,
+            level log_level,
+            created timestamp without time zone
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO harvest_log (id, content, level, created)
+        SELECT id, content, level, created FROM harvest_log_partitioned
+        """
+    )
+    op.execute("DROP TABLE harvest_log_partitioned")
@@ -7,17 +7,27 @@ from sqlalchemy import Column
 from sqlalchemy import ForeignKey
 from sqlalchemy import types
 from sqlalchemy import Index
+from sqlalchemy import DDL
+from sqlalchemy import text
 from sqlalchemy.orm import backref, relation
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
 
 from ckan.model.meta import metadata, mapper, Session
 from ckan.model.types import make_uuid
 from ckan.model.domain_object import DomainObject
 from ckan.model.package import Package
+from ckan.plugins.toolkit import config, asint
 
 
 UPDATE_FREQUENCIES = ["MANUAL", "MONTHLY", "WEEKLY", "BIWEEKLY", "DAILY", "ALWAYS"]
 
+HARVEST_LOG_PARTITION_PREFIX = "harvest_log_p"
+# days the harvest log partitions are created in advance
+HARVEST_LOG_PARTITION_DAYS = 7
+
+OBJECT_BATCH_SIZE_CONFIG_OPTION = "ckan.harvest.object_batch_size"
+DEFAULT_OBJECT_BATCH_SIZE = 500
+
 log = logging.getLogger(__name__)
 
 __all__ = [
@@ -27,12 +37,17 @@ __all__ = [
     "harvest_job_table",
     "HarvestObject",
     "harvest_object_table",
+    "HarvestObjectWriter",
     "HarvestGatherError",
     "harvest_gather_error_table",
     "HarvestObjectError",
     "harvest_object_error_table",
     "HarvestLog",
     "harvest_log_table",
+    "HarvestSourceHttpCache",
+    "harvest_source_http_cache_table",
+    "HarvestSourceStats",
+    "harvest_source_stats_table",
 ]
 
 
@@ -109,6 +124,7 @@ harvest_gather_error_table = Table(
     Column("harvest_job_id", types.UnicodeText, ForeignKey("harvest_job.id")),
     Column("message", types.UnicodeText),
     Column("created", types.DateTime, default=datetime.datetime.utcnow),
+    Index("harvest_gather_error_harvest_job_id_idx", "harvest_job_id", "created"),
 )
 harvest_object_error_table = Table(
     "harvest_object_error",
@@ -130,6 +146,7 @@ harvest_object_extra_table = Table(
     Column("value", types.UnicodeText),
     Index("harvest_object_id_idx", "harvest_object_id"),
 )
+# partitioned by day, see clean_harvest_log
 harvest_log_table = Table(
     "harvest_log",
     metadata,
@@ -139,7 +156,49 @@ harvest_log_table = Table(
         "level",
         types.Enum("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL", name="log_level"),
     ),
-    Column("created", types.DateTime, default=datetime.datetime.utcnow),
+    Column(
+        "created",
+        types.DateTime,
+        primary_key=True,
+        default=datetime.datetime.utcnow,
+    ),
+    postgresql_partition_by="RANGE (created)",
+)
+harvest_source_http_cache_table = Table(
+    "harvest_source_http_cache",
+    metadata,
+    Column(
+        "harvest_source_id",
+        types.UnicodeText,
+        ForeignKey("harvest_source.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column("url", types.UnicodeText, nullable=False),
+    Column("etag", types.UnicodeText),
+    Column("last_modified", types.UnicodeText),
+    # job that downloaded the content the validators refer to
+    Column(
+        "harvest_job_id",
+        types.UnicodeText,
+        ForeignKey("harvest_job.id", ondelete="CASCADE"),
+    ),
+    Column("updated", types.DateTime, default=datetime.datetime.utcnow),
+)
+harvest_source_stats_table = Table(
+    "harvest_source_stats",
+    metadata,
+    Column(
+        "harvest_source_id",
+        types.UnicodeText,
+        ForeignKey("harvest_source.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column("job_count", types.Integer, nullable=False, default=0),
+    Column("last_job_id", types.UnicodeText),
+    # JSON dump of the last job dict, once finished
+    Column("last_job", types.UnicodeText),
+    Column("total_datasets", types.Integer, nullable=False, default=0),
+    Column("updated", types.DateTime, default=datetime.datetime.utcnow),
 )
 
 
@@ -279,6 +338,111 @@ class HarvestObjectExtra(HarvestDomainObject):
     """Extra key value data for Harvest objects"""
 
 
+class HarvestObjectWriter(object):
+    """Creates the harvest objects of a job in batches
+
+    Objects added with ``add`` are kept in memory and inserted with a single
+    multi-row INSERT (and one commit) every ``batch_size`` objects, instead
+    of one INSERT and commit per object as with ``HarvestObject.save``.
+    Their ids are generated upfront, so ``add`` returns the id right away
+    and ``ids`` lists them in the order the objects were added.
+
+    Call ``flush`` once all objects have been added (or use the writer as a
+    context manager) to insert the remaining ones, or ``abort`` to drop all
+    the objects added.
+
+    Note that the ORM events of ``HarvestObject`` are not fired for these
+    objects.
+    """
+
+    def __init__(self, job, batch_size=None):
+        if batch_size is None:
+            batch_size = asint(
+                config.get(OBJECT_BATCH_SIZE_CONFIG_OPTION, DEFAULT_OBJECT_BATCH_SIZE)
+            )
+        self.job = job
+        self.source_id = job.source_id or job.source.id
+        self.batch_size = max(batch_size, 1)
+        self.ids = []
+        self._objects = []
+        self._extras = []
+
+    def add(self, guid, content=None, package_id=None, extras=None):
+        """
+        Adds a harvest object to the next batch, optionally with a dict
+        of extras. Returns the id of the object.
+        """
+        object_id = make_uuid()
+        self._objects.append(
+            {
+                "id": object_id,
+                "guid": guid,
+                "current": False,
+                "gathered": datetime.datetime.utcnow(),
+                "content": content,
+                "state": "WAITING",
+                "retry_times": 0,
+                "harvest_job_id": self.job.id,
+                "harvest_source_id": self.source_id,
+                "package_id": package_id,
+            }
+        )
+        for key, value in (extras or {}).items():
+            self._extras.append(
+                {
+                    "id": make_uuid(),
+                    "harvest_object_id": object_id,
+                    "key": key,
+                    "value": value,
+                }
+            )
+        self.ids.append(object_id)
+
+        if len(self._objects) >= self.batch_size:
+            self.flush()
+
+        return object_id
+
+    def flush(self):
+        """Inserts the pending objects and commits"""
+        if not self._objects:
+            return
+
+        Session.execute(harvest_object_table.insert().values(self._objects))
+        if self._extras:
+            Session.execute(harvest_object_extra_table.insert().values(self._extras))
+        Session.commit()
+
+        log.debug("Inserted %d harvest objects", len(self._objects))
+        self._objects = []
+        self._extras = []
+
+    def abort(self):
+        """Discards the pending objects and deletes the ones already
+        inserted, then commits"""
+        self._objects = []
+        self._extras = []
+        for i in range(0, len(self.ids), self.batch_size):
+            ids = self.ids[i:i + self.batch_size]
+            Session.execute(harvest_object_extra_table.delete().where(
+                harvest_object_extra_table.c.harvest_object_id.in_(ids)))
+            Session.execute(harvest_object_table.delete().where(
+                harvest_object_table.c.id.in_(ids)))
+        Session.commit()
+
+        if self.ids:
+            log.debug("Deleted %d harvest objects", len(self.ids))
+        self.ids = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Pending objects are discarded if something went wrong
+        if exc_type is None:
+            self.flush()
+
+
 class HarvestGatherError(HarvestDomainObject):
     """Gather errors are raised during the **gather** stage of a harvesting
     job.
@@ -337,6 +501,54 @@ class HarvestLog(HarvestDomainObject):
     pass
 
 
+class HarvestSourceHttpCache(HarvestDomainObject):
+    """HTTP cache validators (ETag and Last-Modified headers) of the last
+    complete download of a harvest source, which harvesters can send in
+    conditional requests to skip sources that did not change.
+    """
+
+    key_attr = "harvest_source_id"
+
+
+class HarvestSourceStats(HarvestDomainObject):
+    """Status of a harvest source (number of jobs, last job and number of
+    datasets), so it can be shown without going through all its jobs and
+    objects.
+
+    The row of a source is updated as jobs are created and objects
+    imported, and built again from the jobs and objects when a job
+    finishes (see `harvest_source_show_status`).
+    """
+
+    key_attr = "harvest_source_id"
+
+    @classmethod
+    def job_created(cls, source_id, job_id):
+        """Counts a new job of the source, which becomes its last job. Not
+        committed. Returns False if the source has no stats yet."""
+        table = harvest_source_stats_table
+        return Session.execute(
+            table.update()
+            .where(table.c.harvest_source_id == source_id)
+            .values(job_count=table.c.job_count + 1,
+                    last_job_id=job_id,
+                    last_job=None,
+                    updated=datetime.datetime.utcnow())
+        ).rowcount > 0
+
+    @classmethod
+    def datasets_changed(cls, source_id, delta):
+        """Adds `delta` to the number of datasets of the source. Not
+        committed."""
+        table = harvest_source_stats_table
+        Session.execute(
+            table.update()
+            .where(table.c.harvest_source_id == source_id)
+            .values(total_datasets=table.c.total_datasets + delta,
+                    updated=datetime.datetime.utcnow())
+        )
+
+
 def harvest_object_before_insert_listener(mapper, connection, target):
     """
     For compatibility with old harvesters, check if the source id has
@@ -359,18 +571,132 @@ class PackageIdHarvestSourceIdMismatch(Exception):
 
 
 def clean_harvest_log(condition):
-    Session.query(HarvestLog).filter(HarvestLog.created <= condition).delete(
-        synchronize_session=False
-    )
+    """Deletes the harvest log records created before `condition`.
+
+    The harvest_log table is partitioned by day: the partitions of the
+    days before `condition` are detached and dropped (see
+    `_drop_harvest_log_partition`), and only the rows of the day of
+    `condition` and of the default partition, which gets the rows of the
+    days without a partition, are deleted. The partitions of the next
+    HARVEST_LOG_PARTITION_DAYS days are then created.
+    """
+    partitioned = _harvest_log_is_partitioned()
     try:
+        if partitioned:
+            old = [name for name, day in _harvest_log_partitions()
+                   if day + datetime.timedelta(days=1) <= condition]
+            # a concurrent detach waits for the open transactions
+            Session.commit()
+            for name in old:
+                _drop_harvest_log_partition(name)
+                log.debug("Dropped harvest log partition %s", name)
+        Session.query(HarvestLog).filter(HarvestLog.created <= condition).delete(
+            synchronize_session=False
+        )
         Session.commit()
-    except InvalidRequestError:
+    except (InvalidRequestError, DBAPIError):
         Session.rollback()
         log.error("An error occurred while trying to clean-up the harvest log table")
+        return
+
+    if partitioned:
+        create_harvest_log_partitions()
 
     log.info("Harvest log table clean-up finished successfully")
 
 
+def create_harvest_log_partitions(days=HARVEST_LOG_PARTITION_DAYS):
+    """Creates the missing harvest log partitions of the next `days` days.
+
+    Today is skipped, as its rows may already be in the default partition.
+    """
+    existing = set(name for name, day in _harvest_log_partitions())
+    today = datetime.datetime.utcnow().date()
+    for offset in range(1, days + 1):
+        day = today + datetime.timedelta(days=offset)
+        name = HARVEST_LOG_PARTITION_PREFIX + day.strftime("%Y%m%d")
+        if name in existing:
+            continue
+        try:
+            Session.execute(text(
+                'CREATE TABLE "{0}" PARTITION OF harvest_log '
+                "FOR VALUES FROM ('{1}') TO ('{2}')".format(
+                    name, day.isoformat(),
+                    (day + datetime.timedelta(days=1)).isoformat())))
+            Session.commit()
+        except DBAPIError as e:
+            Session.rollback()
+            log.warning("Cannot create harvest log partition %s: %s", name, e)
+
+
+def _drop_harvest_log_partition(name):
+    """Detaches a harvest log partition, then drops it.
+
+    Dropping an attached partition locks harvest_log exclusively, blocking
+    the log writers and readers. The partition is detached concurrently if
+    possible (PostgreSQL 14+, not allowed while harvest_log has a default
+    partition, as created by the migration), otherwise with a plain detach,
+    which only locks harvest_log while the catalog is updated. The detached
+    table is then dropped without locking harvest_log.
+    """
+    connection = Session.get_bind().connect().execution_options(
+        isolation_level="AUTOCOMMIT")
+    try:
+        try:
+            connection.execute(text(
+                'ALTER TABLE harvest_log DETACH PARTITION "{0}" '
+                "CONCURRENTLY".format(name)))
+        except DBAPIError:
+            connection.execute(text(
+                'ALTER TABLE harvest_log DETACH PARTITION "{0}"'.format(name)))
+        connection.execute(text('DROP TABLE "{0}"'.format(name)))
+    finally:
+        connection.close()
+
+
+def ensure_harvest_log_partitions():
+    """Creates the missing harvest log partitions of the next days, if
+    harvest_log is partitioned.
+
+    Called by the `DBLogHandler` writers, so the rows do not end up in the
+    default partition when `clean_harvest_log` is not run.
+    """
+    try:
+        if _harvest_log_is_partitioned():
+            create_harvest_log_partitions()
+    finally:
+        Session.remove()
+
+
+def _harvest_log_is_partitioned():
+    if Session.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(Session.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'harvest_log'")).first())
+
+
+def _harvest_log_partitions():
+    """Returns the name and day of the daily partitions of harvest_log"""
+    rows = Session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'harvest_log'"))
+    partitions = []
+    for name, in rows:
+        if not name.startswith(HARVEST_LOG_PARTITION_PREFIX):
+            continue
+        try:
+            day = datetime.datetime.strptime(
+                name[len(HARVEST_LOG_PARTITION_PREFIX):], "%Y%m%d")
+        except ValueError:
+            continue
+        partitions.append((name, day))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
 mapper(
     HarvestSource,
     harvest_source_table,
@@ -444,4 +770,23 @@ mapper(
     harvest_log_table,
 )
 
+mapper(
+    HarvestSourceHttpCache,
+    harvest_source_http_cache_table,
+)
+
+mapper(
+    HarvestSourceStats,
+    harvest_source_stats_table,
+)
+
 event.listen(HarvestObject, "before_insert", harvest_object_before_insert_listener)
+
+# rows of the days without a partition
+event.listen(
+    harvest_log_table,
+    "after_create",
+    DDL("CREATE TABLE harvest_log_default PARTITION OF harvest_log DEFAULT").execute_if(
+        dialect="postgresql"
+    ),
+)
@@ -15,8 +15,8 @@ from ckan.lib.plugins import DefaultTranslation
 
 import ckanext.harvest
 from ckanext.harvest import cli, views
-from ckanext.harvest.model import HarvestSource, HarvestJob, HarvestObject
-from ckanext.harvest.log import DBLogHandler
+from ckanext.harvest.model import HarvestSource, HarvestJob, HarvestObject, HarvestSourceHttpCache
+from ckanext.harvest.log import DBLogHandler, QUEUE_SIZE
 
 from ckanext.harvest.utils import (
     DATASET_TYPE_NAME
@@ -437,6 +437,10 @@ def _update_harvest_source_object(context, data_dict):
     # Don't commit yet, let package_create do it
     source.add()
 
+    # The next harvest should not be skipped with a conditional request
+    # as the source settings may have changed
+    HarvestSourceHttpCache.filter(harvest_source_id=source.id).delete()
+
     # Abort any pending jobs
     if not source.active:
         jobs = HarvestJob.filter(source=source, status=u'New')
@@ -533,12 +537,17 @@ def _configure_db_logger(config):
 
     loggers = children_.get(scope)
 
+    # A single handler, so all the records are written by the same thread
+    handler = DBLogHandler(
+        level=level,
+        queue_size=p.toolkit.asint(config.get('ckan.harvest.log_queue_size', QUEUE_SIZE)))
+
     # Get root logger and set db handler
     logger = getLogger(parent_logger)
     if scope < 1:
-        logger.addHandler(DBLogHandler(level=level))
+        logger.addHandler(handler)
 
     # Set db handler to all child loggers
     for _ in loggers:
         child_logger = logger.getChild(_)
-        child_logger.addHandler(DBLogHandler(level=level))
+        child_logger.addHandler(handler)
@@ -1,9 +1,12 @@
 import logging
 import datetime
 import json
+import time
+import collections
 
 
 import redis
+from redis.exceptions import WatchError
 import pika
 import sqlalchemy
 
@@ -11,7 +14,8 @@ from ckan.lib.base import config
 from ckan.plugins import PluginImplementations
 from ckan import model
 
-from ckanext.harvest.model import HarvestJob, HarvestObject, HarvestGatherError
+from ckanext.harvest.model import (HarvestJob, HarvestObject, HarvestGatherError, HarvestSource,
+                                   HarvestSourceStats)
 from ckanext.harvest.interfaces import IHarvester
 
 log = logging.getLogger(__name__)
@@ -29,11 +33,24 @@ VIRTUAL_HOST = '/'
 MQ_TYPE = 'redis'
 REDIS_PORT = 6379
 REDIS_DB = 0
+PREFETCH_COUNT = 1
+# seconds the status of a job is cached by the fetch consumer
+JOB_INFO_TTL = 10
 
 # settings for AMQP
 EXCHANGE_TYPE = 'direct'
 EXCHANGE_NAME = 'ckan.harvest'
 
+# number of harvest object ids published at once to the fetch queue
+PUBLISH_BATCH_SIZE = 1000
+# number of stale queue items sent again at once by resubmit_jobs, and of
+# WAITING objects checked at once by resubmit_objects
+RESUBMIT_BATCH_SIZE = 1000
+# seconds a message can be in flight before it is sent again, 3 minutes
+# for fetch and import, 2 hours for a gather
+FETCH_TIMEOUT = 180
+GATHER_TIMEOUT = 7200
+
 
 def get_connection():
     backend = config.get('ckan.harvest.mq.type', MQ_TYPE)
@@ -103,6 +120,21 @@ def get_fetch_routing_key():
         config.get('ckan.site_id', 'default'))
 
 
+def get_queued_key(routing_key):
+    '''
+    Redis set with the ids of the messages waiting in the queue
+    '''
+    return routing_key + '.queued'
+
+
+def get_in_flight_key(routing_key):
+    '''
+    Redis sorted set with the ids of the messages taken from the queue and
+    not acknowledged yet, scored by the time they were taken
+    '''
+    return routing_key + '.in_flight'
+
+
 def purge_queues():
     backend = config.get('ckan.harvest.mq.type', MQ_TYPE)
     connection = get_connection()
@@ -128,71 +160,87 @@ def resubmit_jobs():
     if config.get('ckan.harvest.mq.type') != 'redis':
         return
     redis = get_connection()
+    now = time.time()
 
-    # fetch queue
-    harvest_object_pending = redis.keys(get_fetch_routing_key() + ':*')
-    for key in harvest_object_pending:
-        redis_value = redis.get(key)
-        if redis_value is None:
-            log.info('Fetch Queue: Redis cannot get value for key {}'.format(key))
-            continue
-        date_of_key = datetime.datetime.strptime(
-            redis_value, "%Y-%m-%d %H:%M:%S.%f")
-        log.debug('[Fetch queue]: Check key {} with value {}'.format(key, date_of_key))
-        # 3 minutes for fetch and import max
-        if (datetime.datetime.now() - date_of_key).seconds > 180:
-            log.debug('[Fetch queue]: Re-new harvest object with KEY {} in redis'.format(key))
-            redis.rpush(get_fetch_routing_key(),
-                        json.dumps({'harvest_object_id': key.split(':')[-1]})
-                        )
-            redis.delete(key)
-
-    # gather queue
-    harvest_jobs_pending = redis.keys(get_gather_routing_key() + ':*')
-    for key in harvest_jobs_pending:
-        redis_value = redis.get(key)
-        if redis_value is None:
-            log.info('Gather Queue: Redis cannot get value for key {}'.format(key))
-            continue
-        date_of_key = datetime.datetime.strptime(
-            redis_value, "%Y-%m-%d %H:%M:%S.%f")
-        log.debug('[Gather queue]: Check key {} with value {}'.format(key, date_of_key))
-        # 3 hours for a gather
-        if (datetime.datetime.now() - date_of_key).seconds > 7200:
-            log.debug('[Gather queue]: Re-new harvest job with KEY {} in redis'.format(key))
-            redis.rpush(get_gather_routing_key(),
-                        json.dumps({'harvest_job_id': key.split(':')[-1]})
-                        )
-            redis.delete(key)
+    for routing_key, timeout in ((get_fetch_routing_key(), FETCH_TIMEOUT),
+                                 (get_gather_routing_key(), GATHER_TIMEOUT)):
+        message_key = routing_key.split(':')[-1]
+        in_flight_key = get_in_flight_key(routing_key)
+        while True:
+            stale = redis.zrangebyscore(in_flight_key, '-inf', now - timeout,
+                                        start=0, num=RESUBMIT_BATCH_SIZE)
+            if not stale:
+                break
+            log.debug('Re-new %s in redis: %s', message_key, stale)
+            pipe = redis.pipeline()
+            pipe.rpush(routing_key, *[json.dumps({message_key: id}) for id in stale])
+            pipe.sadd(get_queued_key(routing_key), *stale)
+            pipe.zrem(in_flight_key, *stale)
+            pipe.execute()
+            if len(stale) < RESUBMIT_BATCH_SIZE:
+                break
 
 
 def resubmit_objects():
     '''
-    Resubmit all WAITING objects on the DB that are not present in Redis
+    Resubmit all WAITING objects on the DB that are not present in Redis,
+    neither queued nor in flight (which includes the messages prefetched by
+    the consumers)
     '''
     if config.get('ckan.harvest.mq.type') != 'redis':
         return
     redis = get_connection()
     publisher = get_fetch_publisher()
 
-    waiting_objects = model.Session.query(HarvestObject.id) \
-        .filter_by(state='WAITING') \
-        .all()
-
-    objects_in_queue = []
     fetch_routing_key = get_fetch_routing_key()
+    queued_key = get_queued_key(fetch_routing_key)
+    in_flight_key = get_in_flight_key(fetch_routing_key)
+    if not redis.exists(queued_key):
+        # queue filled before the queued ids were tracked
+        _track_queued_ids(redis, fetch_routing_key)
 
-    objects_in_queue = [json.loads(o)['harvest_object_id']
-                        for o in redis.lrange(fetch_routing_key, 0, -1)]
+    waiting_objects = model.Session.query(HarvestObject.id) \
+        .filter_by(state='WAITING') \
+        .yield_per(RESUBMIT_BATCH_SIZE)
 
+    batch = []
     for object_id, in waiting_objects:
-        if object_id not in objects_in_queue:
-            log.debug('Re-sent object {} to the fetch queue'.format(object_id))
-            publisher.send({'harvest_object_id': object_id})
+        batch.append(object_id)
+        if len(batch) >= RESUBMIT_BATCH_SIZE:
+            _resubmit_missing(redis, publisher, queued_key, in_flight_key, batch)
+            batch = []
+    _resubmit_missing(redis, publisher, queued_key, in_flight_key, batch)
 
     publisher.close()
 
 
+def _resubmit_missing(redis, publisher, queued_key, in_flight_key, object_ids):
+    if not object_ids:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for object_id in object_ids:
+        pipe.sismember(queued_key, object_id)
+        pipe.zscore(in_flight_key, object_id)
+    found = pipe.execute()
+    missing = [object_id for idx, object_id in enumerate(object_ids)
+               if not found[2 * idx] and found[2 * idx + 1] is None]
+    for object_id in missing:
+        log.debug('Re-sent object {} to the fetch queue'.format(object_id))
+    publisher.send_many([{'harvest_object_id': object_id} for object_id in missing])
+
+
+def _track_queued_ids(redis, routing_key):
+    message_key = routing_key.split(':')[-1]
+    queued_key = get_queued_key(routing_key)
+    start = 0
+    while True:
+        items = redis.lrange(routing_key, start, start + RESUBMIT_BATCH_SIZE - 1)
+        if not items:
+            break
+        redis.sadd(queued_key, *[json.loads(item)[message_key] for item in items])
+        start += len(items)
+
+
 class Publisher(object):
     def __init__(self, connection, channel, exchange, routing_key):
         self.connection = connection
@@ -210,6 +258,24 @@ class Publisher(object):
             ),
             **kw)
 
+    def send_many(self, bodies, **kw):
+        '''
+        Publishes a batch of messages, waiting for the broker to get them
+        only once at the end instead of after each message.
+        '''
+        properties = pika.BasicProperties(
+            delivery_mode=2,  # make message persistent
+        )
+        for body in bodies:
+            self.channel.basic_publish(
+                self.exchange,
+                self.routing_key,
+                json.dumps(body),
+                properties=properties,
+                **kw)
+        # flush the pending frames (and service heartbeats)
+        self.connection.process_data_events(time_limit=0)
+
     def close(self):
         self.connection.close()
 
@@ -218,6 +284,8 @@ class RedisPublisher(object):
     def __init__(self, redis, routing_key):
         self.redis = redis  # not used
         self.routing_key = routing_key
+        self.message_key = routing_key.split(':')[-1]
+        self.queued_key = get_queued_key(routing_key)
 
     def send(self, body, **kw):
         value = json.dumps(body)
@@ -233,7 +301,27 @@ class RedisPublisher(object):
                     self.redis.lrem(self.routing_key, value, 0)
                 else:
                     raise
-        self.redis.rpush(self.routing_key, value)
+        pipe = self.redis.pipeline()
+        pipe.rpush(self.routing_key, value)
+        pipe.sadd(self.queued_key, body[self.message_key])
+        pipe.execute()
+
+    def send_many(self, bodies, **kw):
+        '''
+        Publishes a batch of messages with a single RPUSH.
+        '''
+        values = [json.dumps(body) for body in bodies]
+        if not values:
+            return
+        if self.routing_key == get_gather_routing_key():
+            # needs the lrem fallback of send for old redis versions
+            for body in bodies:
+                self.send(body, **kw)
+            return
+        pipe = self.redis.pipeline()
+        pipe.rpush(self.routing_key, *values)
+        pipe.sadd(self.queued_key, *[body[self.message_key] for body in bodies])
+        pipe.execute()
 
     def close(self):
         return
@@ -260,7 +348,7 @@ class FakeMethod(object):
 
 
 class RedisConsumer(object):
-    def __init__(self, redis, routing_key):
+    def __init__(self, redis, routing_key, prefetch_count=PREFETCH_COUNT):
         self.redis = redis
         # Routing keys are constructed with {site-id}:{message-key}, eg:
         # default:harvest_job_id or default:harvest_object_id
@@ -268,56 +356,115 @@ class RedisConsumer(object):
         # Message keys are harvest_job_id for the gather consumer and
         # harvest_object_id for the fetch consumer
         self.message_key = routing_key.split(':')[-1]
+        self.queued_key = get_queued_key(routing_key)
+        self.in_flight_key = get_in_flight_key(routing_key)
+        # Messages popped from the queue but not consumed yet. They are
+        # kept in the in flight set, with the time refreshed while the
+        # consumer is alive, and put back on the queue by `cancel`. If the
+        # consumer dies, `resubmit_jobs` sends them again.
+        self.prefetch_count = max(prefetch_count, 1)
+        self._prefetched = collections.deque()
+
+    def consume(self, queue, inactivity_timeout=None):
+        '''
+        Yields the messages of the queue, popping up to `prefetch_count` of
+        them at once.
 
-    def consume(self, queue):
+        If `inactivity_timeout` (in seconds) is set, ``(None, None, None)``
+        is yielded when no message arrived in that time, as pika does.
+        '''
         while True:
-            key, body = self.redis.blpop(self.routing_key)
+            if not self._prefetched:
+                self._prefetch(inactivity_timeout)
+                if not self._prefetched:
+                    yield (None, None, None)
+                    continue
+
+            body = self._prefetched.popleft()
             try:
-                self.redis.set(self.persistance_key(body), str(datetime.datetime.now()))
+                # the messages still prefetched are not stale either
+                now = time.time()
+                self.redis.zadd(self.in_flight_key, dict(
+                    (self.message_id(message), now)
+                    for message in [body] + list(self._prefetched)))
             except Exception as e:
                 log.error("Redis Exception: %s", e)
                 continue
 
             yield (FakeMethod(body), self, body)
 
-    def persistance_key(self, message):
-        # If you change this, make sure to update the script in `queue_purge`
-        message = json.loads(message)
-        return self.routing_key + ':' + message[self.message_key]
+    def _prefetch(self, inactivity_timeout=None):
+        result = self.redis.blpop(self.routing_key, timeout=inactivity_timeout or 0)
+        if result is None:
+            return
+        bodies = [result[1]]
+
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    if self.prefetch_count > 1:
+                        # take the following messages and mark them all in
+                        # flight in one transaction, so they are never
+                        # missing from both the queued and in flight sets
+                        pipe.watch(self.routing_key)
+                        prefetched = pipe.lrange(self.routing_key, 0, self.prefetch_count - 2)
+                        pipe.multi()
+                        if prefetched:
+                            pipe.ltrim(self.routing_key, len(prefetched), -1)
+                    else:
+                        prefetched = []
+                    ids = [self.message_id(body) for body in bodies + prefetched]
+                    now = time.time()
+                    pipe.zadd(self.in_flight_key, dict((id, now) for id in ids))
+                    pipe.srem(self.queued_key, *ids)
+                    pipe.execute()
+                    break
+                except WatchError:
+                    # messages were added or taken meanwhile
+                    continue
+        self._prefetched.extend(bodies + prefetched)
+
+    def cancel(self):
+        '''
+        Puts the prefetched messages that were not consumed back on the
+        head of the queue.
+        '''
+        if self._prefetched:
+            ids = [self.message_id(body) for body in self._prefetched]
+            pipe = self.redis.pipeline()
+            pipe.lpush(self.routing_key, *reversed(self._prefetched))
+            pipe.sadd(self.queued_key, *ids)
+            pipe.zrem(self.in_flight_key, *ids)
+            pipe.execute()
+            self._prefetched.clear()
+
+    def message_id(self, message):
+        return json.loads(message)[self.message_key]
 
     def basic_ack(self, message):
-        self.redis.delete(self.persistance_key(message))
+        self.redis.zrem(self.in_flight_key, self.message_id(message))
 
     def queue_purge(self, queue=None):
         '''
-        Purge the consumer's queue.
+        Purge the consumer's queue, along with the ids of its queued and in
+        flight messages.
 
         The ``queue`` parameter exists only for compatibility and is
         ignored.
         '''
         # Use a script to make the operation atomic
         lua_code = b'''
-            local routing_key = KEYS[1]
-            local message_key = ARGV[1]
-            local count = 0
-            while true do
-                local s = redis.call("lpop", routing_key)
-                if s == false then
-                    break
-                end
-                local value = cjson.decode(s)
-                local id = value[message_key]
-                local persistance_key = routing_key .. ":" .. id
-                redis.call("del", persistance_key)
-                count = count + 1
-            end
+            local count = redis.call("llen", KEYS[1])
+            redis.call("del", KEYS[1], KEYS[2], KEYS[3])
             return count
         '''
         script = self.redis.register_script(lua_code)
-        return script(keys=[self.routing_key], args=[self.message_key])
+        return script(keys=[self.routing_key, self.queued_key, self.in_flight_key])
 
     def basic_get(self, queue):
         body = self.redis.lpop(self.routing_key)
+        if body is not None:
+            self.redis.srem(self.queued_key, self.message_id(body))
         return (FakeMethod(body), self, body)
 
 
@@ -325,15 +472,20 @@ def get_consumer(queue_name, routing_key):
 
     connection = get_connection()
     backend = config.get('ckan.harvest.mq.type', MQ_TYPE)
+    try:
+        prefetch_count = int(config.get('ckan.harvest.mq.prefetch_count', PREFETCH_COUNT))
+    except ValueError:
+        prefetch_count = PREFETCH_COUNT
 
     if backend in ('amqp', 'ampq'):
         channel = connection.channel()
         channel.exchange_declare(exchange=EXCHANGE_NAME, durable=True)
         channel.queue_declare(queue=queue_name, durable=True)
         channel.queue_bind(queue=queue_name, exchange=EXCHANGE_NAME, routing_key=routing_key)
+        channel.basic_qos(prefetch_count=prefetch_count)
         return channel
     if backend == 'redis':
-        return RedisConsumer(connection, routing_key)
+        return RedisConsumer(connection, routing_key, prefetch_count)
 
 
 def gather_callback(channel, method, header, body):
@@ -390,9 +542,11 @@ def gather_callback(channel, method, header, body):
 
         log.debug('Received from plugin gather_stage: {0} objects (first: {1} last: {2})'.format(
             len(harvest_object_ids), harvest_object_ids[:1], harvest_object_ids[-1:]))
-        for id in harvest_object_ids:
-            # Send the id to the fetch queue
-            publisher.send({'harvest_object_id': id})
+        # Send the ids to the fetch queue
+        for i in range(0, len(harvest_object_ids), PUBLISH_BATCH_SIZE):
+            publisher.send_many(
+                [{'harvest_object_id': id}
+                 for id in harvest_object_ids[i:i + PUBLISH_BATCH_SIZE]])
         log.debug('Sent {0} objects to the fetch queue'.format(len(harvest_object_ids)))
 
     else:
@@ -413,12 +567,58 @@ def gather_callback(channel, method, header, body):
     channel.basic_ack(method.delivery_tag)
 
 
+# source type -> harvester, set by load_harvesters
+_harvesters = None
+
+# job id -> (expiry time, (status, source type))
+_job_info = {}
+
+
+def load_harvesters():
+    '''
+    Caches the harvester plugins by source type, so get_harvester does not
+    need to go through all of them for each message. Called when the
+    consumers start.
+    '''
+    global _harvesters
+    harvesters = {}
+    for harvester in PluginImplementations(IHarvester):
+        harvesters.setdefault(harvester.info()['name'], harvester)
+    _harvesters = harvesters
+
+
 def get_harvester(harvest_source_type):
+    if _harvesters is not None:
+        return _harvesters.get(harvest_source_type)
     for harvester in PluginImplementations(IHarvester):
         if harvester.info()['name'] == harvest_source_type:
             return harvester
 
 
+def _get_job_info(job_id):
+    '''
+    Returns the status of a job and the type of its source, cached for
+    JOB_INFO_TTL seconds, or None if the job does not exist.
+    '''
+    now = time.time()
+    cached = _job_info.get(job_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    info = model.Session.query(HarvestJob.status, HarvestSource.type) \
+        .join(HarvestSource, HarvestJob.source_id == HarvestSource.id) \
+        .filter(HarvestJob.id == job_id) \
+        .first()
+    if info is not None:
+        info = tuple(info)
+
+    if len(_job_info) > 1000:
+        for key in [key for key, value in _job_info.items() if value[0] <= now]:
+            del _job_info[key]
+    _job_info[job_id] = (now + JOB_INFO_TTL, info)
+    return info
+
+
 def gather_stage(harvester, job):
     '''Calls the harvester's gather_stage, returning harvest object ids, with
     some error handling.
@@ -469,8 +669,15 @@ def fetch_callback(channel, method, header, body):
         channel.basic_ack(method.delivery_tag)
         return False
 
+    previous_state = obj.state
+    if not _claim_object(obj):
+        log.info('Harvest object %s is already being processed (%s), skipping',
+                 obj.id, obj.state)
+        channel.basic_ack(method.delivery_tag)
+        return False
+
+    # The retry count is saved along with the next state of the object
     obj.retry_times += 1
-    obj.save()
 
     if obj.retry_times >= 5:
         obj.state = "ERROR"
@@ -480,70 +687,118 @@ def fetch_callback(channel, method, header, body):
         return False
 
     # check if job has been set to finished
-    job = HarvestJob.get(obj.harvest_job_id)
-    if job.status == 'Finished':
+    job_info = _get_job_info(obj.harvest_job_id)
+    if job_info is None or job_info[0] == 'Finished':
         obj.state = "ERROR"
         obj.report_status = "errored"
         obj.save()
-        log.error('Job {0} was aborted or timed out, object {1} set to error'.format(job.id, obj.id))
+        log.error('Job {0} was aborted or timed out, object {1} set to error'.format(
+            obj.harvest_job_id, obj.id))
         channel.basic_ack(method.delivery_tag)
         return False
 
-    # Send the harvest object to the plugins that implement
-    # the Harvester interface, only if the source type
-    # matches
-    for harvester in PluginImplementations(IHarvester):
-        if harvester.info()['name'] == obj.source.type:
-            fetch_and_import_stages(harvester, obj)
+    # Send the harvest object to the plugin that implements
+    # the Harvester interface for the source type
+    harvester = get_harvester(job_info[1])
+    if harvester:
+        fetch_and_import_stages(harvester, obj)
+    else:
+        # nothing was fetched, only the retry count changes
+        obj.state = previous_state
+        obj.save()
 
     model.Session.remove()
     channel.basic_ack(method.delivery_tag)
 
 
+def _claim_object(obj):
+    '''
+    Marks the object as fetched by this consumer, if it is still WAITING
+    or if its consumer seems to have died while fetching or importing it
+    (as for the messages sent again by `resubmit_jobs`).
+
+    Returns False if the object was already processed, or is being
+    processed by another consumer. The object is refreshed either way, as
+    the update does not change the instance in the session.
+    '''
+    stuck = datetime.datetime.utcnow() - datetime.timedelta(seconds=FETCH_TIMEOUT)
+    claimed = model.Session.query(HarvestObject) \
+        .filter(HarvestObject.id == obj.id) \
+        .filter(sqlalchemy.or_(
+            HarvestObject.state == 'WAITING',
+            sqlalchemy.and_(HarvestObject.state.in_(['FETCH', 'IMPORT']),
+                            HarvestObject.fetch_started < stuck))) \
+        .update({'state': 'FETCH',
+                 'fetch_started': datetime.datetime.utcnow()},
+                synchronize_session=False)
+    model.Session.commit()
+    model.Session.refresh(obj)
+    return claimed > 0
+
+
 def fetch_and_import_stages(harvester, obj):
+    '''
+    Runs the fetch and import stages of a harvest object
+
+    The object is only committed when the fetch stage starts and once the
+    import stage has finished (the harvesters may still commit it in
+    between). The timestamps are set again before the last commit in case
+    the harvester rolled back the session.
+    '''
     obj.fetch_started = datetime.datetime.utcnow()
     obj.state = "FETCH"
     obj.save()
+    import_started = None
+    import_finished = None
+
     success_fetch = harvester.fetch_stage(obj)
-    obj.fetch_finished = datetime.datetime.utcnow()
-    obj.save()
+    fetch_finished = datetime.datetime.utcnow()
+    obj.fetch_finished = fetch_finished
     if success_fetch is True:
         # If no errors where found, call the import method
-        obj.import_started = datetime.datetime.utcnow()
+        import_started = datetime.datetime.utcnow()
+        obj.import_started = import_started
         obj.state = "IMPORT"
-        obj.save()
         success_import = harvester.import_stage(obj)
-        obj.import_finished = datetime.datetime.utcnow()
+        import_finished = datetime.datetime.utcnow()
         if success_import:
-            obj.state = "COMPLETE"
-            if success_import == 'unchanged':
-                obj.report_status = 'not modified'
-                obj.save()
-                return
+            state = "COMPLETE"
+            report_status = 'not modified' if success_import == 'unchanged' else None
         else:
-            obj.state = "ERROR"
-        obj.save()
+            state = "ERROR"
+            report_status = None
     elif success_fetch == 'unchanged':
-        obj.state = 'COMPLETE'
-        obj.report_status = 'not modified'
-        obj.save()
-        return
+        state = "COMPLETE"
+        report_status = 'not modified'
     else:
-        obj.state = "ERROR"
-        obj.save()
-    if obj.state == 'ERROR':
-        obj.report_status = 'errored'
-    elif obj.current is False:
-        obj.report_status = 'deleted'
-    elif len(
-        model.Session.query(HarvestObject)
-            .filter_by(package_id=obj.package_id)
-            .limit(2)
-            .all()
-    ) == 2:
-        obj.report_status = 'updated'
-    else:
-        obj.report_status = 'added'
+        state = "ERROR"
+        report_status = None
+
+    obj.fetch_finished = fetch_finished
+    if import_started:
+        obj.import_started = import_started
+        obj.import_finished = import_finished
+    obj.state = state
+
+    if report_status is None:
+        if state == 'ERROR':
+            report_status = 'errored'
+        elif obj.current is False:
+            report_status = 'deleted'
+        elif len(
+            model.Session.query(HarvestObject)
+                .filter_by(package_id=obj.package_id)
+                .limit(2)
+                .all()
+        ) == 2:
+            report_status = 'updated'
+        else:
+            report_status = 'added'
+    obj.report_status = report_status
+    if report_status in ('added', 'deleted'):
+        # the exact count is computed again when the job finishes
+        HarvestSourceStats.datasets_changed(obj.harvest_source_id,
+                                            1 if report_status == 'added' else -1)
     obj.save()
 
 
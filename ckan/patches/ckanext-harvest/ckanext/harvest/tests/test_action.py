@@ -787,3 +787,72 @@ class TestActions():
         assert len(last_job['gather_error_summary']) == 1
         assert last_job['gather_error_summary'][0]['message'] == harvest_gather_error.message
         assert last_job['gather_error_summary'][0]['error_count'] == 1
+
+    def test_harvest_job_report_pages(self):
+        source = factories.HarvestSourceObj(**SOURCE_DICT.copy())
+        job = factories.HarvestJobObj(source=source)
+        for i in range(3):
+            obj = factories.HarvestObjectObj(job=job, source=source, guid='guid-%d' % i)
+            harvest_model.HarvestObjectError(
+                message='Validation error' if i else 'Fetch error',
+                stage='Import', object=obj).save()
+            harvest_model.HarvestGatherError(message='Gather error %d' % i, job=job).save()
+
+        context = {'model': model}
+        report = get_action('harvest_job_report')(context, {'id': job.id, 'limit': 2})
+        assert len(report['gather_errors']) == 2
+        assert len(report['object_errors']) == 2
+
+        gather_errors = get_action('harvest_job_gather_errors')(
+            context, {'id': job.id, 'limit': 2, 'after': report['gather_errors_next']})
+        assert len(gather_errors['errors']) == 1
+        assert gather_errors['next'] is None
+        messages = [error['message'] for error in report['gather_errors'] + gather_errors['errors']]
+        assert sorted(messages) == ['Gather error 0', 'Gather error 1', 'Gather error 2']
+
+        object_errors = get_action('harvest_job_object_errors')(
+            context, {'id': job.id, 'limit': 2, 'after': report['object_errors_next']})
+        assert len(object_errors['objects']) == 1
+        assert object_errors['next'] is None
+        objects = list(report['object_errors'].values()) + list(object_errors['objects'].values())
+        assert sorted(obj['guid'] for obj in objects) == ['guid-0', 'guid-1', 'guid-2']
+
+        object_errors = get_action('harvest_job_object_errors')(
+            context, {'id': job.id, 'message': 'Fetch error'})
+        assert [obj['guid'] for obj in object_errors['objects'].values()] == ['guid-0']
+
+        histogram = get_action('harvest_job_error_histogram')(context, {'id': job.id})
+        assert histogram['object_errors'] == [
+            {'message': 'Validation error', 'stage': 'Import', 'error_count': 2, 'object_count': 2},
+            {'message': 'Fetch error', 'stage': 'Import', 'error_count': 1, 'object_count': 1},
+        ]
+        assert len(histogram['gather_errors']) == 3
+
+    def test_harvest_source_show_status_stats(self):
+        source = factories.HarvestSource(**SOURCE_DICT.copy())
+
+        site_user = get_action('get_site_user')(
+            {'ignore_auth': True}, {})['name']
+        job = get_action('harvest_job_create')(
+            {'user': site_user}, {'source_id': source['id'], 'run': False})
+
+        stats = harvest_model.HarvestSourceStats.get(source['id'])
+        assert stats.job_count == 1
+        assert stats.last_job_id == job['id']
+        assert stats.last_job is None
+
+        job_obj = harvest_model.HarvestJob.get(job['id'])
+        job_obj.status = 'Running'
+        job_obj.gather_finished = datetime.datetime.utcnow()
+        job_obj.save()
+        get_action('harvest_jobs_run')({'user': site_user}, {'source_id': source['id']})
+
+        stats = harvest_model.HarvestSourceStats.get(source['id'])
+        assert json.loads(stats.last_job)['status'] == 'Finished'
+
+        source_status = get_action('harvest_source_show_status')(
+            {'model': model}, {'id': source['id']})
+        assert source_status['job_count'] == 1
+        assert source_status['last_job']['id'] == job['id']
+        assert source_status['last_job']['status'] == 'Finished'
+        assert source_status['total_datasets'] == 0
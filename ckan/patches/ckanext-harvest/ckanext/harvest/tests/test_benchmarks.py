@@ -0,0 +1,88 @@
+'''
+Opt-in benchmarks, skipped unless CKAN_BENCHMARKS is set:
+
+    CKAN_BENCHMARKS=1 pytest -s --ckan-ini=test.ini ckanext/harvest/tests/test_benchmarks.py
+
+test_fetch_callback times queue.fetch_callback on objects of a harvester
+whose fetch and import stages do nothing, and counts the commits done for
+each object. Running it on the commit before the fetch_callback changes
+gives the previous numbers. On file-backed SQLite, 1000 objects went from
+23.3ms and 6 commits per object to 7.9ms and 2 commits per object.
+'''
+import json
+import os
+import time
+
+import pytest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from sqlalchemy import event
+
+from ckan import model
+
+from ckanext.harvest.model import HarvestObject
+from ckanext.harvest.tests import factories
+from ckanext.harvest.tests.test_queue import MockHarvester
+import ckanext.harvest.queue as queue
+
+OBJECTS = 1000
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('CKAN_BENCHMARKS'),
+    reason='Set CKAN_BENCHMARKS to run the benchmarks')
+
+
+class MockChannel(object):
+
+    def basic_ack(self, delivery_tag):
+        pass
+
+
+def _fetch_stage(self, harvest_object):
+    return True
+
+
+def _import_stage(self, harvest_object):
+    harvest_object.current = True
+    return True
+
+
+@pytest.mark.usefixtures('with_plugins', 'clean_db')
+@pytest.mark.ckan_config('ckan.plugins', 'harvest test_harvester')
+def test_fetch_callback():
+
+    job = factories.HarvestJobObj(source=factories.HarvestSourceObj())
+    job_id = job.id
+    for i in range(OBJECTS):
+        HarvestObject(guid='guid{0}'.format(i), job=job, state='WAITING').add()
+    model.Session.commit()
+    ids = [obj_id for obj_id, in model.Session.query(HarvestObject.id)
+           .filter_by(harvest_job_id=job_id)]
+    model.Session.remove()
+
+    commits = []
+
+    def count_commit(session):
+        commits.append(1)
+
+    event.listen(model.Session, 'after_commit', count_commit)
+    try:
+        with patch.object(MockHarvester, 'fetch_stage', _fetch_stage), \
+                patch.object(MockHarvester, 'import_stage', _import_stage):
+            start = time.perf_counter()
+            for obj_id in ids:
+                body = json.dumps({'harvest_object_id': obj_id})
+                queue.fetch_callback(MockChannel(), queue.FakeMethod(body), None, body)
+            elapsed = time.perf_counter() - start
+    finally:
+        event.remove(model.Session, 'after_commit', count_commit)
+
+    states = model.Session.query(HarvestObject.state) \
+        .filter_by(harvest_job_id=job_id).distinct().all()
+    assert states == [('COMPLETE',)]
+
+    print('\n{0} objects: {1:.2f}ms and {2:.1f} commits per object'.format(
+        OBJECTS, elapsed / OBJECTS * 1e3, len(commits) / float(OBJECTS)))
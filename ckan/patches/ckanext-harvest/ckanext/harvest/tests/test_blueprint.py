@@ -1,8 +1,11 @@
+import json
+
 import pytest
 
 from ckantoolkit import url_for
 from ckantoolkit.tests import factories
 from ckanext.harvest.tests import factories as harvest_factories
+import ckanext.harvest.model as harvest_model
 
 
 @pytest.mark.usefixtures('with_plugins', 'clean_db', 'clean_index')
@@ -118,3 +121,22 @@ class TestBlueprint():
         response = app.get(url, extra_environ=env)
 
         assert job['id'] in response.body
+
+    def test_job_errors_export(self, app):
+
+        job = harvest_factories.HarvestJobObj()
+        harvest_model.HarvestGatherError(message='Gather, "error"', job=job).save()
+
+        sysadmin = factories.Sysadmin()
+        env = {"REMOTE_USER": sysadmin['name'].encode('ascii')}
+
+        url = url_for('harvester.job_errors_export', source=job.source_id, id=job.id, fmt='csv')
+        response = app.get(url, extra_environ=env)
+
+        assert response.headers['Content-Type'].startswith('text/csv')
+        assert 'gather,,,,,"Gather, ""error""",' in response.body
+
+        url = url_for('harvester.job_errors_export', source=job.source_id, id=job.id, fmt='jsonl')
+        response = app.get(url, extra_environ=env)
+
+        assert json.loads(response.body.splitlines()[0])['message'] == 'Gather, "error"'
@@ -0,0 +1,111 @@
+import datetime
+import logging
+
+import pytest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from ckanext.harvest.log import DBLogHandler
+from ckanext.harvest.model import (HarvestLog, HarvestObject, HarvestObjectWriter,
+                                   clean_harvest_log)
+from ckanext.harvest.tests import factories as harvest_factories
+
+
+@pytest.mark.usefixtures('with_plugins', 'clean_db')
+class TestHarvestObjectWriter(object):
+
+    def test_add_and_flush(self):
+        job = harvest_factories.HarvestJobObj()
+
+        writer = HarvestObjectWriter(job, batch_size=2)
+        ids = [writer.add(guid='guid-%d' % i, content='content-%d' % i)
+               for i in range(5)]
+
+        assert writer.ids == ids
+        # Two full batches inserted, one object pending
+        assert HarvestObject.filter(harvest_job_id=job.id).count() == 4
+
+        writer.flush()
+
+        assert HarvestObject.filter(harvest_job_id=job.id).count() == 5
+        for i, object_id in enumerate(ids):
+            obj = HarvestObject.get(object_id)
+            assert obj.guid == 'guid-%d' % i
+            assert obj.content == 'content-%d' % i
+            assert obj.state == 'WAITING'
+            assert obj.current is False
+            assert obj.harvest_source_id == job.source.id
+
+    def test_abort(self):
+        job = harvest_factories.HarvestJobObj()
+
+        writer = HarvestObjectWriter(job, batch_size=2)
+        for i in range(5):
+            writer.add(guid='guid-%d' % i, extras={'status': 'delete'})
+        assert HarvestObject.filter(harvest_job_id=job.id).count() == 4
+
+        writer.abort()
+
+        assert writer.ids == []
+        assert HarvestObject.filter(harvest_job_id=job.id).count() == 0
+        writer.flush()
+        assert HarvestObject.filter(harvest_job_id=job.id).count() == 0
+
+    def test_extras(self):
+        job = harvest_factories.HarvestJobObj()
+
+        with HarvestObjectWriter(job) as writer:
+            object_id = writer.add(guid='guid', package_id=None,
+                                   extras={'status': 'delete'})
+
+        obj = HarvestObject.get(object_id)
+        assert [(e.key, e.value) for e in obj.extras] == [('status', 'delete')]
+
+
+@pytest.mark.usefixtures('with_plugins', 'clean_db')
+class TestHarvestLog(object):
+
+    def test_db_log_handler(self):
+        logger = logging.getLogger('ckanext.harvest.tests.db_log')
+        handler = DBLogHandler(batch_size=2)
+        logger.addHandler(handler)
+        try:
+            for i in range(5):
+                logger.warning('record %d', i)
+            handler.flush()
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        records = HarvestLog.filter(level='WARNING').all()
+        assert sorted(record.content for record in records) == \
+            ['record %d' % i for i in range(5)]
+        assert handler.dropped == 0
+
+    def test_db_log_handler_creates_partitions(self):
+        logger = logging.getLogger('ckanext.harvest.tests.db_log')
+        handler = DBLogHandler(batch_size=1)
+        logger.addHandler(handler)
+        try:
+            with patch('ckanext.harvest.log.ensure_harvest_log_partitions') as ensure:
+                for i in range(3):
+                    logger.warning('record %d', i)
+                handler.flush()
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        # checked when the writer starts, then every few hours
+        assert ensure.call_count == 1
+
+    def test_clean_harvest_log(self):
+        now = datetime.datetime.utcnow()
+        HarvestLog(content='old', level='INFO',
+                   created=now - datetime.timedelta(days=40)).save()
+        HarvestLog(content='new', level='INFO', created=now).save()
+
+        clean_harvest_log(condition=now - datetime.timedelta(days=30))
+
+        assert [record.content for record in HarvestLog.filter().all()] == ['new']
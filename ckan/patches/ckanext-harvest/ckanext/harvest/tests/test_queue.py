@@ -9,6 +9,7 @@ from ckanext.harvest.interfaces import IHarvester
 import ckanext.harvest.queue as queue
 from ckan.plugins.core import SingletonPlugin, implements
 import json
+import time
 from ckan.plugins import toolkit
 from ckan import model
 from ckan.lib.base import config
@@ -253,12 +254,116 @@ class TestHarvestQueue(object):
             queue.purge_queues()
 
             assert redis.get('ckanext-harvest:some-random-key') == 'foobar'
-            assert redis.dbsize() == num_keys
+            # the queues are gone along with their queued and in flight ids
+            assert redis.dbsize() == num_keys - 4
             assert redis.llen(queue.get_gather_routing_key()) == 0
             assert redis.llen(queue.get_fetch_routing_key()) == 0
         finally:
             redis.delete('ckanext-harvest:some-random-key')
 
+    def test_redis_send_many(self):
+        '''
+        Test that a batch of messages is queued in order.
+        '''
+        if config.get('ckan.harvest.mq.type') != 'redis':
+            pytest.skip()
+        redis = queue.get_connection()
+        fetch_routing_key = queue.get_fetch_routing_key()
+        try:
+            redis.delete(fetch_routing_key)
+            ids = [str(uuid.uuid4()) for i in range(5)]
+
+            fetch_publisher = queue.get_fetch_publisher()
+            fetch_publisher.send_many([{'harvest_object_id': id} for id in ids])
+            fetch_publisher.send_many([])
+
+            assert [json.loads(item)['harvest_object_id']
+                    for item in redis.lrange(fetch_routing_key, 0, -1)] == ids
+        finally:
+            redis.delete(fetch_routing_key)
+
+    def test_load_harvesters(self):
+        try:
+            queue.load_harvesters()
+
+            assert queue.get_harvester('test').info()['name'] == 'test'
+            assert queue.get_harvester('unknown') is None
+        finally:
+            queue._harvesters = None
+
+    def test_redis_consumer_prefetch(self):
+        '''
+        Test that prefetched messages are consumed in order, and put back on
+        the queue when the consumer is cancelled.
+        '''
+        if config.get('ckan.harvest.mq.type') != 'redis':
+            pytest.skip()
+        redis = queue.get_connection()
+        fetch_routing_key = queue.get_fetch_routing_key()
+        try:
+            redis.delete(fetch_routing_key)
+            ids = [str(uuid.uuid4()) for i in range(5)]
+            queue.get_fetch_publisher().send_many(
+                [{'harvest_object_id': id} for id in ids])
+
+            consumer = queue.RedisConsumer(redis, fetch_routing_key,
+                                           prefetch_count=3)
+            messages = consumer.consume(queue.get_fetch_queue_name(),
+                                        inactivity_timeout=1)
+            method, header, body = next(messages)
+
+            assert json.loads(body)['harvest_object_id'] == ids[0]
+            assert redis.llen(fetch_routing_key) == 2
+
+            consumer.basic_ack(body)
+            consumer.cancel()
+
+            assert [json.loads(item)['harvest_object_id']
+                    for item in redis.lrange(fetch_routing_key, 0, -1)] == ids[1:]
+        finally:
+            redis.delete(fetch_routing_key)
+
+    def test_resubmit_jobs(self):
+        '''
+        Test that only the messages in flight for too long are sent again.
+        '''
+        if config.get('ckan.harvest.mq.type') != 'redis':
+            pytest.skip()
+        redis = queue.get_connection()
+        fetch_routing_key = queue.get_fetch_routing_key()
+        in_flight_key = queue.get_in_flight_key(fetch_routing_key)
+        try:
+            redis.delete(fetch_routing_key, in_flight_key)
+            ids = [str(uuid.uuid4()) for i in range(3)]
+            queue.get_fetch_publisher().send_many(
+                [{'harvest_object_id': id} for id in ids])
+
+            consumer = queue.RedisConsumer(redis, fetch_routing_key,
+                                           prefetch_count=3)
+            messages = consumer.consume(queue.get_fetch_queue_name(),
+                                        inactivity_timeout=1)
+            next(messages)
+            next(messages)
+            assert redis.llen(fetch_routing_key) == 0
+            # the message still prefetched is in flight too
+            assert redis.zcard(in_flight_key) == 3
+
+            # the first message was taken long ago
+            redis.zadd(in_flight_key, {ids[0]: time.time() - queue.FETCH_TIMEOUT - 1})
+
+            queue.resubmit_jobs()
+
+            assert [json.loads(item)['harvest_object_id']
+                    for item in redis.lrange(fetch_routing_key, 0, -1)] == [ids[0]]
+            assert redis.sismember(queue.get_queued_key(fetch_routing_key), ids[0])
+            assert sorted(redis.zrange(in_flight_key, 0, -1)) == sorted(ids[1:])
+
+            consumer.cancel()
+            assert sorted(redis.zrange(in_flight_key, 0, -1)) == [ids[1]]
+        finally:
+            redis.delete(fetch_routing_key, in_flight_key,
+                         queue.get_queued_key(fetch_routing_key))
+
     def test_resubmit_objects(self):
         '''
         Test that only harvest objects re-submitted which were not be present in the redis fetch queue.
@@ -306,6 +411,14 @@ class TestHarvestQueue(object):
             assert all_objects[2].state == 'WAITING'
             assert all_objects[2].current is False
 
+            # an object already processed is not imported again
+            obj_id = all_objects[0].id
+            retry_times = all_objects[0].retry_times
+            body = json.dumps({'harvest_object_id': obj_id})
+            queue.fetch_callback(consumer_fetch, queue.FakeMethod(body), None, body)
+            assert HarvestObject.get(obj_id).retry_times == retry_times
+            assert HarvestObject.get(obj_id).state == 'COMPLETE'
+
             assert len(redis.keys(fetch_routing_key + ':*')) == 0
             assert redis.llen(fetch_routing_key) == 2
 
@@ -321,7 +434,84 @@ class TestHarvestQueue(object):
             assert redis.llen(fetch_routing_key) == 2
             fetch_queue_items = redis.lrange(fetch_routing_key, 0, 10)
             assert harvest_object_id in fetch_queue_items
-            assert redis.dbsize() == 1
+            # the fetch queue and its queued ids
+            assert redis.dbsize() == 2
+        finally:
+            redis.flushdb()
+
+    def test_resubmit_objects_prefetched(self):
+        '''
+        Test that the objects prefetched by a consumer are not re-submitted.
+        '''
+        if config.get('ckan.harvest.mq.type') != 'redis':
+            pytest.skip()
+        redis = queue.get_connection()
+        fetch_routing_key = queue.get_fetch_routing_key()
+        redis.flushdb()
+        try:
+            consumer = queue.get_gather_consumer()
+            consumer.queue_purge(queue=queue.get_gather_queue_name())
+
+            user = toolkit.get_action('get_site_user')(
+                {'model': model, 'ignore_auth': True}, {}
+            )['name']
+
+            context = {'model': model, 'session': model.Session,
+                       'user': user, 'api_version': 3, 'ignore_auth': True}
+
+            self._create_harvest_job_and_finish_gather_stage(consumer, context)
+
+            assert redis.llen(fetch_routing_key) == 3
+
+            consumer_fetch = queue.RedisConsumer(redis, fetch_routing_key,
+                                                 prefetch_count=2)
+            messages = consumer_fetch.consume(queue.get_fetch_queue_name(),
+                                              inactivity_timeout=1)
+            # one message is being processed, one waits in the consumer
+            next(messages)
+            assert redis.llen(fetch_routing_key) == 1
+
+            queue.resubmit_objects()
+
+            assert redis.llen(fetch_routing_key) == 1
+
+            consumer_fetch.cancel()
+            assert redis.llen(fetch_routing_key) == 2
+        finally:
+            redis.flushdb()
+
+    def test_fetch_callback_no_harvester(self):
+        '''
+        Test that an object with no harvester for its source keeps its state.
+        '''
+        if config.get('ckan.harvest.mq.type') != 'redis':
+            pytest.skip()
+        redis = queue.get_connection()
+        redis.flushdb()
+        try:
+            consumer = queue.get_gather_consumer()
+            consumer_fetch = queue.get_fetch_consumer()
+            consumer.queue_purge(queue=queue.get_gather_queue_name())
+            consumer_fetch.queue_purge(queue=queue.get_fetch_queue_name())
+
+            user = toolkit.get_action('get_site_user')(
+                {'model': model, 'ignore_auth': True}, {}
+            )['name']
+
+            context = {'model': model, 'session': model.Session,
+                       'user': user, 'api_version': 3, 'ignore_auth': True}
+
+            self._create_harvest_job_and_finish_gather_stage(consumer, context)
+
+            reply = consumer_fetch.basic_get(queue='ckan.harvest.fetch')
+            obj_id = json.loads(reply[2])['harvest_object_id']
+
+            with patch.object(queue, 'get_harvester', return_value=None):
+                queue.fetch_callback(consumer_fetch, *reply)
+
+            obj = HarvestObject.get(obj_id)
+            assert obj.state == 'WAITING'
+            assert obj.retry_times == 1
         finally:
             redis.flushdb()
 
@@ -1,12 +1,15 @@
+import json
 from datetime import datetime, timedelta
 from nose.tools import assert_equal, assert_in
 import pytest
+from unittest.mock import patch
 from ckan.tests import factories as ckan_factories
 from ckan import model
 from ckan.lib.base import config
 from ckan.plugins.toolkit import get_action
 from ckanext.harvest.tests import factories as harvest_factories
 from ckanext.harvest.logic import HarvestJobExists
+from ckanext.harvest.model import HarvestSourceStats
 
 
 @pytest.mark.usefixtures('with_plugins', 'clean_db', 'clean_queues')
@@ -49,6 +52,36 @@ class TestModelFunctions:
         assert_equal(len(gather_errors), 0)
         assert_equal(job.status, 'Finished')
 
+    def test_finished_job_inline(self):
+        """ Test the tasks of a finished job run now without a jobs worker """
+        source, job = self.get_source()
+
+        self.add_object(job=job, source=source, state='COMPLETE', minutes_ago=5)
+
+        with patch('ckanext.harvest.logic.action.update.toolkit.enqueue_job') as enqueue_job:
+            gather_errors = self.run(timeout=7, source=source, job=job)
+        assert_equal(len(gather_errors), 0)
+        assert_equal(job.status, 'Finished')
+        assert_equal(enqueue_job.call_count, 0)
+
+        stats = HarvestSourceStats.get(source.id)
+        assert_equal(stats.last_job_id, job.id)
+        assert_equal(json.loads(stats.last_job)['status'], 'Finished')
+
+    @pytest.mark.ckan_config('ckan.harvest.background_job_finished', 'true')
+    def test_finished_job_deferred(self):
+        """ Test the source of a finished job is reindexed in background """
+        source, job = self.get_source()
+
+        self.add_object(job=job, source=source, state='COMPLETE', minutes_ago=5)
+
+        with patch('ckanext.harvest.logic.action.update.toolkit.enqueue_job') as enqueue_job:
+            gather_errors = self.run(timeout=7, source=source, job=job)
+        assert_equal(len(gather_errors), 0)
+        assert_equal(job.status, 'Finished')
+        assert_equal(enqueue_job.call_count, 1)
+        assert_equal(enqueue_job.call_args[0][1], [source.id])
+
     def test_no_objects_job(self):
         """ Test a job that don't raise timeout """
         _, job = self.get_source()
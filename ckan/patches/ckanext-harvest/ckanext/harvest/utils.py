@@ -2,6 +2,7 @@
 
 from __future__ import print_function
 
+import csv
 import json
 import logging
 import re
@@ -12,6 +13,7 @@ import ckan.lib.helpers as h
 import ckan.plugins.toolkit as tk
 from ckan import model
 from ckantoolkit import _
+from flask import Response, stream_with_context
 from io import StringIO
 
 from ckanext.harvest.logic import HarvestJobExists, HarvestSourceInactiveError
@@ -315,16 +317,18 @@ def gather_consumer():
         get_gather_consumer,
         gather_callback,
         get_gather_queue_name,
+        load_harvesters,
     )
 
     logging.getLogger("amqplib").setLevel(logging.INFO)
+    load_harvesters()
     consumer = get_gather_consumer()
     for method, header, body in consumer.consume(
             queue=get_gather_queue_name()):
         gather_callback(consumer, method, header, body)
 
 
-def fetch_consumer():
+def fetch_consumer(workers=None):
     import logging
 
     logging.getLogger("amqplib").setLevel(logging.INFO)
@@ -332,13 +336,94 @@ def fetch_consumer():
         get_fetch_consumer,
         fetch_callback,
         get_fetch_queue_name,
+        load_harvesters,
     )
 
+    # Inherited by the workers
+    load_harvesters()
+
+    if workers is None:
+        workers = tk.asint(tk.config.get("ckan.harvest.fetch_workers", 1))
+    if workers > 1:
+        _run_fetch_workers(workers)
+        return
+
     consumer = get_fetch_consumer()
     for method, header, body in consumer.consume(queue=get_fetch_queue_name()):
         fetch_callback(consumer, method, header, body)
 
 
+def _run_fetch_workers(workers):
+    """Runs the fetch consumer on a number of forked worker processes
+
+    Each worker has its own queue connection and database session. On
+    SIGTERM or SIGINT the workers finish the object they are processing,
+    give back the prefetched messages and exit.
+    """
+    import multiprocessing
+    import signal
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_fetch_worker, name="fetch-worker-{0}".format(i))
+        for i in range(workers)
+    ]
+
+    # Do not share the pooled database connections with the workers
+    model.Session.remove()
+    model.meta.engine.dispose()
+
+    for process in processes:
+        process.start()
+    log.info("Started %d fetch workers", workers)
+
+    def stop(signum, frame):
+        log.info("Stopping fetch workers")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            log.error("%s exited with code %s", process.name, process.exitcode)
+
+
+def _fetch_worker():
+    import signal
+    from ckanext.harvest.queue import (
+        get_fetch_consumer,
+        fetch_callback,
+        get_fetch_queue_name,
+    )
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    # SIGINT is handled by the parent, which sends SIGTERM to the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, stop)
+
+    consumer = get_fetch_consumer()
+    for method, header, body in consumer.consume(
+            queue=get_fetch_queue_name(), inactivity_timeout=1):
+        if method is not None:
+            fetch_callback(consumer, method, header, body)
+        if stopping:
+            break
+
+    consumer.cancel()
+    model.Session.remove()
+    # the worker exits without running the atexit handlers, write the
+    # buffered database log records now
+    logging.shutdown()
+
+
 def run_harvester():
     context = {
         "model": model,
@@ -541,7 +626,11 @@ def job_show_view(id, source_dict=False, is_last=False):
     try:
         context = {'model': model, 'user': tk.c.user}
         job = tk.get_action('harvest_job_show')(context, {'id': id})
-        job_report = tk.get_action('harvest_job_report')(context, {'id': id})
+        job_report = tk.get_action('harvest_job_report')(
+            context, {
+                'id': id,
+                'after': tk.request.args.get('after'),
+            })
 
         if not source_dict:
             source_dict = tk.get_action('harvest_source_show')(
@@ -568,6 +657,112 @@ def job_show_view(id, source_dict=False, is_last=False):
         return tk.abort(500, msg)
 
 
+# rows written to the export buffer before sending it to the client
+EXPORT_CHUNK_SIZE = 500
+EXPORT_FIELDS = ['type', 'harvest_object_id', 'guid', 'stage', 'line',
+                 'message', 'created']
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def job_errors_export_view(id, fmt):
+    if fmt not in EXPORT_FORMATS:
+        return tk.abort(404, _('Unknown export format'))
+    try:
+        context = {'model': model, 'user': tk.c.user}
+        tk.check_access('harvest_job_show', context, {'id': id})
+    except tk.ObjectNotFound:
+        return tk.abort(404, _('Harvest job not found'))
+    except tk.NotAuthorized:
+        return tk.abort(403, _not_auth_message())
+
+    rows = _iter_job_errors(id)
+    if fmt == 'csv':
+        content = _export_csv(rows)
+    else:
+        content = _export_jsonl(rows)
+
+    return Response(
+        stream_with_context(content),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition':
+                'attachment; filename="harvest-job-{}-errors.{}"'.format(id, fmt),
+        },
+    )
+
+
+def _iter_job_errors(job_id):
+    '''
+    Yields all the gather and object errors of a job as dicts, reading
+    them from the database in batches.
+    '''
+    from ckanext.harvest.model import (HarvestGatherError, HarvestObject,
+                                       HarvestObjectError)
+
+    q = model.Session.query(HarvestGatherError.message,
+                            HarvestGatherError.created) \
+        .filter(HarvestGatherError.harvest_job_id == job_id) \
+        .order_by(HarvestGatherError.created)
+    for message, created in q.yield_per(EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'gather',
+            'harvest_object_id': None,
+            'guid': None,
+            'stage': None,
+            'line': None,
+            'message': message,
+            'created': created.isoformat() if created else None,
+        }
+
+    q = model.Session.query(HarvestObjectError.harvest_object_id,
+                            HarvestObject.guid,
+                            HarvestObjectError.stage,
+                            HarvestObjectError.line,
+                            HarvestObjectError.message,
+                            HarvestObjectError.created) \
+        .join(HarvestObject) \
+        .filter(HarvestObject.harvest_job_id == job_id) \
+        .order_by(HarvestObjectError.harvest_object_id,
+                  HarvestObjectError.created)
+    for object_id, guid, stage, line, message, created in q.yield_per(EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'object',
+            'harvest_object_id': object_id,
+            'guid': guid,
+            'stage': stage,
+            'line': line,
+            'message': message,
+            'created': created.isoformat() if created else None,
+        }
+
+
+def _export_csv(rows):
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_FIELDS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([row[field] for field in EXPORT_FIELDS])
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+def _export_jsonl(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
 def job_list_view(source):
     try:
         context = {'model': model, 'user': tk.c.user}
@@ -47,6 +47,10 @@ def job_show(source, id):
     return utils.job_show_view(id)
 
 
+def job_errors_export(source, id, fmt):
+    return utils.job_errors_export_view(id, fmt)
+
+
 def job_abort(source, id):
     return utils.job_abort_view(source, id)
 
@@ -88,6 +92,10 @@ harvester.add_url_rule(
     "/" + utils.DATASET_TYPE_NAME + "/<source>/job/<id>",
     view_func=job_show,
 )
+harvester.add_url_rule(
+    "/" + utils.DATASET_TYPE_NAME + "/<source>/job/<id>/errors.<fmt>",
+    view_func=job_errors_export,
+)
 harvester.add_url_rule(
     "/" + utils.DATASET_TYPE_NAME + "/<source>/job/<id>/abort",
     view_func=job_abort,